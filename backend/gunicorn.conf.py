@@ -0,0 +1,29 @@
+# Configuración de gunicorn para el backend.
+# Uso: gunicorn -c gunicorn.conf.py backend.wsgi
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.local')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+
+# La aplicación se importa en el proceso master antes del fork de los workers.
+preload_app = True
+
+
+def when_ready(server):
+    """Precarga los modelos de ML en el master para que los workers los compartan copy-on-write."""
+    if os.environ.get('ML_PRELOAD_MODELS', '1') != '1':
+        return
+    # Con servidor de inferencia (manage.py run_inference_server) los workers no cargan modelos
+    if os.environ.get('ML_INFERENCE_SOCKET'):
+        return
+
+    from django.db import connections
+    from ml_models.utils.model_loader import preload_artifacts
+
+    # Incluye los detectores de anomalías activos según MLModel
+    loaded = preload_artifacts(active_models=True)
+    # Ninguna conexión abierta en el master debe heredarse en los workers
+    connections.close_all()
+    server.log.info(f"Modelos de ML precargados: {', '.join(p.name for p in loaded) or 'ninguno'}")
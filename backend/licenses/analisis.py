@@ -1,12 +1,6 @@
 from datetime import date, datetime, timedelta
-import os
-import django
 from django.db.models import Sum
 
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.local')
-django.setup()
-
 from licenses.models import License
 from ml_models.utils.file_utils import (
     base64_to_text,
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LicensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'licenses'
+
+    def ready(self):
+        from licenses import signals  # noqa: F401  (mantiene LicenseUsage)
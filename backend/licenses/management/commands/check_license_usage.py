@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from licenses.usage import rebuild_license_usage, usage_differences
+
+
+class Command(BaseCommand):
+    help = 'Compara LicenseUsage con lo calculado desde las licencias y reporta los meses que no coinciden'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Reconstruye el agregado si hay diferencias')
+        parser.add_argument('--show', type=int, default=20, help='Diferencias a listar')
+
+    def handle(self, *args, **options):
+        differences = usage_differences()
+        if not differences:
+            self.stdout.write('LicenseUsage coincide con las licencias')
+            return
+
+        for user_id, month, stored, expected in differences[:options['show']]:
+            self.stdout.write(f"usuario {user_id} {month:%Y-%m}: guardado {stored}, esperado {expected}")
+        if options['fix']:
+            rows = rebuild_license_usage()
+            self.stdout.write(f"{len(differences)} meses con diferencias; agregado reconstruido ({rows} filas)")
+            return
+        raise CommandError(f"{len(differences)} meses con diferencias (usar --fix para reconstruir)")
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from licenses.usage import rebuild_license_usage
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero el uso mensual de licencias por empleado (LicenseUsage)'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = rebuild_license_usage()
+        self.stdout.write(f"LicenseUsage reconstruido: {rows} filas en {time.perf_counter() - start:.1f} s")
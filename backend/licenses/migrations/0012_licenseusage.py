@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Carga inicial del agregado con las licencias existentes (lo mismo que rebuild_license_usage)
+POPULATE_USAGE = """
+INSERT INTO licenses_licenseusage
+    (user_id, month, requests, required_days, mon_fri_requests, approved_sickness, approved_accidents)
+SELECT user_id, month, SUM(requests), SUM(required_days), SUM(mon_fri_requests),
+       SUM(approved_sickness), SUM(approved_accidents)
+FROM (
+    SELECT l.user_id, date_trunc('month', l.request_date)::date AS month, 1 AS requests,
+           l.required_days, CASE WHEN EXTRACT(ISODOW FROM l.start_date) IN (1, 5) THEN 1 ELSE 0 END AS mon_fri_requests,
+           0 AS approved_sickness, 0 AS approved_accidents
+    FROM licenses_license l
+    UNION ALL
+    SELECT l.user_id, date_trunc('month', l.start_date)::date, 0, 0, 0,
+           CASE WHEN t.name = 'Enfermedad' THEN 1 ELSE 0 END,
+           CASE WHEN t.name = 'Accidente de trabajo' THEN 1 ELSE 0 END
+    FROM licenses_license l
+    JOIN licenses_licensetype t ON t.id = l.type_id
+    JOIN licenses_status s ON s.license_id = l.license_id
+    WHERE s.name = 'approved' AND NOT l.is_deleted AND t.name IN ('Enfermedad', 'Accidente de trabajo')
+) AS usage
+GROUP BY user_id, month
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('licenses', '0011_status_other_evaluation_comment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('requests', models.IntegerField(default=0)),
+                ('required_days', models.IntegerField(default=0)),
+                ('mon_fri_requests', models.IntegerField(default=0)),
+                ('approved_sickness', models.IntegerField(default=0)),
+                ('approved_accidents', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='license',
+            index=models.Index(fields=['request_date'], name='license_request_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='license',
+            index=models.Index(fields=['start_date'], name='license_start_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='licenseusage',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='license_usage', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='licenseusage',
+            index=models.Index(fields=['month'], name='license_usage_month_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='licenseusage',
+            unique_together={('user', 'month')},
+        ),
+        migrations.RunSQL(POPULATE_USAGE, migrations.RunSQL.noop),
+    ]
@@ -82,6 +82,13 @@ class License(models.Model):
     is_deleted = models.BooleanField(default=False)
     evaluator=models.ForeignKey(HealthFirstUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='evaluator')
 
+    class Meta:
+        # Los bordes de las ventanas que no cubre LicenseUsage se leen por fecha (ver usage.py)
+        indexes = [
+            models.Index(fields=['request_date'], name='license_request_date_idx'),
+            models.Index(fields=['start_date'], name='license_start_date_idx'),
+        ]
+
     def __str__(self):
         return f"Licencia {self.license_id} - {self.user}"
     
@@ -154,3 +161,26 @@ class Certificate(models.Model):
             keys=[self.license.user.first_name,self.license.user.last_name,str(self.license.user.dni)] #ojo con dni con punto, se queda con las palabras claves para ownership
             return file_utils.search_in_pdf_text(keys,certificate_text) and file_utils.date_in_range(certificate_text,self.license) #si encontró las palabras claves y una fecha que en el certificado que entra en rango
         return False
+
+
+class LicenseUsage(models.Model):
+    """
+    Uso de licencias de un empleado en un mes, mantenido por señales al crear, evaluar, vencer o
+    borrar licencias (ver usage.py). Las solicitudes cuentan en el mes de request_date y las
+    licencias aprobadas de enfermedad y accidente en el mes de start_date.
+    """
+    user = models.ForeignKey(HealthFirstUser, on_delete=models.CASCADE, related_name='license_usage')
+    # Primer día del mes
+    month = models.DateField()
+    requests = models.IntegerField(default=0)
+    required_days = models.IntegerField(default=0)
+    mon_fri_requests = models.IntegerField(default=0)
+    approved_sickness = models.IntegerField(default=0)
+    approved_accidents = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['user', 'month']]
+        indexes = [models.Index(fields=['month'], name='license_usage_month_idx')]
+
+    def __str__(self):
+        return f"Uso de {self.user_id} en {self.month:%Y-%m}"
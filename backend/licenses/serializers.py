@@ -1,4 +1,3 @@
-from lib2to3.pytree import Base
 from rest_framework import serializers
 from users.serializers import HealthFirstUserSerializer
 from .models import License, LicenseType, Status
@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from licenses.models import License, Status
+from licenses.usage import apply_usage_delta, license_state, state_contributions
+
+# Cada cambio de una licencia o de su estado aplica a LicenseUsage la diferencia entre lo que
+# aportaba la licencia antes y después (leído de la base, así da igual cómo se armó la instancia).
+
+
+@receiver(pre_save, sender=License)
+@receiver(pre_delete, sender=License)
+def license_usage_before(sender, instance, **kwargs):
+    instance._usage_state = license_state(instance.pk)
+
+
+@receiver(post_save, sender=License)
+def license_usage_after_save(sender, instance, **kwargs):
+    before = state_contributions(getattr(instance, '_usage_state', None))
+    apply_usage_delta(before, state_contributions(license_state(instance.pk)))
+
+
+@receiver(post_delete, sender=License)
+def license_usage_after_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_usage_state', None)
+    if state:
+        # El estado se borra antes (en cascada) y su señal ya descontó lo que dependía de él
+        state = {**state, 'status_name': Status.objects.filter(license_id=instance.pk).values_list('name', flat=True).first()}
+    apply_usage_delta(state_contributions(state), {})
+
+
+@receiver(pre_save, sender=Status)
+@receiver(pre_delete, sender=Status)
+def status_usage_before(sender, instance, **kwargs):
+    instance._usage_state = license_state(instance.license_id)
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+def status_usage_after(sender, instance, **kwargs):
+    before = state_contributions(getattr(instance, '_usage_state', None))
+    apply_usage_delta(before, state_contributions(license_state(instance.license_id)))
@@ -1,3 +1,118 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+from datetime import date
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from licenses.models import License, LicenseType, LicenseUsage, Status
+from licenses.usage import usage_differences, usage_total_expression, usage_totals
+from ml_models.management.commands.benchmark_import_time import HEAVY_MODULES
+from users.models import HealthFirstUser, Role
+
+
+class LicenseUsageTests(TestCase):
+    """LicenseUsage acompaña cada cambio de licencias y estados (creación, evaluación, borrado, vencimiento)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sickness = LicenseType.objects.create(name='Enfermedad', description='-', min_advance_notice_days=0)
+        cls.vacation = LicenseType.objects.create(
+            name='Vacaciones', description='-', min_advance_notice_days=0, certificate_require=False
+        )
+        cls.user = HealthFirstUser.objects.create_user(
+            username='employee', email='employee@example.com', password='test', first_name='Employee',
+            last_name='Test', phone='1234567890', dni=1, date_of_birth='1990-01-01',
+            employment_start_date='2020-01-01', role=Role.objects.create(name='employee'),
+        )
+
+    def create_license(self, license_type, start_date, request_date, required_days=3):
+        license = License.objects.create(
+            user=self.user, type=license_type, start_date=start_date, end_date=start_date,
+            required_days=required_days, request_date=request_date,
+        )
+        license.assign_status()
+        return license
+
+    def usage(self, month):
+        return LicenseUsage.objects.filter(user=self.user, month=month).values(
+            'requests', 'required_days', 'mon_fri_requests', 'approved_sickness'
+        ).first()
+
+    def test_follows_license_changes(self):
+        # Lunes 3 de junio, pedida en mayo
+        license = self.create_license(self.sickness, date(2024, 6, 3), date(2024, 5, 20))
+        self.assertEqual(self.usage(date(2024, 5, 1)), {
+            'requests': 1, 'required_days': 3, 'mon_fri_requests': 1, 'approved_sickness': 0
+        })
+
+        license.status.name = Status.StatusChoices.APPROVED
+        license.status.save()
+        self.assertEqual(self.usage(date(2024, 6, 1))['approved_sickness'], 1)
+
+        license.start_date = date(2024, 7, 2)
+        license.required_days = 5
+        license.save()
+        self.assertEqual(self.usage(date(2024, 6, 1))['approved_sickness'], 0)
+        self.assertEqual(self.usage(date(2024, 7, 1))['approved_sickness'], 1)
+        self.assertEqual(self.usage(date(2024, 5, 1))['mon_fri_requests'], 0)
+
+        license.is_deleted = True
+        license.save()
+        self.assertEqual(self.usage(date(2024, 7, 1))['approved_sickness'], 0)
+
+        expired = self.create_license(self.sickness, date(2024, 5, 10), date(2024, 5, 2))
+        expired.status.name = Status.StatusChoices.EXPIRED
+        expired.status.save()
+        self.assertEqual(usage_differences(), [])
+
+        approved = self.create_license(self.sickness, date(2024, 6, 14), date(2024, 6, 1))
+        approved.status.name = Status.StatusChoices.APPROVED
+        approved.status.save()
+        approved.delete()
+        license.delete()
+        self.assertEqual(usage_differences(), [])
+        self.assertEqual(self.usage(date(2024, 5, 1))['requests'], 1)
+
+        # Borrado definitivo del usuario: sus licencias y su agregado se van en cascada
+        HealthFirstUser.objects.filter(pk=self.user.pk).delete()
+        self.assertFalse(LicenseUsage.objects.exists())
+
+    def test_window_totals(self):
+        """Meses completos del agregado más los bordes leídos de License: igual que contar licencias."""
+        for day in (date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 15), date(2024, 4, 1)):
+            self.create_license(self.vacation, day, day)
+
+        windows = [
+            (None, None), (date(2024, 1, 31), date(2024, 4, 1)), (date(2024, 2, 1), date(2024, 2, 29)),
+            (date(2024, 2, 2), date(2024, 3, 20)), (date(2024, 3, 1), None), (date(2024, 3, 10), date(2024, 3, 20)),
+        ]
+        for start, end in windows:
+            with self.subTest(start=start, end=end):
+                licenses = License.objects.all()
+                if start:
+                    licenses = licenses.filter(request_date__gte=start)
+                if end:
+                    licenses = licenses.filter(request_date__lte=end)
+                totals = usage_totals(['requests'], start, end)
+                self.assertEqual(int(totals['requests'].sum()), licenses.count())
+                # La misma ventana como expresión SQL por usuario
+                total = HealthFirstUser.objects.filter(pk=self.user.pk).annotate(
+                    total=usage_total_expression('requests', start, end)
+                ).values_list('total', flat=True).get()
+                self.assertEqual(total, licenses.count())
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_setup_does_not_import_heavy_modules(self):
+        # Las señales de licencias importan licenses.usage al arrancar: no debe traer pandas
+        script = (
+            'import sys, django; django.setup(); '
+            f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR,
+            env={**os.environ, 'ML_WARMUP_MODELS': '0'}, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '')
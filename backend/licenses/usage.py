@@ -0,0 +1,267 @@
+"""
+Agregado mensual de uso de licencias por empleado (LicenseUsage).
+
+Cada licencia aporta a dos meses: el de request_date (solicitudes, días pedidos, inicios en lunes
+o viernes; todas las licencias, como las features de anomalías) y el de start_date (licencias de
+enfermedad y accidente aprobadas y no borradas, como las features de riesgo). Las señales de
+License y Status aplican la diferencia entre lo que aportaba la licencia antes y después de cada
+cambio, en la misma transacción. Una ventana de fechas se lee sumando los meses completos del
+agregado más las licencias de los días sueltos de los bordes.
+"""
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from licenses.models import License, LicenseUsage, Status
+
+# Tipo de licencia -> contador de licencias aprobadas por start_date
+RISK_TYPES = {
+    'Enfermedad': 'approved_sickness',
+    'Accidente de trabajo': 'approved_accidents',
+}
+
+# Contador -> (fecha que define el mes, agregado equivalente sobre License)
+USAGE_AGGREGATES = {
+    'requests': ('request_date', Count('license_id')),
+    'required_days': ('request_date', Sum('required_days')),
+    # ISO: 1 = lunes, 5 = viernes
+    'mon_fri_requests': ('request_date', Count('license_id', filter=Q(start_date__iso_week_day__in=[1, 5]))),
+    **{
+        field: ('start_date', Count('license_id', filter=Q(
+            type__name=type_name, status__name=Status.StatusChoices.APPROVED, is_deleted=False
+        )))
+        for type_name, field in RISK_TYPES.items()
+    },
+}
+USAGE_FIELDS = list(USAGE_AGGREGATES)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# Mantenimiento incremental -----------------------------------------------------------------------
+
+def license_contributions(user_id, request_date, start_date, required_days, type_name, status_name, is_deleted):
+    """{(user_id, mes): Counter} con lo que aporta una licencia al agregado."""
+    rows = defaultdict(Counter)
+    requested = rows[(user_id, month_start(request_date))]
+    requested['requests'] += 1
+    requested['required_days'] += required_days
+    if start_date.isoweekday() in (1, 5):
+        requested['mon_fri_requests'] += 1
+
+    field = RISK_TYPES.get(type_name)
+    if field and status_name == Status.StatusChoices.APPROVED and not is_deleted:
+        rows[(user_id, month_start(start_date))][field] += 1
+    return rows
+
+
+def license_state(license_id):
+    """Valores de la licencia guardados en la base de los que depende su aporte (None si no existe)."""
+    if license_id is None:
+        return None
+    return License.objects.filter(pk=license_id).values(
+        'user_id', 'request_date', 'start_date', 'required_days', 'is_deleted',
+        type_name=F('type__name'), status_name=F('status__name'),
+    ).first()
+
+
+def state_contributions(state):
+    return license_contributions(**state) if state else {}
+
+
+@transaction.atomic
+def apply_usage_delta(before, after):
+    """Suma al agregado la diferencia entre dos aportes ({(user_id, mes): Counter})."""
+    for key in set(before) | set(after):
+        delta = {
+            field: after.get(key, Counter())[field] - before.get(key, Counter())[field]
+            for field in USAGE_FIELDS
+        }
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        user_id, month = key
+        updates = {field: F(field) + value for field, value in delta.items()}
+        if LicenseUsage.objects.filter(user_id=user_id, month=month).update(**updates):
+            continue
+        if any(value > 0 for value in delta.values()):
+            # Solo se crean filas al sumar: al borrar un usuario sus filas ya no deben volver
+            LicenseUsage.objects.get_or_create(user_id=user_id, month=month)
+            LicenseUsage.objects.filter(user_id=user_id, month=month).update(**updates)
+
+
+# Reconstrucción y verificación -------------------------------------------------------------------
+
+def computed_usage():
+    """Agregado calculado desde cero a partir de License: {(user_id, mes): Counter}."""
+    rows = defaultdict(Counter)
+    for date_field in ('request_date', 'start_date'):
+        fields = {field: aggregate for field, (by, aggregate) in USAGE_AGGREGATES.items() if by == date_field}
+        grouped = (
+            License.objects.order_by()
+            .annotate(month=TruncMonth(date_field))
+            .values('user_id', 'month')
+            .annotate(**fields)
+        )
+        for row in grouped:
+            counts = rows[(row['user_id'], row['month'])]
+            for field in fields:
+                if row[field]:
+                    counts[field] += row[field]
+    return rows
+
+
+def stored_usage():
+    return {
+        (row['user_id'], row['month']): Counter({field: row[field] for field in USAGE_FIELDS})
+        for row in LicenseUsage.objects.values('user_id', 'month', *USAGE_FIELDS)
+    }
+
+
+@transaction.atomic
+def rebuild_license_usage():
+    """Recalcula todo el agregado. Bloquea las escrituras de licencias y estados mientras tanto."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'LOCK TABLE {License._meta.db_table}, {Status._meta.db_table} IN SHARE MODE'
+        )
+    LicenseUsage.objects.all().delete()
+    rows = [
+        LicenseUsage(user_id=user_id, month=month, **counts)
+        for (user_id, month), counts in computed_usage().items() if counts
+    ]
+    LicenseUsage.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def usage_differences():
+    """[(user_id, mes, guardado, calculado)] de los meses en que el agregado no coincide con License."""
+    stored, computed = stored_usage(), computed_usage()
+    differences = []
+    for key in sorted(set(stored) | set(computed)):
+        saved = {field: value for field, value in stored.get(key, {}).items() if value}
+        expected = {field: value for field, value in computed.get(key, {}).items() if value}
+        if saved != expected:
+            differences.append((*key, saved, expected))
+    return differences
+
+
+# Lectura por ventana -----------------------------------------------------------------------------
+
+def full_months(start=None, end=None):
+    """
+    (primer mes, último mes) completos dentro de [start, end] (None = sin límite) y los rangos de
+    días de los bordes que quedan afuera. Si no hay ningún mes completo, todo es borde.
+    """
+    first = None if start is None else (start if start.day == 1 else next_month(start))
+    last = None
+    if end is not None:
+        # Si end no es fin de mes, su mes queda incompleto
+        last = month_start(end) if (end + timedelta(days=1)).day == 1 else month_start(month_start(end) - timedelta(days=1))
+
+    if first is not None and last is not None and first > last:
+        return None, [(start, end)]
+
+    edges = []
+    if start is not None and start < first:
+        edges.append((start, first - timedelta(days=1)))
+    if end is not None and end >= next_month(last):
+        edges.append((next_month(last), end))
+    return (first, last), edges
+
+
+def in_edges(date_field, edges):
+    condition = Q()
+    for low, high in edges:
+        condition |= Q(**{f'{date_field}__range': (low, high)})
+    return condition
+
+
+def usage_total_expression(field, start=None, end=None, user=OuterRef('pk')):
+    """
+    Total de un contador en la ventana [start, end] para el usuario de la consulta externa, como
+    expresión SQL: sirve para filtrar empleados por actividad en la misma consulta (ej. mínimo de
+    solicitudes) sin traer los totales de toda la población. Mismo cálculo que usage_totals.
+    """
+    start, end = as_date(start), as_date(end)
+    date_field, aggregate = USAGE_AGGREGATES[field]
+    months, edges = full_months(start, end)
+    parts = []
+    if months is not None:
+        first, last = months
+        usage = LicenseUsage.objects.filter(user_id=user)
+        if first is not None:
+            usage = usage.filter(month__gte=first)
+        if last is not None:
+            usage = usage.filter(month__lte=last)
+        parts.append(usage.order_by().values('user_id').annotate(total=Sum(field)).values('total'))
+    if edges:
+        licenses = License.objects.filter(in_edges(date_field, edges), user_id=user)
+        parts.append(licenses.order_by().values('user_id').annotate(total=aggregate).values('total'))
+
+    expressions = [Coalesce(Subquery(part), 0, output_field=IntegerField()) for part in parts]
+    total = expressions[0]
+    for expression in expressions[1:]:
+        total = total + expression
+    return total
+
+
+def usage_totals(fields, start=None, end=None, user_ids=None):
+    """
+    Totales de los contadores por empleado (DataFrame indexado por user_id) para la ventana
+    [start, end] de la fecha de los contadores. Lee el agregado en los meses completos y License
+    solo en los bordes, así el costo no depende de cuántas licencias haya en la ventana.
+    user_ids (lista o consulta de ids) limita la consulta a esos empleados.
+    """
+    # pandas se importa acá: las señales de License importan este módulo al arrancar
+    import pandas as pd
+
+    start, end = as_date(start), as_date(end)
+    date_fields = {USAGE_AGGREGATES[field][0] for field in fields}
+    assert len(date_fields) == 1, 'Los contadores de una consulta deben usar la misma fecha'
+    date_field = date_fields.pop()
+
+    months, edges = full_months(start, end)
+    frames = []
+    if months is not None:
+        first, last = months
+        usage = LicenseUsage.objects.all()
+        if user_ids is not None:
+            usage = usage.filter(user_id__in=user_ids)
+        if first is not None:
+            usage = usage.filter(month__gte=first)
+        if last is not None:
+            usage = usage.filter(month__lte=last)
+        frames.append(pd.DataFrame(list(
+            usage.values('user_id').annotate(**{field: Sum(field) for field in fields})
+        )))
+    if edges:
+        licenses = License.objects.filter(in_edges(date_field, edges))
+        if user_ids is not None:
+            licenses = licenses.filter(user_id__in=user_ids)
+        frames.append(pd.DataFrame(list(
+            licenses.order_by().values('user_id').annotate(
+                **{field: USAGE_AGGREGATES[field][1] for field in fields}
+            )
+        )))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=fields, index=pd.Index([], name='user_id'), dtype='int64')
+    totals = pd.concat(frames).fillna(0).groupby('user_id')[fields].sum()
+    return totals.astype('int64')
@@ -4,30 +4,27 @@ from datetime import datetime, timedelta
 from django.utils.timezone import now
 from django.contrib.auth import get_user_model
 from xmlrpc.client import NOT_WELLFORMED_ERROR
-from ml_models.models import LicenseDatasetEntry
 from messaging.services.messenger import MessengerService
-from ml_models.anomalies.isolation_forest import get_employee_anomalies, get_supervisor_anomalies
 from messaging.services.brevo_email import *
 from .models import *
 from django.http import JsonResponse, HttpResponse
 import json
 from .serializers import HealthFirstUserSerializer
 from licenses.serializers import LicenseSerializer, LicenseTypeSerializer, LicenseSerializerCSV
+from ml_models.serializers import EmployeeAnomalySerializer, SupervisorAnomalySerializer
+from ml_models.utils.anomaly_results import AnomalyModelNotReady, compute_anomalies, stored_anomaly_results
 from django.core.paginator import Paginator
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 import magic  
-import img2pdf
 from django.db import transaction
 from .analisis import license_analysis
 from ml_models.utils.file_utils import *
-from ml_models.utils.coherence_model_ml import predict_license_types
 from django.db.models import Q
 from django.db import connection
 import csv
 from rest_framework.pagination import LimitOffsetPagination
-from ml_models.utils.evaluation_model import predict_evaluation
 import logging
 
 
@@ -447,11 +444,13 @@ def evaluate_license(request, id):
             text= base64_to_text(base64_certificate,is_image)
             text_normalize=normalize_text(text)
             if comment!='Otro':
-                LicenseDatasetEntry.objects.create(
-                    text=text_normalize,
-                    type=license.type.group,
-                    status=license.status.name,
-                    reason=license.status.evaluation_comment.lower()
+                # Si ya hay un certificado casi idéntico con las mismas etiquetas, solo suma su peso
+                from ml_models.utils.near_duplicates import add_dataset_entry
+                add_dataset_entry(
+                    text_normalize,
+                    license.type.group,
+                    license.status.name,
+                    license.status.evaluation_comment.lower()
                 )
         logger_evaluation.info(f"Licencia  {id} evaluada correctamente. estado: {license_status}, comentario: {comment}, evaluador: {evaluator} id: {license.evaluator.id}")
 
@@ -561,25 +560,23 @@ def upload_base64_file(request):
         if not base64_string:
             return JsonResponse({"error": "El campo 'file_base64' es obligatorio"}, status=400)
         license=License.objects.get(license_id=license_id)
-        is_image=False
 
-        if is_pdf_image(base64_string):
-            is_image=True
+        # Import diferido: los modelos (sklearn, lightgbm) se cargan recién en la primera predicción
+        from ml_models.utils.prediction_store import get_certificate_prediction
 
-        text= base64_to_text(base64_string,is_image)
-        license_type_prediction = predict_license_types(text)
-        evaluation_prediction = predict_evaluation(text,license.type.group)
+        # Se calcula una sola vez por certificado y versión de modelos; luego se lee de la BD
+        prediction = get_certificate_prediction(base64_string, license.type.group)
 
         result = {
-            "is_approved": bool(evaluation_prediction["approved"]),
-            "probability_of_approval": evaluation_prediction["probability_of_approval"],
-            "probability_of_rejection": evaluation_prediction["probability_of_rejection"],
-            "reason_of_rejection": evaluation_prediction["reason_of_rejection"] if evaluation_prediction["reason_of_rejection"] else "",
-            "top_reasons": evaluation_prediction["top_reasons"] if "top_reasons" in evaluation_prediction else "",
-            "license_types": license_type_prediction,
+            "is_approved": prediction.probability_of_approval > 0.5,
+            "probability_of_approval": f"{prediction.probability_of_approval * 100:.1f}%",
+            "probability_of_rejection": f"{(1 - prediction.probability_of_approval) * 100:.1f}%",
+            "reason_of_rejection": prediction.reason_of_rejection or "",
+            "top_reasons": prediction.top_reasons or "",
+            "license_types": prediction.license_types,
         }
         if license.type.group=='enfermedad':
-            result["has_code"] = evaluation_prediction["has_code"]
+            result["has_code"] = prediction.has_code
 
         parsed_result = json.loads(json.dumps(result))
  
@@ -617,6 +614,7 @@ def process_certificate(certificate_data):
             raise ValueError('Tipo de archivo no permitido. Solo se aceptan JPG, PNG o PDF.')
         
         if file_type in ['image/jpeg', 'image/png']:
+            import img2pdf  # import diferido: solo se usa al convertir imágenes
             file_decoded = img2pdf.convert(file_decoded)
 
 
@@ -705,6 +703,7 @@ def process_certificate_update_certificate(certificate_data, current_license):
             raise ValueError('Tipo de archivo no permitido. Solo se aceptan JPG, PNG o PDF.')
         
         if file_type in ['image/jpeg', 'image/png']:
+            import img2pdf  # import diferido: solo se usa al convertir imágenes
             file_decoded = img2pdf.convert(file_decoded)
 
 
@@ -824,33 +823,49 @@ def supervisor_anomalies(request):
     start_date = request.GET.get('start_date') or None
     end_date = request.GET.get('end_date') or None
     evaluator_id = request.GET.get('user_id') or None
+    department_id = request.GET.get('department_id') or None
     is_anomaly = request.GET.get('is_anomaly') or None
 
-    try:
-        df = get_supervisor_anomalies(start_date, end_date)
-
-        if evaluator_id:
-            df = df[df['evaluator_id'] == int(evaluator_id)]
+    anomaly_flag = None
+    if is_anomaly is not None:
+        if is_anomaly.lower() in ['true', '1', 'yes']:
+            anomaly_flag = True
+        elif is_anomaly.lower() in ['false', '0', 'no']:
+            anomaly_flag = False
 
-        if is_anomaly is not None:
-            if is_anomaly.lower() in ['true', '1', 'yes']:
-                anomaly_flag = True
-            elif is_anomaly.lower() in ['false', '0', 'no']:
-                anomaly_flag = False
-            else:
-                anomaly_flag = None
+    try:
+        paginator = LimitOffsetPagination()
 
+        # Resultados precalculados (refresh_anomaly_results): filtros y paginación en la base
+        results = stored_anomaly_results('supervisor', start_date, end_date)
+        if results is not None:
+            if evaluator_id:
+                results = results.filter(user_id=int(evaluator_id))
+            if department_id:
+                results = results.filter(user__department_id=int(department_id))
             if anomaly_flag is not None:
-                df = df[df['is_anomaly'] == anomaly_flag]
+                results = results.filter(is_anomaly=anomaly_flag)
+            page = paginator.paginate_queryset(results.values_list('data', flat=True), request)
+            return paginator.get_paginated_response(SupervisorAnomalySerializer(page, many=True).data)
+
+        # Solo se calculan y puntúan los supervisores pedidos
+        df = compute_anomalies(
+            'supervisor', start_date, end_date,
+            evaluator_ids=[int(evaluator_id)] if evaluator_id else None,
+            department_id=int(department_id) if department_id else None,
+        )
 
-        data = df.to_dict(orient='records')
+        if anomaly_flag is not None and not df.empty:
+            df = df[df['is_anomaly'] == anomaly_flag]
 
-        # Aplicar paginación
-        paginator = LimitOffsetPagination()
-        paginated_data = paginator.paginate_queryset(data, request)
+        # Se pagina por posición y solo se serializan (y formatean) las filas de la página
+        page = paginator.paginate_queryset(range(len(df)), request)
+        serializer = SupervisorAnomalySerializer(df.iloc[list(page)].to_dict(orient='records'), many=True)
 
-        return paginator.get_paginated_response(paginated_data)
+        return paginator.get_paginated_response(serializer.data)
 
+    except AnomalyModelNotReady as e:
+        return JsonResponse({'error': str(e)}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
     
@@ -862,29 +877,46 @@ def employee_anomalies(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
     employee_id = request.GET.get('employee_id')
+    department_id = request.GET.get('department_id')
     is_anomaly = request.GET.get('is_anomaly')
+    anomaly_flag = is_anomaly.lower() in ['true', '1', 'yes'] if is_anomaly is not None else None
 
     try:
-        df = get_employee_anomalies(start_date, end_date)
-
-        # Filtro para excluir registros sin solicitudes
-        df = df[df['total_requests'] > 0]
+        paginator = LimitOffsetPagination()
 
-        if employee_id:
-            df = df[df['employee_id'] == int(employee_id)]
+        # Resultados precalculados (refresh_anomaly_results): filtros y paginación en la base
+        results = stored_anomaly_results('employee', start_date, end_date)
+        if results is not None:
+            # Se excluyen los registros sin solicitudes
+            results = results.filter(total_requests__gt=0)
+            if employee_id:
+                results = results.filter(user_id=int(employee_id))
+            if department_id:
+                results = results.filter(user__department_id=int(department_id))
+            if anomaly_flag is not None:
+                results = results.filter(is_anomaly=anomaly_flag)
+            page = paginator.paginate_queryset(results.values_list('data', flat=True), request)
+            return paginator.get_paginated_response(EmployeeAnomalySerializer(page, many=True).data)
+
+        # Solo se calculan y puntúan los empleados pedidos, excluyendo los que no tienen solicitudes
+        df = compute_anomalies(
+            'employee', start_date, end_date,
+            employee_ids=[int(employee_id)] if employee_id else None,
+            department_id=int(department_id) if department_id else None,
+            min_requests=1,
+        )
 
-        if is_anomaly is not None:
-            anomaly_flag = is_anomaly.lower() in ['true', '1', 'yes']
+        if anomaly_flag is not None and not df.empty:
             df = df[df['is_anomaly'] == int(anomaly_flag)]
 
-        data = df.to_dict(orient='records')
-
-        # Aplicar paginación
-        paginator = LimitOffsetPagination()
-        paginated_data = paginator.paginate_queryset(data, request)
+        # Se pagina por posición y solo se serializan (y formatean) las filas de la página
+        page = paginator.paginate_queryset(range(len(df)), request)
+        serializer = EmployeeAnomalySerializer(df.iloc[list(page)].to_dict(orient='records'), many=True)
 
-        return paginator.get_paginated_response(paginated_data)
+        return paginator.get_paginated_response(serializer.data)
 
+    except AnomalyModelNotReady as e:
+        return JsonResponse({'error': str(e)}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
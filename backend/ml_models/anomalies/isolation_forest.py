@@ -1,120 +1,300 @@
-from datetime import date, datetime, timedelta
-import sys
+from datetime import date
 import os
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 import joblib
+from joblib import Parallel, delayed
 import re
-import django
-from django.db.models import Sum,Count,OuterRef,Subquery ,IntegerField,Value
-from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, DateField, DurationField, ExpressionWrapper, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractDay
 from ml_models.models import MLModel
+from ml_models.utils.anomaly_results import AnomalyModelNotReady
+from ml_models.utils.model_loader import (
+    active_artifact_path, department_artifact_paths, forget_active_artifacts, load_artifact, save_artifact
+)
+from ml_models.utils.training_jobs import submit_training_job
+from ml_models.utils.training_orchestrator import default_cpu_budget
+from ml_models.utils.inference_server import infer
 from django.utils import timezone
 
-
-
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-sys.path.append(BASE_DIR)
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.local')
-django.setup()
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-pd.set_option("display.max_columns", None)  # Mostrar todas las columnas
-pd.set_option("display.max_rows", None)     # Mostrar todas las filas
-pd.set_option("display.width", 0)           # Autoajuste al ancho de consola
-
-from licenses.models import License
+from licenses.usage import usage_total_expression, usage_totals
 from users.models import HealthFirstUser
-import pandas as pd
 
 
-#ANOMALIAS SOBRE SUPERVISORES------------------------------------------------------------------------------------
-def create_model_supervisor(path_csv,base_name): # le paso el csv para el entreamiento
-    data= pd.read_csv(path_csv)
-    features = data[['total_requests', 'approved_requests', 'rejected_requests','seniority_days']].copy()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-     # Entrenamiento del modelo Isolation Forest
+# Tipo de modelo -> (prefijo de los .pkl versionados, CSV de entrenamiento, nombre en MLModel)
+ANOMALY_MODELS = {
+    'SUPERVISOR_ANOMALY_DETECTION': (
+        'isolation_forest_sup_model', 'supervisors.csv', 'Modelo de detección de anomalías de supervisores'
+    ),
+    'EMPLOYEE_ANOMALY_DETECTION': (
+        'isolation_forest_emp_model', 'employees.csv', 'Modelo de detección de anomalías de empleados'
+    ),
+}
+
+# Columnas que puntúa cada detector, en el orden en que se entrenó
+ANOMALY_FEATURES = {
+    'SUPERVISOR_ANOMALY_DETECTION': ['total_requests', 'approved_requests', 'rejected_requests', 'seniority_days'],
+    'EMPLOYEE_ANOMALY_DETECTION': [
+        'total_requests', 'required_days', 'required_days_rate', 'seniority_days', 'days_per_year', 'mon_fri_requests',
+    ],
+}
+
+
+def fit_isolation_forest(features, n_jobs=None):
     model = IsolationForest(
         n_estimators=200,
         contamination=0.1,
         max_samples='auto',
         max_features=0.8,
         random_state=42,
+        n_jobs=n_jobs,
+    )
+    return model.fit(features)
+
+
+def register_anomaly_model(model_type, path, department_id=None):
+    """
+    Crea la versión activa de MLModel apuntando al artefacto (queda activa y desactiva la anterior
+    del mismo tipo y departamento; sin departamento es el modelo global).
+    """
+    name = ANOMALY_MODELS[model_type][2]
+    if department_id is not None:
+        population = 'supervisores' if model_type == 'SUPERVISOR_ANOMALY_DETECTION' else 'empleados'
+        name = f"Anomalías de {population} - depto {department_id}"
+    ml_model = MLModel.objects.create(
+        model_type=model_type,
+        name=name,
+        algorithm='ISOLATION_FOREST',
+        is_active=True,
+        training_date=timezone.now(),
+        artifact=os.path.relpath(path, settings.BASE_DIR),
+        department_id=department_id,
     )
-    model.fit(features)
+    forget_active_artifacts()
+    return ml_model
+
+
+def anomaly_model_path(model_type):
+    """
+    Artefacto del modelo activo (MLModel, cacheado en memoria). Si no hay, se encola el
+    entrenamiento para el worker (run_training_jobs) en lugar de entrenar dentro de la request.
+    """
+    path = active_artifact_path(model_type)
+    if path is None:
+        job, _ = submit_training_job(model_type)
+        raise AnomalyModelNotReady(
+            f"El modelo {model_type} todavía no está entrenado (entrenamiento #{job.pk} encolado)"
+        )
+    return path
+
+
+def ensure_anomaly_model(model_type):
+    """
+    Paso de arranque: deja un modelo activo para el tipo. Si no hay, registra el último .pkl
+    del directorio y, si tampoco hay archivo, entrena uno. Devuelve (acción, MLModel o None).
+    """
+    if active_artifact_path(model_type) is not None:
+        return 'activo', None
+    path = get_latest_model_path(ANOMALY_MODELS[model_type][0])
+    if path is not None:
+        return 'registrado', register_anomaly_model(model_type, path)
+    return 'entrenado', train_anomaly_model(model_type)
+
+
+def add_user_columns(df, name_column):
+    """Nombre completo y departamento a partir de first_name, last_name y department__name."""
+    df[name_column] = df['first_name'].fillna('') + ' ' + df['last_name'].fillna('')
+    df['department'] = df['department__name'].fillna('Sin departamento')
+    return df.drop(columns=['first_name', 'last_name', 'department__name'])
+
+
+#ANOMALIAS SOBRE SUPERVISORES------------------------------------------------------------------------------------
+def create_model_supervisor(path_csv,base_name,n_jobs=None): # le paso el csv para el entreamiento
+    data= pd.read_csv(path_csv)
+    features = data[ANOMALY_FEATURES['SUPERVISOR_ANOMALY_DETECTION']].copy()
+
+     # Entrenamiento del modelo Isolation Forest
+    model = fit_isolation_forest(features, n_jobs)
 
     # Guardar el modelo en un archivo, ESTO ES LO CORRECTO
     #joblib.dump(model, MODEL_PATH_SUP)
     name=get_next_model_path(base_name)
-    joblib.dump(model,name)
-    MLModel.objects.create(
-        model_type='SUPERVISOR_ANOMALY_DETECTION',
-        name='Modelo de detección de anomalías de supervisores',
-        algorithm='ISOLATION_FOREST',
-        is_active=True,
-        training_date = timezone.now(),
-        )
-    
+    save_artifact(model,name)
+    return register_anomaly_model('SUPERVISOR_ANOMALY_DETECTION', name)
+
+
+def score_isolation_forest(model, features, n_jobs=None, chunk_size=None):
+    """
+    decision_function del IsolationForest (score_samples - offset_, negativo = anómalo, lo mismo
+    que usa predict), recorriendo el bosque una sola vez. Los lotes de más de chunk_size filas
+    (ML_ANOMALY_SCORING_CHUNK) se parten en trozos que se puntúan en paralelo con n_jobs hilos
+    (ML_ANOMALY_SCORING_JOBS, por defecto los núcleos disponibles): tree.apply libera el GIL y
+    el modelo no se copia. Cada fila se puntúa sola, así que el resultado no cambia.
+    """
+    chunk_size = chunk_size or getattr(settings, 'ML_ANOMALY_SCORING_CHUNK', 20000)
+    n_jobs = n_jobs or getattr(settings, 'ML_ANOMALY_SCORING_JOBS', None) or default_cpu_budget()
+    if len(features) <= chunk_size or n_jobs == 1:
+        return model.decision_function(features)
+
+    chunks = [features[i:i + chunk_size] for i in range(0, len(features), chunk_size)]
+    scores = Parallel(n_jobs=min(n_jobs, len(chunks)), prefer='threads')(
+        delayed(model.decision_function)(chunk) for chunk in chunks
+    )
+    return np.concatenate(scores)
+
+
+def department_models_enabled():
+    return getattr(settings, 'ML_ANOMALY_DEPARTMENT_MODELS', False)
+
+
+def department_ids(data):
+    """department_id de cada fila como float (NaN sin departamento), para mandar junto a las features."""
+    if 'department_id' not in data:
+        return np.full(len(data), np.nan)
+    return data['department_id'].to_numpy(dtype=np.float64)
+
+
+def score_anomaly_batch(model_type, features, departments=None):
+    """
+    Scores de un lote con el modelo global o, con ML_ANOMALY_DEPARTMENT_MODELS, de cada fila con el
+    modelo activo de su departamento (los que no tienen uno usan el global). Cada grupo se puntúa
+    en un hilo aparte.
+    """
+    global_path = anomaly_model_path(model_type)
+    paths = department_artifact_paths(model_type) if department_models_enabled() and departments is not None else {}
+    if not paths:
+        return score_isolation_forest(load_artifact(global_path), features)
+
+    row_paths = pd.Series(departments).map(paths).fillna(global_path).to_numpy()
+    shards = {path: np.flatnonzero(row_paths == path) for path in pd.unique(row_paths)}
+    n_jobs = getattr(settings, 'ML_ANOMALY_SCORING_JOBS', None) or default_cpu_budget()
+    results = Parallel(n_jobs=min(n_jobs, len(shards)), prefer='threads')(
+        delayed(score_isolation_forest)(load_artifact(path), features.iloc[positions], n_jobs=1)
+        for path, positions in shards.items()
+    )
+    scores = np.empty(len(features))
+    for positions, shard_scores in zip(shards.values(), results):
+        scores[positions] = shard_scores
+    return scores
+
+
+def supervisor_anomaly_batch(features, departments=None):
+    """Scores de supervisores para un lote (lo usa el servidor de inferencia)."""
+    return None, score_anomaly_batch('SUPERVISOR_ANOMALY_DETECTION', features, departments)
+
 
 def anomalies_supervisors(data,base_name): #recibe un dataframe
-    #Cargo el modelo previamente guardado
-    model_path = get_latest_model_path(base_name)
-    model = joblib.load(model_path)
     #data= pd.read_csv(path_csv)
-    features = data[['total_requests', 'approved_requests', 'rejected_requests', 'seniority_days']]
-
+    features = data[ANOMALY_FEATURES['SUPERVISOR_ANOMALY_DETECTION']]
 
-    data['anomaly_score'] = model.decision_function(features)
-    data['is_anomaly'] = model.predict(features)
-    data['is_anomaly'] = data['is_anomaly'].map({1: 0, -1: 1})  # 1 = Anómalo, 0 = Normal
+    # Modelo activo de supervisores (o el de cada departamento); se ejecuta en el servidor de inferencia si está configurado
+    _, scores = infer('supervisor_anomaly', features, department_ids(data))
+    data['anomaly_score'] = scores
+    data['is_anomaly'] = (scores < 0).astype(int)  # 1 = Anómalo, 0 = Normal (igual que model.predict)
 
 
     return(data)
 
 
 
-def create_dataframe_supervisor(start_date=None, end_date=None): # esto para lo que pide el admin
+def seniority_days_expression(today):
+    """Días desde employment_start_date hasta today, calculados en SQL (0 si no tiene fecha)."""
+    elapsed = ExpressionWrapper(
+        Value(today, output_field=DateField()) - F('employment_start_date'), output_field=DurationField()
+    )
+    return Coalesce(ExtractDay(elapsed), Value(0))
+
+
+def ratio_expression(numerator, denominator, when_positive):
+    """numerator / denominator como float en SQL, 0 si when_positive no es > 0 (igual que en pandas)."""
+    return Case(
+        When(**{f'{when_positive}__gt': 0}, then=Cast(numerator, FloatField()) / Cast(denominator, FloatField())),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def with_window(condition, window):
+    return condition & window if window is not None else condition
+
+
+# Promedios y totales de toda la población contra los que se calculan las columnas *_diff
+SUMMARY_COLUMNS = {
+    'supervisor': {'mean': ['approval_rate', 'rejection_rate'], 'sum': ['total_requests']},
+    'employee': {'mean': ['required_days', 'total_requests', 'days_per_year', 'required_days_rate'], 'sum': ['required_days']},
+}
+
+
+def population_summary(population, start_date=None, end_date=None, df=None):
+    """
+    Resumen de la población para las columnas *_diff, cacheado ML_ANOMALY_SUMMARY_TTL segundos por
+    ventana y día. df es la población completa si ya se calculó (se usa y se refresca el caché);
+    sin df se lee del caché o se calculan las features de todos, sin puntuarlos.
+    """
+    if not (start_date and end_date):
+        start_date = end_date = None
+    key = f"anomaly_summary:{population}:{start_date}:{end_date}:{date.today()}"
+    if df is None:
+        summary = cache.get(key)
+        if summary is not None:
+            return summary
+        build = create_dataframe_supervisor if population == 'supervisor' else create_dataFrame_empleados
+        df = build(start_date, end_date)
+
+    columns = SUMMARY_COLUMNS[population]
+    summary = {
+        **{f'{column}_mean': float(df[column].mean()) if not df.empty else 0.0 for column in columns['mean']},
+        **{f'{column}_sum': int(df[column].sum()) if not df.empty else 0 for column in columns['sum']},
+    }
+    cache.set(key, summary, timeout=getattr(settings, 'ML_ANOMALY_SUMMARY_TTL', 300))
+    return summary
+
+
+def create_dataframe_supervisor(start_date=None, end_date=None, evaluator_ids=None, department_id=None): # esto para lo que pide el admin
+    """
+    Features de cada supervisor en una sola consulta agrupada (conteos condicionales sobre las
+    licencias que evaluó): solo cruza una fila por supervisor. evaluator_ids y department_id
+    limitan la consulta a esos supervisores.
+    """
     supervisors = HealthFirstUser.objects.filter(role__name='supervisor')
-    
-    license_base = License.objects.filter(evaluator=OuterRef('pk'))
+    if evaluator_ids is not None:
+        supervisors = supervisors.filter(id__in=evaluator_ids)
+    if department_id is not None:
+        supervisors = supervisors.filter(department_id=department_id)
+
+    window = None
     if start_date and end_date:
-        license_base = license_base.filter(status__evaluation_date__range=(start_date, end_date))
-    
-    total_requests = license_base.order_by().values('evaluator').annotate(c=Count('pk')).values('c')[:1]
-    approved_requests = license_base.filter(status__name='approved').order_by().values('evaluator').annotate(c=Count('pk')).values('c')[:1]
-    rejected_requests = license_base.filter(status__name='rejected').order_by().values('evaluator').annotate(c=Count('pk')).values('c')[:1]
-    
+        window = Q(evaluator__status__evaluation_date__range=(start_date, end_date))
+
     supervisors = supervisors.annotate(
-        total_requests=Coalesce(Subquery(total_requests), Value(0, output_field=IntegerField())),
-        approved_requests=Coalesce(Subquery(approved_requests), Value(0, output_field=IntegerField())),
-        rejected_requests=Coalesce(Subquery(rejected_requests), Value(0, output_field=IntegerField()))
+        total_requests=Count('evaluator', filter=window),
+        approved_requests=Count('evaluator', filter=with_window(Q(evaluator__status__name='approved'), window)),
+        rejected_requests=Count('evaluator', filter=with_window(Q(evaluator__status__name='rejected'), window)),
+        seniority_days=seniority_days_expression(date.today()),
+    ).annotate(
+        approval_rate=ratio_expression(F('approved_requests'), F('total_requests'), 'total_requests'),
+        rejection_rate=ratio_expression(F('rejected_requests'), F('total_requests'), 'total_requests'),
     )
-    # Convertir a DataFrame
+
+    # Nombre y departamento vienen en la misma consulta (nada de una consulta por supervisor)
     df = pd.DataFrame(list(supervisors.values(
-        'id', 'total_requests', 'approved_requests', 'rejected_requests', 'employment_start_date',
+        'id', 'first_name', 'last_name', 'department_id', 'department__name', 'total_requests', 'approved_requests',
+        'rejected_requests', 'approval_rate', 'rejection_rate', 'seniority_days',
     )))
     df = df.rename(columns={'id': 'evaluator_id'})
 
     if df.empty:
         return df
-
-    df['approval_rate'] = 0.0
-    df['rejection_rate'] = 0.0
-
-    df.loc[df['total_requests'] > 0, 'approval_rate'] = (
-        df.loc[df['total_requests'] > 0, 'approved_requests'] / df.loc[df['total_requests'] > 0, 'total_requests']
-    )
-
-    df.loc[df['total_requests'] > 0, 'rejection_rate'] = (
-        df.loc[df['total_requests'] > 0, 'rejected_requests'] / df.loc[df['total_requests'] > 0, 'total_requests']
-    )
-
-    today = date.today()
-
-    df['seniority_days'] = df['employment_start_date'].apply(lambda d: (today - d).days if d else 0)
-    df.drop(columns=['employment_start_date'], inplace=True)
-    return df
+    df = add_user_columns(df, 'evaluator_name')
+    return df[[
+        'evaluator_id', 'total_requests', 'approved_requests', 'rejected_requests',
+        'evaluator_name', 'department', 'approval_rate', 'rejection_rate', 'seniority_days', 'department_id',
+    ]]
 
 
 
@@ -159,65 +339,43 @@ def generate_supervisors_csv(path_csv='supervisors_data_1000.csv', n=1000, semil
 
     df = pd.concat([df_regular, df_new, df_old_zero], ignore_index=True)
 
-    df['approval_rate'] = df.apply(
-        lambda row: row['approved_requests'] / row['total_requests'] if row['total_requests'] > 0 else 0, axis=1)
-    df['rejection_rate'] = df.apply(
-        lambda row: row['rejected_requests'] / row['total_requests'] if row['total_requests'] > 0 else 0, axis=1)
+    # Tasas sin apply por fila: 0 para los que no evaluaron nada
+    total = df['total_requests'].where(df['total_requests'] > 0)
+    df['approval_rate'] = (df['approved_requests'] / total).fillna(0.0)
+    df['rejection_rate'] = (df['rejected_requests'] / total).fillna(0.0)
 
     df.to_csv(path_csv, index=False)
     return df
 
-def get_supervisor_anomalies(start_date=None, end_date=None): #FUNCION PRINCIPAL QUE SE USARA EN EL FRONT
-    df = create_dataframe_supervisor(start_date, end_date)
+def get_supervisor_anomalies(start_date=None, end_date=None, evaluator_ids=None, department_id=None): #FUNCION PRINCIPAL QUE SE USARA EN EL FRONT
+    """
+    Puntúa solo los supervisores pedidos (todos por defecto). Las diferencias *_diff son contra
+    toda la población: si se pidió un subconjunto salen del resumen cacheado (population_summary).
+    """
+    df = create_dataframe_supervisor(start_date, end_date, evaluator_ids, department_id)
     if df.empty:
         cols = ['evaluator_id','evaluator_name','department', 'total_requests', 'approved_requests', 'rejected_requests', 'approval_rate', 'rejection_rate','seniority_days']
         return pd.DataFrame(columns=cols)
 
     base_name = "isolation_forest_sup_model"
-    model_path = get_latest_model_path(base_name)
-
-    if model_path and os.path.exists(model_path):
-        dataframe = anomalies_supervisors(df, base_name)
-    else:
-        csv_path = os.path.join(BASE_DIR, 'supervisors.csv')
-        create_model_supervisor(csv_path, base_name=base_name)
-        dataframe = anomalies_supervisors(df, base_name)
-
-    
-    names = []
-    departments = []
+    # Sin modelo activo no se entrena acá: AnomalyModelNotReady (ver anomaly_model_path)
+    anomaly_model_path('SUPERVISOR_ANOMALY_DETECTION')
+    dataframe = anomalies_supervisors(df, base_name)
 
-    for evaluator_id in dataframe['evaluator_id']:
-        try:
-            user = HealthFirstUser.objects.select_related('department').get(id=evaluator_id)
-            full_name = f"{user.first_name} {user.last_name}"
-            dept_name = user.department.name if user.department else "Sin departamento"
-        except HealthFirstUser.DoesNotExist:
-            full_name = "Desconocido"
-            dept_name = "Desconocido"
-
-        names.append(full_name)
-        departments.append(dept_name)
-
-    dataframe['evaluator_name'] = names
-    dataframe['department'] = departments
-
-    global_approval_rate = dataframe['approval_rate'].mean()
-    global_rejection_rate = dataframe['rejection_rate'].mean()
-    total_requests_sum = dataframe['total_requests'].sum()
+    whole_population = evaluator_ids is None and department_id is None
+    summary = population_summary('supervisor', start_date, end_date, dataframe if whole_population else None)
+    global_approval_rate = summary['approval_rate_mean']
+    global_rejection_rate = summary['rejection_rate_mean']
+    total_requests_sum = summary['total_requests_sum']
 
     dataframe['approval_rate_diff'] = dataframe['approval_rate'] - global_approval_rate #NUEVA INFO
     dataframe['rejection_rate_diff'] = dataframe['rejection_rate'] - global_rejection_rate#NUEVA INFO
     dataframe['total_requests_percent'] = dataframe['total_requests'] / total_requests_sum #NUEVA INFO
 
-    dataframe['approval_rate'] = (dataframe['approval_rate']*100).map("{:.2f}%".format)
-    dataframe['rejection_rate'] = (dataframe['rejection_rate']*100).map("{:.2f}%".format)
-    dataframe['approval_rate_diff'] = (dataframe['approval_rate_diff']*100).map("{:+.2f}%".format) #NUEVA INFO
-    dataframe['rejection_rate_diff'] = (dataframe['rejection_rate_diff']*100).map("{:+.2f}%".format) #NUEVA INFO
-    dataframe['total_requests_percent'] = (dataframe['total_requests_percent']*100).map("{:.2f}%".format)#NUEVA INFO
-    dataframe = dataframe.drop(columns=['seniority_days'])
+    # Los valores quedan numéricos: el formato (porcentajes, signo) lo aplica SupervisorAnomalySerializer
+    dataframe = dataframe.drop(columns=['seniority_days', 'department_id'])
 
-    columnas_ordenadas = ['evaluator_id','evaluator_name', 'department'] + [col for col in dataframe.columns if col not in ['evaluator_name', 'department']]
+    columnas_ordenadas = ['evaluator_id','evaluator_name', 'department'] + [col for col in dataframe.columns if col not in ['evaluator_id', 'evaluator_name', 'department']]
     return dataframe[columnas_ordenadas]
 
 #ANOMALIAS SOBRE EMPLEADOS(solicitudes de licencias)------------------------------------------------------------------------------------
@@ -227,9 +385,8 @@ def generate_employees_csv(path_csv='employees_data_1000.csv', n=1000, semilla=4
     employee_id = np.arange(1, n+1)
     total_requests = np.random.randint(5, 51, size=n)
     required_days = np.random.randint(10, 201, size=n)
-    today = datetime.today()
-    start_dates = [today - timedelta(days=int(np.random.uniform(30, 3650))) for _ in range(n)]
-    seniority_days = [(today - d).days for d in start_dates]
+    # Mismos sorteos (y en el mismo orden) que una fecha de ingreso por empleado
+    seniority_days = np.random.uniform(30, 3650, size=n).astype(int)
     required_days_rate = required_days / total_requests
     days_per_year = required_days / (np.array(seniority_days) / 365 + 1e-3)
 
@@ -268,153 +425,102 @@ def generate_employees_csv(path_csv='employees_data_1000.csv', n=1000, semilla=4
     df.to_csv(path_csv, index=False)
     return df
 
-def create_model_empleados(path_csv,base_name): # le paso el csv para el entreamiento
+def create_model_empleados(path_csv,base_name,n_jobs=None): # le paso el csv para el entreamiento
     data= pd.read_csv(path_csv)
-    features = data[['total_requests', 'required_days', 'required_days_rate','seniority_days','days_per_year','mon_fri_requests']]
+    features = data[ANOMALY_FEATURES['EMPLOYEE_ANOMALY_DETECTION']]
 
     #entrenamiento del modelo Isolation Forest
-    model = IsolationForest(
-        n_estimators=200,
-        contamination=0.1,
-        max_samples="auto",
-        max_features=0.8,
-        random_state=42,
-    )
-    model.fit(features)
+    model = fit_isolation_forest(features, n_jobs)
     name = get_next_model_path(base_name)
     #se guardan el modelo en un archivo
-    joblib.dump(model, name)
-    MLModel.objects.create(
-    model_type='EMPLOYEE_ANOMALY_DETECTION',
-    name='Modelo de detección de anomalías de empleados',
-    algorithm='ISOLATION_FOREST',
-    is_active=True,
-    training_date = timezone.now(),
-        )
+    save_artifact(model, name)
+    return register_anomaly_model('EMPLOYEE_ANOMALY_DETECTION', name)
     
-def create_dataFrame_empleados(start_date=None, end_date=None):
-    employees = HealthFirstUser.objects.filter(role__name='employee', is_deleted=False)
+def create_dataFrame_empleados(start_date=None, end_date=None, employee_ids=None, department_id=None, min_requests=0):
+    """
+    Features de cada empleado: solicitudes, días pedidos e inicios en lunes o viernes salen del
+    agregado mensual LicenseUsage (ver licenses/usage.py), no de recorrer sus licencias. La
+    antigüedad se calcula en SQL y las tasas en pandas, con las mismas operaciones que antes.
+    employee_ids, department_id y min_requests (solicitudes en la ventana) limitan los empleados
+    en la consulta, y el agregado solo se lee para los que quedan.
+    """
+    # Ventana por request_date; igual que antes, solo cuenta si vienen ambas fechas
+    window = (start_date, end_date) if start_date and end_date else (None, None)
 
-    df = pd.DataFrame(list(employees.values('id', 'employment_start_date')))
+    employees = HealthFirstUser.objects.filter(role__name='employee', is_deleted=False)
+    if employee_ids is not None:
+        employees = employees.filter(id__in=employee_ids)
+    if department_id is not None:
+        employees = employees.filter(department_id=department_id)
+    if min_requests:
+        employees = employees.alias(
+            window_requests=usage_total_expression('requests', *window)
+        ).filter(window_requests__gte=min_requests)
+    selected = employees.values('id')
+    employees = employees.annotate(seniority_days=seniority_days_expression(date.today()))
+
+    # Nombre y departamento vienen en la misma consulta (nada de una consulta por empleado)
+    df = pd.DataFrame(list(employees.values(
+        'id', 'first_name', 'last_name', 'department_id', 'department__name', 'seniority_days'
+    )))
     df.rename(columns={'id': 'employee_id'}, inplace=True)
 
     if df.empty:
         return df
 
-    licenses = License.objects.all()
-    if start_date and end_date:
-        licenses = licenses.filter(request_date__range=(start_date, end_date))
-
-    lic_data = licenses.values('user_id').annotate(
-        total_requests=Count('license_id'),
-        required_days=Sum('required_days')
-    )
-    lic_df = pd.DataFrame(list(lic_data))
-
-    if not lic_df.empty and 'user_id' in lic_df.columns:
-        lic_df.rename(columns={'user_id': 'employee_id'}, inplace=True)
-    else:
-        #lic_df está vacío o no contiene 'user_id'")
-        lic_df = pd.DataFrame(columns=['employee_id', 'total_requests', 'required_days'])
-
-    df = df.merge(lic_df, on='employee_id', how='left')
-    df['total_requests'] = df['total_requests'].fillna(0).astype(int)
-    df['required_days'] = df['required_days'].fillna(0).astype(int)
-
-    today = date.today()
-    df['required_days_rate'] = df.apply(
-        lambda row: row['required_days'] / row['total_requests'] if row['total_requests'] > 0 else 0, axis=1
-    )
-    df['seniority_days'] = df['employment_start_date'].apply(
-        lambda d: (today - d).days if d else 0
-    )
-    df['days_per_year'] = df.apply(
-        lambda row: row['required_days'] / (row['seniority_days'] / 365) if row['seniority_days'] > 0 else 0, axis=1
-    )
-
-    df.drop(columns=['employment_start_date'], inplace=True)
-
-    mon_fri_df = calculate_mon_fri(start_date, end_date)
-    df = df.merge(mon_fri_df, on='employee_id', how='left')
-    df['mon_fri_requests'] = df['mon_fri_requests'].fillna(0).astype(int)
-    
-    return df
-def calculate_mon_fri(start_date=None, end_date=None):
-    licenses = License.objects.all()
-    if start_date and end_date:
-        licenses = licenses.filter(request_date__range=(start_date, end_date))
+    usage = usage_totals(['requests', 'required_days', 'mon_fri_requests'], *window, user_ids=selected)
+    usage = usage.rename(columns={'requests': 'total_requests'})
+    df = df.merge(usage, left_on='employee_id', right_index=True, how='left')
+    for column in ('total_requests', 'required_days', 'mon_fri_requests'):
+        df[column] = df[column].fillna(0).astype('int64')
 
-    # Obtener usuario y fecha de inicio de la licencia
-    license_day_data = licenses.values('user_id', 'start_date')
-    day_df = pd.DataFrame(list(license_day_data))
+    total_requests = df['total_requests'].where(df['total_requests'] > 0)
+    df['required_days_rate'] = (df['required_days'] / total_requests).fillna(0.0)
+    years = (df['seniority_days'] / 365.0).where(df['seniority_days'] > 0)
+    df['days_per_year'] = (df['required_days'] / years).fillna(0.0)
 
-    if day_df.empty:
-        return pd.DataFrame(columns=['employee_id', 'mon_fri_requests'])
+    df = add_user_columns(df, 'employee_name')
+    return df[[
+        'employee_id', 'employee_name', 'department', 'total_requests', 'required_days',
+        'required_days_rate', 'seniority_days', 'days_per_year', 'mon_fri_requests', 'department_id',
+    ]]
 
-    # Asegurar tipo datetime
-    day_df['start_date'] = pd.to_datetime(day_df['start_date'], errors='coerce')
+def employee_anomaly_batch(features, departments=None):
+    """Scores de empleados para un lote (lo usa el servidor de inferencia)."""
+    return None, score_anomaly_batch('EMPLOYEE_ANOMALY_DETECTION', features, departments)
 
-    # Día de la semana: 0 = lunes, 4 = viernes
-    day_df['weekday'] = day_df['start_date'].dt.weekday
-    mon_fri_df = day_df[day_df['weekday'].isin([0, 4])]
 
-    # Contar por usuario
-    weekday_counts = mon_fri_df.groupby('user_id').size().reset_index(name='mon_fri_requests')
-    weekday_counts.rename(columns={'user_id': 'employee_id'}, inplace=True)
-
-    return weekday_counts
-    
 def anomalies_employees(data,base_name): #recibe un dataframe
-    #Cargo el modelo previamente guardado
-    name = get_latest_model_path(base_name)
-    model = joblib.load(name)
-    features = data[['total_requests', 'required_days', 'required_days_rate','seniority_days','days_per_year','mon_fri_requests']]
+    features = data[ANOMALY_FEATURES['EMPLOYEE_ANOMALY_DETECTION']]
 
-
-    data['anomaly_score'] = model.decision_function(features)
-    data['is_anomaly'] = model.predict(features)
-    data['is_anomaly'] = data['is_anomaly'].map({1: 0, -1: 1})  # 1 = Anómalo, 0 = Normal
+    # Modelo activo de empleados (o el de cada departamento); se ejecuta en el servidor de inferencia si está configurado
+    _, scores = infer('employee_anomaly', features, department_ids(data))
+    data['anomaly_score'] = scores
+    data['is_anomaly'] = (scores < 0).astype(int)  # 1 = Anómalo, 0 = Normal (igual que model.predict)
 
     return(data)
 
-def get_employee_anomalies(start_date=None, end_date=None): #FUNCION PRINCIPAL QUE SE USARA EN EL FRONT
-    df = create_dataFrame_empleados(start_date, end_date)
+def get_employee_anomalies(start_date=None, end_date=None, employee_ids=None, department_id=None, min_requests=0): #FUNCION PRINCIPAL QUE SE USARA EN EL FRONT
+    """
+    Puntúa solo los empleados pedidos (todos por defecto). Las diferencias *_diff son contra
+    toda la población: si se pidió un subconjunto salen del resumen cacheado (population_summary).
+    """
+    df = create_dataFrame_empleados(start_date, end_date, employee_ids, department_id, min_requests)
     if df.empty:
         cols = ['employee_id','employee_name', 'department','total_requests', 'required_days', 'required_days_rate','seniority_days','days_per_year','mon_fri_requests']
         return pd.DataFrame(columns=cols)
     base_name = "isolation_forest_emp_model"
-    model_path = get_latest_model_path(base_name)
-
-    if model_path and os.path.exists(model_path):
-        dataframe = anomalies_employees(df, base_name)
-    else:
-        csv_path = os.path.join(BASE_DIR, 'employees.csv')
-        create_model_empleados(csv_path, base_name=base_name)
-        dataframe = anomalies_employees(df,base_name)
-
-    names = []
-    departments = []
-
-    for employee_id in dataframe['employee_id']:
-        try:
-            user = HealthFirstUser.objects.select_related('department').get(id=employee_id)
-            full_name = f"{user.first_name} {user.last_name}"
-            dept_name = user.department.name if user.department else "Sin departamento"
-        except HealthFirstUser.DoesNotExist:
-            full_name = "Desconocido"
-            dept_name = "Desconocido"
-
-        names.append(full_name)
-        departments.append(dept_name)
-
-    dataframe['employee_name'] = names
-    dataframe['department'] = departments
-
-    global_required_days = dataframe['required_days'].mean()
-    global_total_requests = dataframe['total_requests'].mean()
-    global_days_per_year = dataframe['days_per_year'].mean()
-    global_required_days_rate = dataframe['required_days_rate'].mean()
-    total_required_days_sum = dataframe['required_days'].sum()
+    # Sin modelo activo no se entrena acá: AnomalyModelNotReady (ver anomaly_model_path)
+    anomaly_model_path('EMPLOYEE_ANOMALY_DETECTION')
+    dataframe = anomalies_employees(df, base_name)
+
+    whole_population = employee_ids is None and department_id is None and not min_requests
+    summary = population_summary('employee', start_date, end_date, dataframe if whole_population else None)
+    global_required_days = summary['required_days_mean']
+    global_total_requests = summary['total_requests_mean']
+    global_days_per_year = summary['days_per_year_mean']
+    global_required_days_rate = summary['required_days_rate_mean']
+    total_required_days_sum = summary['required_days_sum']
 
     dataframe['required_days_diff'] = dataframe['required_days'] - global_required_days
     dataframe['total_requests_diff'] = dataframe['total_requests'] - global_total_requests
@@ -423,13 +529,10 @@ def get_employee_anomalies(start_date=None, end_date=None): #FUNCION PRINCIPAL Q
 
     dataframe['required_days_percent'] = dataframe['required_days'] / total_required_days_sum
 
-    dataframe['required_days_diff'] = dataframe['required_days_diff'].map("{:+.2f}".format)
-    dataframe['total_requests_diff'] = dataframe['total_requests_diff'].map("{:+.2f}".format)
-    dataframe['days_per_year_diff'] = dataframe['days_per_year_diff'].map("{:+.2f}".format)
-    dataframe['required_days_rate_diff'] = dataframe['required_days_rate_diff'].map("{:+.2f}".format)
-    dataframe['required_days_percent'] = (dataframe['required_days_percent'] * 100).map("{:.2f}%".format)
+    # Los valores quedan numéricos: el formato (porcentajes, signo) lo aplica EmployeeAnomalySerializer
+    dataframe = dataframe.drop(columns=['department_id'])
 
-    columnas_ordenadas = ['employee_id','employee_name', 'department'] + [col for col in dataframe.columns if col not in ['employee_name', 'department']]
+    columnas_ordenadas = ['employee_id','employee_name', 'department'] + [col for col in dataframe.columns if col not in ['employee_id', 'employee_name', 'department']]
     return dataframe[columnas_ordenadas]
 
 #---------------------------------------------------------------------------------------------------------------
@@ -437,13 +540,11 @@ def get_employee_anomalies(start_date=None, end_date=None): #FUNCION PRINCIPAL Q
 
 def generate_small_training_csv(path_csv='small_training_employees.csv', n=30, semilla=42):
     np.random.seed(semilla)
-    today = datetime.today()
 
     employee_id = np.arange(1, n + 1)
     total_requests = np.random.randint(0, 21, size=n)  # algunos con 0 solicitudes
     required_days = np.random.randint(1, 31, size=n)
-    start_dates = [today - timedelta(days=max(30, int(np.random.normal(loc=730, scale=150)))) for _ in range(n)]
-    seniority_days = [(today - d).days for d in start_dates]
+    seniority_days = np.maximum(30, np.random.normal(loc=730, scale=150, size=n).astype(int))
 
     # Cálculos base
     required_days_rate = required_days / np.maximum(total_requests, 1)
@@ -566,6 +667,62 @@ def dataframe_pruebas_emp(): # para pruebas
 
     return data
 
+#entrenamiento fuera de las requests (worker de TrainingJob o ensure_anomaly_models)----------------------------------
+def train_anomaly_model(model_type, n_jobs=None):
+    base_name, csv_name, _ = ANOMALY_MODELS[model_type]
+    create_model = create_model_supervisor if model_type == 'SUPERVISOR_ANOMALY_DETECTION' else create_model_empleados
+    return create_model(os.path.join(BASE_DIR, csv_name), base_name=base_name, n_jobs=n_jobs)
+
+
+def train_and_save_supervisor_anomaly_model(incremental=False, n_jobs=None, progress=None):
+    """Entrena desde supervisors.csv (incremental no aplica). Lo llama el worker de entrenamientos."""
+    if progress:
+        progress(10, 'Entrenando')
+    return train_anomaly_model('SUPERVISOR_ANOMALY_DETECTION', n_jobs)
+
+
+def train_and_save_employee_anomaly_model(incremental=False, n_jobs=None, progress=None):
+    """Entrena desde employees.csv (incremental no aplica). Lo llama el worker de entrenamientos."""
+    if progress:
+        progress(10, 'Entrenando')
+    return train_anomaly_model('EMPLOYEE_ANOMALY_DETECTION', n_jobs)
+
+def train_department_anomaly_models(model_type, min_size=None, n_jobs=None):
+    """
+    Un IsolationForest por departamento, entrenados en paralelo (hilos) con las features de la
+    base: todo el historial y las mismas filas que puntúan los endpoints. Los departamentos con
+    menos de min_size filas (ML_ANOMALY_DEPARTMENT_MIN_SIZE) quedan con el modelo global y se
+    desactiva el modelo propio que tuvieran. Devuelve ({department_id: MLModel}, filas por departamento).
+    """
+    min_size = min_size or getattr(settings, 'ML_ANOMALY_DEPARTMENT_MIN_SIZE', 100)
+    if model_type == 'SUPERVISOR_ANOMALY_DETECTION':
+        df = create_dataframe_supervisor()
+    else:
+        df = create_dataFrame_empleados(min_requests=1)
+    sizes = df['department_id'].value_counts().astype(int) if not df.empty else pd.Series(dtype='int64')
+    sizes.index = sizes.index.astype(int)
+    departments = sorted(sizes[sizes >= min_size].index)
+
+    columns = ANOMALY_FEATURES[model_type]
+    models = Parallel(n_jobs=n_jobs or default_cpu_budget(), prefer='threads')(
+        delayed(fit_isolation_forest)(df.loc[df['department_id'] == department_id, columns], 1)
+        for department_id in departments
+    )
+
+    base_name = ANOMALY_MODELS[model_type][0]
+    trained = {}
+    for department_id, model in zip(departments, models):
+        path = get_next_model_path(f"{base_name}_dep{department_id}")
+        save_artifact(model, path)
+        trained[department_id] = register_anomaly_model(model_type, path, department_id)
+
+    MLModel.objects.filter(model_type=model_type, department__isnull=False, is_active=True).exclude(
+        department_id__in=departments
+    ).update(is_active=False)
+    forget_active_artifacts()
+    return trained, sizes
+
+
 #busco nombres para modelos------------------------------------------------------------------------------------------------------
 def get_next_model_path(base_name):
     versiones = []
@@ -1,6 +1,35 @@
+import logging
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger('automatic_models_training')
+
+
+def warmup_enabled():
+    """Warmup opcional de modelos al iniciar (ML_WARMUP_MODELS=1 en el entorno o en settings)."""
+    value = os.environ.get('ML_WARMUP_MODELS', getattr(settings, 'ML_WARMUP_MODELS', False))
+    return str(value).lower() in ('1', 'true')
 
 
 class MlModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ml_models'
+
+    def ready(self):
+        if not warmup_enabled():
+            return
+
+        from .utils.inference_server import inference_socket
+        from .utils.model_loader import warmup_models
+
+        # Con servidor de inferencia los modelos viven en ese proceso, no en los workers
+        if inference_socket():
+            return
+        try:
+            loaded = warmup_models()
+            logger.info(f"Warmup de modelos: {', '.join(p.name for p in loaded) or 'ninguno'}")
+        except Exception:
+            # Sin warmup la primera predicción carga los modelos, como siempre
+            logger.exception("Falló el warmup de modelos")
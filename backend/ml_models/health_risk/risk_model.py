@@ -9,6 +9,8 @@ import joblib
 from pathlib import Path
 from functools import lru_cache
 from ml_models.models import MLModel
+from ml_models.utils.model_loader import load_artifact, save_artifact
+from ml_models.utils.inference_server import infer
 from datetime import datetime
 
 # Obtenemos la ruta base del proyecto
@@ -25,7 +27,7 @@ DATASET_PATH=FILE_DIR/'dataset_risk.csv'
 def get_models():
     """Obtener el modelo o crearlo si no existe"""
     if MODEL_PATH.exists() and SCALER_PATH.exists():
-        return joblib.load(MODEL_PATH),joblib.load(SCALER_PATH)
+        return load_artifact(MODEL_PATH),load_artifact(SCALER_PATH)
     else:
         return train_and_save_model()
 
@@ -56,8 +58,8 @@ def train_and_save_model():
     print(f"Precisión del modelo: {precision:.1f}%")
 
     # Guardar el modelo y scaler
-    joblib.dump(model, MODEL_PATH)
-    joblib.dump(scaler, SCALER_PATH)
+    save_artifact(model, MODEL_PATH)
+    save_artifact(scaler, SCALER_PATH)
 
     MLModel.objects.create(
         model_type= 'HEALTH_RISK',
@@ -70,18 +72,20 @@ def train_and_save_model():
     return model,scaler 
     
 
+def risk_predict_batch(X):
+    """Predicción de riesgo (0/1) para un lote de filas de features (lo usa el servidor de inferencia)."""
+    model, scaler = get_models()
+    return None, model.predict(scaler.transform(X))
+
+
 def predict_employ_risk(employ_id):
     """Devuelve el riesgo asociado a empleado consultado"""
     df=generate_employ_risk_dataframe(employ_id)
-    model, scaler=get_models()
     X = df[["age", "sickness_license_count", "accident_license_count",
               "in_high_risk_department"]].copy()
     
-    # Escalar características
-    X_scaled = scaler.transform(X)
-
-    # Hacer predicciones
-    predictions = model.predict(X_scaled)
+    # Escalado y predicción (en el servidor de inferencia si está configurado)
+    _, predictions = infer('health_risk', X)
     df['risk']=predictions
     df['risk'] = np.where(predictions == 1, 'high risk', 'low risk')
 
@@ -95,19 +99,12 @@ def predict_risk():
     """Devuelve el JSON asociado a la prediccion de riesgo de salud"""
     df=generate_risk_dataframe() #Obtenemos el dataframe con la informacion de la base de datos
 
-    #Cargamos el scaler y el modelo de prediccion
-    model, scaler = get_models()
-
     #Hacemos copia del dataframe original, atributos que sirven para la prediccion
     X = df[["age", "sickness_license_count", "accident_license_count",
               "in_high_risk_department"]].copy()
     
-
-    # Escalar características
-    X_scaled = scaler.transform(X)
-    
-    # Hacer predicciones
-    predictions = model.predict(X_scaled)
+    # Escalado y predicción (en el servidor de inferencia si está configurado)
+    _, predictions = infer('health_risk', X)
     df['risk']=predictions
     df['risk'] = np.where(predictions == 1, 'high risk', 'low risk')
 
@@ -1,15 +1,7 @@
 import pandas as pd 
-from django.db.models import Q, Count
 from datetime import datetime, timedelta
-import sys
-import os
-import django
-
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-sys.path.append(BASE_DIR)
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.local')
-django.setup()
 
+from licenses.usage import usage_totals
 from users.models import HealthFirstUser,Department
 
 
@@ -21,6 +13,24 @@ def get_high_risk_department_ids():
         ).values_list('department_id', flat=True)
     )
 
+def add_license_counts(df, since):
+    """
+    Licencias de enfermedad y de accidente aprobadas (y no borradas) de cada usuario con inicio
+    desde since. Salen del agregado mensual LicenseUsage, sin recorrer las licencias.
+    """
+    if df.empty:
+        return df.assign(sickness_license_count=[], accident_license_count=[])
+    # Solo los usuarios del DataFrame: la consulta de un empleado no recorre a toda la población
+    counts = usage_totals(['approved_sickness', 'approved_accidents'], since.date(), user_ids=df['id'].tolist())
+    counts = counts.rename(columns={
+        'approved_sickness': 'sickness_license_count', 'approved_accidents': 'accident_license_count'
+    })
+    df = df.merge(counts, left_on='id', right_index=True, how='left')
+    for column in ('sickness_license_count', 'accident_license_count'):
+        df[column] = df[column].fillna(0).astype('int64')
+    return df
+
+
 def generate_employ_risk_dataframe(id_employ):
     """Genera el dataframe del empleado del que se va a revisar riesgo"""
     today = datetime.now()
@@ -28,37 +38,17 @@ def generate_employ_risk_dataframe(id_employ):
     user=HealthFirstUser.objects.filter(
         is_deleted=False,
         id=id_employ
-    ).annotate(
-        sickness_license_count=Count(
-            'licenses', 
-            filter=Q(
-                licenses__type__name='Enfermedad',
-                licenses__start_date__gte=a_year_ago,
-                licenses__status__name='approved', 
-                licenses__is_deleted=False
-            )
-        ),
-        accident_license_count=Count(
-            'licenses',
-            filter=Q(
-                licenses__type__name='Accidente de trabajo',
-                licenses__start_date__gte=a_year_ago,
-                licenses__status__name='approved',
-                licenses__is_deleted=False
-            )
-        )
     ).values(
+        'id',
         'email',
         'first_name',
         'last_name',
         'department',
         'date_of_birth',
-        'sickness_license_count',
-        'accident_license_count'
     )
     
     # Convertir a DataFrame
-    df = pd.DataFrame.from_records(user)
+    df = add_license_counts(pd.DataFrame.from_records(user), a_year_ago)
     
     #Definir si el departamento es o no de riesgo
     high_risk_departments=get_high_risk_department_ids()
@@ -90,37 +80,17 @@ def generate_risk_dataframe():
     # Query optimizada
     users = HealthFirstUser.objects.filter(
         is_deleted=False
-    ).annotate(
-        sickness_license_count=Count(
-            'licenses', 
-            filter=Q(
-                licenses__type__name='Enfermedad',
-                licenses__start_date__gte=a_year_ago,
-                licenses__status__name='approved', 
-                licenses__is_deleted=False
-            )
-        ),
-        accident_license_count=Count(
-            'licenses',
-            filter=Q(
-                licenses__type__name='Accidente de trabajo',
-                licenses__start_date__gte=a_year_ago,
-                licenses__status__name='approved',
-                licenses__is_deleted=False
-            )
-        )
     ).values(
+        'id',
         'email',
         'first_name',
         'last_name',
         'department',
         'date_of_birth',
-        'sickness_license_count',
-        'accident_license_count'
     )
     
     # Convertir a DataFrame
-    df = pd.DataFrame.from_records(users)
+    df = add_license_counts(pd.DataFrame.from_records(users), a_year_ago)
     
     #Definir si el departamento es o no de riesgo
     high_risk_departments=get_high_risk_department_ids()
@@ -141,7 +111,4 @@ def generate_risk_dataframe():
     
     return df
 
-"""-----------------------------------------------------------------------------------------"""
-if __name__ == "__main__":
-    #print(generate_risk_dataframe())
-    print(generate_employ_risk_dataframe(2))
+# Para probarlo: python manage.py shell -c "from ml_models.health_risk.risk_utils import *; print(generate_employ_risk_dataframe(2))"
@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from ml_models.utils.coherence_model_ml import train_and_save_coherence_model
-from ml_models.utils.evaluation_model import train_and_save_approval_model, train_and_save_rejection_reason_model
+from ml_models.utils.training_orchestrator import TRAINING_TASKS, default_cpu_budget, train_models
 import logging
 
 # Configuración mejorada del logger
@@ -9,36 +8,73 @@ logger = logging.getLogger('automatic_models_training')
 
 class Command(BaseCommand):
     help = 'Entrenamiento automático de modelos de ML'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reconstruye los modelos desde cero (TF-IDF sobre todo el dataset) en lugar del modo incremental'
+        )
+        parser.add_argument(
+            '--sequential',
+            action='store_true',
+            help='Entrena los modelos uno después del otro en lugar de en procesos paralelos'
+        )
+        parser.add_argument(
+            '--cpus',
+            type=int,
+            default=None,
+            help='Presupuesto de núcleos a repartir entre los modelos (por defecto, todos los disponibles)'
+        )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=list(TRAINING_TASKS),
+            default=None,
+            help='Modelos a entrenar (por defecto, todos salvo los de anomalías)'
+        )
     
     def handle(self, *args, **options):
+        incremental = not options['full']
+        parallel = not options['sequential']
+        cpu_budget = options['cpus'] or default_cpu_budget()
         # Inicio del proceso
         start_time = timezone.now()
-        logger.info(f"\n{'='*50}\nIniciando entrenamiento de modelos - {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n{'='*50}")
-        
-        try:
-            logger.info("Entrenando modelo de coherencia...")
-            train_and_save_coherence_model()
-            logger.info("Modelo de coherencia entrenado exitosamente")
-            
-            logger.info("Entrenando modelo de aprobación...")
-            train_and_save_approval_model()
-            logger.info("Modelo de aprobación entrenado exitosamente")
-            
-            logger.info("Entrenando modelo de razón de rechazo...")
-            train_and_save_rejection_reason_model()
-            logger.info("Modelo de razón de rechazo entrenado exitosamente")
-            
-            # Reporte final
-            duration = timezone.now() - start_time
+        logger.info(f"\n{'='*50}\nIniciando entrenamiento de modelos ({'incremental' if incremental else 'completo'}, "
+                    f"{'paralelo' if parallel else 'secuencial'}, {cpu_budget} núcleos) - {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n{'='*50}")
+
+        results = train_models(
+            model_types=options['models'],
+            incremental=incremental,
+            cpu_budget=cpu_budget,
+            parallel=parallel
+        )
+
+        for result in results:
+            if result['success']:
+                logger.info(f"Modelo {result['model_type']} entrenado exitosamente "
+                            f"en {result['seconds']}s (n_jobs={result['n_jobs']})")
+            else:
+                logger.error(f"Error entrenando el modelo {result['model_type']} "
+                             f"(n_jobs={result['n_jobs']}, {result['seconds']}s): {result['error']}\n"
+                             f"{result.get('traceback', '')}")
+
+        # Reporte final
+        duration = timezone.now() - start_time
+        failed = [r['model_type'] for r in results if not r['success']]
+        summary = "\n".join(
+            f"  {r['model_type']:<18} {'OK' if r['success'] else 'ERROR':<6} {r['seconds']}s"
+            for r in results
+        )
+        if failed:
+            logger.error(f"\n{'='*50}\nEntrenamiento finalizado con errores: {', '.join(failed)}\n"
+                         f"{summary}\n"
+                         f"Duración total: {duration}\n"
+                         f"Fecha finalización: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                         f"{'='*50}")
+        else:
             logger.info(f"\n{'='*50}\nEntrenamiento completado exitosamente\n"
-                      f"Duración total: {duration}\n"
-                      f"Fecha finalización: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                      f"{'='*50}")
-            
-        except Exception as e:
-            duration = timezone.now() - start_time
-            logger.error(f"\n{'='*50}\nError durante el entrenamiento de modelos\n"
-                        f"Error: {str(e)}\n"
-                        f"Duración hasta error: {duration}\n"
-                        f"Fecha error: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                        f"{'='*50}")
\ No newline at end of file
+                        f"{summary}\n"
+                        f"Duración total: {duration}\n"
+                        f"Fecha finalización: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                        f"{'='*50}")
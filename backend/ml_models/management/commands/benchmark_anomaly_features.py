@@ -0,0 +1,225 @@
+import json
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
+
+from licenses.models import License, Status
+from licenses.usage import rebuild_license_usage
+from ml_models.anomalies.isolation_forest import (
+    add_user_columns, create_dataFrame_empleados, create_dataframe_supervisor
+)
+from users.models import Department, HealthFirstUser, Role
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed_population(n_licenses, n_employees, n_supervisors, seed=0):
+    """
+    Empleados, supervisores y licencias evaluadas sintéticas (bulk_create, sin señales ni save()).
+    Como las señales no corren, al final se reconstruye LicenseUsage.
+    """
+    rng = np.random.RandomState(seed)
+    today = date.today()
+    departments = [Department.objects.get_or_create(name=f'Benchmark {i}')[0] for i in range(5)]
+    roles = {name: Role.objects.get_or_create(name=name)[0] for name in ('employee', 'supervisor')}
+
+    users = []
+    for role, n in (('employee', n_employees), ('supervisor', n_supervisors)):
+        start_days = rng.randint(30, 3650, size=n)
+        for i in range(n):
+            email = f'bench-{seed}-{role}-{i}@example.com'
+            users.append(HealthFirstUser(
+                username=email, email=email, password='!', first_name=f'{role[:3]}{i}', last_name='Bench',
+                phone='0', dni=i, date_of_birth=date(1980, 1, 1), role=roles[role],
+                department=departments[i % len(departments)] if i % 7 else None,
+                employment_start_date=today - timedelta(days=int(start_days[i])),
+            ))
+    users = HealthFirstUser.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    employees, supervisors = users[:n_employees], users[n_employees:]
+
+    user_idx = rng.randint(0, n_employees, size=n_licenses)
+    evaluator_idx = rng.randint(0, n_supervisors, size=n_licenses)
+    start_offset = rng.randint(0, 3 * 365, size=n_licenses)
+    required = rng.randint(1, 15, size=n_licenses)
+    notice = rng.randint(0, 30, size=n_licenses)
+    statuses = rng.choice(['approved', 'rejected', 'pending'], size=n_licenses, p=[0.7, 0.2, 0.1])
+
+    for batch in range(0, n_licenses, BATCH_SIZE):
+        rows = range(batch, min(batch + BATCH_SIZE, n_licenses))
+        licenses = License.objects.bulk_create([
+            License(
+                user=employees[user_idx[i]], evaluator=supervisors[evaluator_idx[i]],
+                start_date=today - timedelta(days=int(start_offset[i])),
+                end_date=today - timedelta(days=int(start_offset[i]) - int(required[i])),
+                required_days=int(required[i]),
+                request_date=today - timedelta(days=int(start_offset[i] + notice[i])),
+            )
+            for i in rows
+        ])
+        Status.objects.bulk_create([
+            Status(license=license, name=statuses[i], evaluation_date=license.request_date + timedelta(days=1))
+            for license, i in zip(licenses, rows)
+        ])
+    # Sin estadísticas de las filas recién insertadas el planner elige un plan muy lento para el agregado
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {License._meta.db_table}, {Status._meta.db_table}, {HealthFirstUser._meta.db_table}')
+    rebuild_license_usage()
+
+
+def legacy_supervisor_features(start_date=None, end_date=None):
+    """Implementación anterior: tres Subquery correlacionadas por supervisor y cálculos en pandas."""
+    license_base = License.objects.filter(evaluator=OuterRef('pk'))
+    if start_date and end_date:
+        license_base = license_base.filter(status__evaluation_date__range=(start_date, end_date))
+
+    def count(queryset):
+        subquery = queryset.order_by().values('evaluator').annotate(c=Count('pk')).values('c')[:1]
+        return Coalesce(Subquery(subquery), Value(0, output_field=IntegerField()))
+
+    supervisors = HealthFirstUser.objects.filter(role__name='supervisor').annotate(
+        total_requests=count(license_base),
+        approved_requests=count(license_base.filter(status__name='approved')),
+        rejected_requests=count(license_base.filter(status__name='rejected')),
+    )
+    df = pd.DataFrame(list(supervisors.values(
+        'id', 'total_requests', 'approved_requests', 'rejected_requests', 'employment_start_date',
+        'first_name', 'last_name', 'department__name',
+    ))).rename(columns={'id': 'evaluator_id'})
+    df = add_user_columns(df, 'evaluator_name')
+    df['approval_rate'] = 0.0
+    df['rejection_rate'] = 0.0
+    active = df['total_requests'] > 0
+    df.loc[active, 'approval_rate'] = df.loc[active, 'approved_requests'] / df.loc[active, 'total_requests']
+    df.loc[active, 'rejection_rate'] = df.loc[active, 'rejected_requests'] / df.loc[active, 'total_requests']
+    today = date.today()
+    df['seniority_days'] = df['employment_start_date'].apply(lambda d: (today - d).days if d else 0)
+    return df.drop(columns=['employment_start_date'])
+
+
+def legacy_employee_features(start_date=None, end_date=None):
+    """Implementación anterior: un agregado, todas las (user_id, start_date) a pandas y apply por fila."""
+    employees = HealthFirstUser.objects.filter(role__name='employee', is_deleted=False)
+    df = pd.DataFrame(list(employees.values(
+        'id', 'employment_start_date', 'first_name', 'last_name', 'department__name'
+    ))).rename(columns={'id': 'employee_id'})
+    df = add_user_columns(df, 'employee_name')
+
+    licenses = License.objects.all()
+    if start_date and end_date:
+        licenses = licenses.filter(request_date__range=(start_date, end_date))
+    lic_df = pd.DataFrame(list(licenses.values('user_id').annotate(
+        total_requests=Count('license_id'), required_days=Sum('required_days')
+    ))).rename(columns={'user_id': 'employee_id'})
+    df = df.merge(lic_df, on='employee_id', how='left')
+    df['total_requests'] = df['total_requests'].fillna(0).astype(int)
+    df['required_days'] = df['required_days'].fillna(0).astype(int)
+
+    today = date.today()
+    df['required_days_rate'] = df.apply(
+        lambda row: row['required_days'] / row['total_requests'] if row['total_requests'] > 0 else 0, axis=1
+    )
+    df['seniority_days'] = df['employment_start_date'].apply(lambda d: (today - d).days if d else 0)
+    df['days_per_year'] = df.apply(
+        lambda row: row['required_days'] / (row['seniority_days'] / 365) if row['seniority_days'] > 0 else 0, axis=1
+    )
+    df.drop(columns=['employment_start_date'], inplace=True)
+
+    day_df = pd.DataFrame(list(licenses.values('user_id', 'start_date')))
+    day_df['weekday'] = pd.to_datetime(day_df['start_date']).dt.weekday
+    mon_fri = day_df[day_df['weekday'].isin([0, 4])].groupby('user_id').size().reset_index(name='mon_fri_requests')
+    df = df.merge(mon_fri.rename(columns={'user_id': 'employee_id'}), on='employee_id', how='left')
+    df['mon_fri_requests'] = df['mon_fri_requests'].fillna(0).astype(int)
+    return df
+
+
+def measure(function, window, repeat):
+    """Mediana de tiempo, consultas y filas devueltas por la base (de la última ejecución)."""
+    times = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            df = function(*window)
+            times.append((time.perf_counter() - start) * 1000)
+    return df, {'ms': round(float(np.median(times)), 1), 'queries': len(queries)}
+
+
+def same_values(expected, actual, key):
+    expected = expected.sort_values(key).reset_index(drop=True)
+    actual = actual.sort_values(key).reset_index(drop=True)[list(expected.columns)]
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, rtol=0, atol=1e-12)
+    except AssertionError:
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la extracción de features de anomalías (consulta agrupada única) con la implementación '
+        'anterior sobre una base sembrada con licencias sintéticas; todo se revierte al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--licenses', type=int, default=100000, help='Licencias sintéticas')
+        parser.add_argument('--employees', type=int, default=5000, help='Empleados sintéticos')
+        parser.add_argument('--supervisors', type=int, default=200, help='Supervisores sintéticos')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos sintéticos')
+        parser.add_argument('--repeat', type=int, default=3, help='Ejecuciones a promediar (mediana)')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        today = date.today()
+        windows = {'todo': (None, None), 'último año': (today - timedelta(days=365), today)}
+        cases = [
+            ('supervisores', legacy_supervisor_features, create_dataframe_supervisor, 'evaluator_id'),
+            ('empleados', legacy_employee_features, create_dataFrame_empleados, 'employee_id'),
+        ]
+
+        report = {'licenses': options['licenses'], 'employees': options['employees'],
+                  'supervisors': options['supervisors'], 'results': []}
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                seed_population(options['licenses'], options['employees'], options['supervisors'], options['seed'])
+                report['seed_seconds'] = round(time.perf_counter() - start, 1)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+                for name, legacy, current, key in cases:
+                    for window_name, window in windows.items():
+                        before_df, before = measure(legacy, window, options['repeat'])
+                        after_df, after = measure(current, window, options['repeat'])
+                        report['results'].append({
+                            'features': name, 'window': window_name, 'rows': len(after_df),
+                            'before': before, 'after': after,
+                            'identical': same_values(before_df, after_df, key),
+                        })
+                raise Rollback()
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['licenses']} licencias, {report['employees']} empleados, {report['supervisors']} supervisores "
+            f"(sembrado en {report['seed_seconds']} s, revertido)"
+        )
+        for r in report['results']:
+            self.stdout.write(
+                f"{r['features']:<13} {r['window']:<11} antes {r['before']['ms']:>8.1f} ms ({r['before']['queries']} consultas)"
+                f"  ahora {r['after']['ms']:>8.1f} ms ({r['after']['queries']} consultas)  "
+                f"{'idénticos' if r['identical'] else 'DIFERENTES'}"
+            )
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.anomalies.isolation_forest import ANOMALY_FEATURES, ANOMALY_MODELS, BASE_DIR, score_isolation_forest
+from ml_models.utils.model_loader import active_artifact_path, load_artifact
+
+# Población -> (tipo de modelo, columnas que puntúa el modelo)
+POPULATIONS = {
+    'employee': ('EMPLOYEE_ANOMALY_DETECTION', ANOMALY_FEATURES['EMPLOYEE_ANOMALY_DETECTION']),
+    'supervisor': ('SUPERVISOR_ANOMALY_DETECTION', ANOMALY_FEATURES['SUPERVISOR_ANOMALY_DETECTION']),
+}
+
+
+def synthetic_features(model_type, columns, n, seed=0):
+    """n filas remuestreadas del CSV de entrenamiento con ruido multiplicativo (±20%)."""
+    base = pd.read_csv(os.path.join(BASE_DIR, ANOMALY_MODELS[model_type][1]))[columns].to_numpy(dtype=np.float64)
+    rng = np.random.RandomState(seed)
+    rows = base[rng.randint(0, len(base), size=n)] * rng.uniform(0.8, 1.2, size=(n, len(columns)))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def legacy_scores(model, features):
+    """Implementación anterior: decision_function y predict por separado (el bosque se recorre dos veces)."""
+    return model.decision_function(features), model.predict(features)
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, round(float(np.median(times)), 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el puntaje del IsolationForest activo sobre poblaciones sintéticas: decision_function + predict '
+        '(antes), una sola pasada y por trozos en paralelo con distintas cantidades de hilos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--population', choices=sorted(POPULATIONS), default='employee')
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000], help='Filas a puntuar')
+        parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4], help='Hilos a comparar')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Filas por trozo')
+        parser.add_argument('--repeat', type=int, default=3, help='Ejecuciones a promediar (mediana)')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        model_type, columns = POPULATIONS[options['population']]
+        path = active_artifact_path(model_type)
+        if path is None:
+            raise CommandError(f"No hay un modelo activo de {model_type} (ver ensure_anomaly_models)")
+        model = load_artifact(path)
+
+        report = {'population': options['population'], 'artifact': os.path.basename(path),
+                  'chunk_size': options['chunk_size'], 'cpus': len(os.sched_getaffinity(0)), 'results': []}
+        for n in options['rows']:
+            features = synthetic_features(model_type, columns, n)
+            (scores, labels), before_ms = timed(lambda: legacy_scores(model, features), options['repeat'])
+            result = {'rows': n, 'before_ms': before_ms, 'jobs': {}}
+            for n_jobs in options['jobs']:
+                chunked, ms = timed(
+                    lambda: score_isolation_forest(model, features, n_jobs=n_jobs, chunk_size=options['chunk_size']),
+                    options['repeat'],
+                )
+                result['jobs'][n_jobs] = {
+                    'ms': ms,
+                    'identical': bool(np.array_equal(chunked, scores) and np.array_equal(np.where(chunked < 0, -1, 1), labels)),
+                }
+            report['results'].append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['population']} ({report['artifact']}), trozos de {report['chunk_size']} filas, {report['cpus']} núcleos"
+        )
+        for r in report['results']:
+            jobs = '  '.join(
+                f"{n_jobs} hilo(s) {j['ms']:>8.1f} ms{'' if j['identical'] else ' DIFERENTES'}" for n_jobs, j in r['jobs'].items()
+            )
+            self.stdout.write(f"{r['rows']:>9} filas  antes {r['before_ms']:>8.1f} ms  {jobs}")
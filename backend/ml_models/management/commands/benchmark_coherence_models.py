@@ -0,0 +1,94 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+
+from ml_models.utils.coherence_model_ml import (
+    distill_fast_model, load_data_from_db, new_forest_classifier, new_tfidf_vectorizer
+)
+from ml_models.utils.file_utils import normalize_text
+
+
+def timed_predictions(predict, texts):
+    """Predice de a un texto (como en la API) y devuelve predicciones y latencias en ms."""
+    predictions, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        predictions.append(predict(text))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return predictions, np.asarray(latencies)
+
+
+def summarize(name, predictions, latencies, y_true, forest_predictions, fallback_rate=None):
+    return {
+        'model': name,
+        'accuracy': round(float(np.mean(np.asarray(predictions) == y_true)), 4),
+        'agreement_with_forest': round(float(np.mean(np.asarray(predictions) == forest_predictions)), 4),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'forest_fallback_rate': fallback_rate,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara exactitud y latencia del bosque de coherencia contra el modelo lineal destilado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test-size', type=float, default=0.2, help='Proporción del split de evaluación')
+        parser.add_argument('--thresholds', type=float, nargs='+', default=[0.3, 0.4, 0.5, 0.6, 0.7],
+                            help='Confianzas mínimas del modelo rápido a evaluar en cascada')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        data = load_data_from_db()
+        types = np.asarray(data['types'])
+        train_idx, test_idx = train_test_split(
+            np.arange(len(types)), test_size=options['test_size'], random_state=42, stratify=types
+        )
+
+        # Mismo entrenamiento que train_and_save_coherence_model, sin guardar artefactos
+        forest = make_pipeline(new_tfidf_vectorizer(), new_forest_classifier())
+        X_train = forest[0].fit_transform(data['texts'].take(train_idx))
+        forest[-1].fit(X_train, types[train_idx])
+        fast = distill_fast_model(forest, X_train)
+
+        texts = [normalize_text(text) for text in data['texts'].take(test_idx)]
+        y_true = types[test_idx]
+
+        forest_pred, forest_ms = timed_predictions(lambda t: forest.predict([t])[0], texts)
+        fast_proba, fast_ms = timed_predictions(lambda t: fast.predict_proba([t])[0], texts)
+        fast_pred = fast.classes_[np.argmax(fast_proba, axis=1)]
+        forest_pred = np.asarray(forest_pred)
+
+        results = [
+            summarize('forest', forest_pred, forest_ms, y_true, forest_pred),
+            summarize('fast', fast_pred, fast_ms, y_true, forest_pred),
+        ]
+
+        # Cascada: el bosque solo se consulta cuando la confianza del lineal es baja
+        confidence = np.max(fast_proba, axis=1)
+        for threshold in options['thresholds']:
+            fallback = confidence < threshold
+            cascade_pred = np.where(fallback, forest_pred, fast_pred)
+            cascade_ms = fast_ms + np.where(fallback, forest_ms, 0)
+            results.append(summarize(
+                f'cascade@{threshold}', cascade_pred, cascade_ms, y_true, forest_pred,
+                fallback_rate=round(float(fallback.mean()), 4)
+            ))
+
+        report = {'train_samples': len(train_idx), 'test_samples': len(test_idx), 'results': results}
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Entrenamiento: {report['train_samples']} - Evaluación: {report['test_samples']}")
+        self.stdout.write(f"{'modelo':<14} {'exactitud':>9} {'acuerdo':>8} {'media ms':>9} {'p95 ms':>8} {'fallback':>9}")
+        for r in results:
+            fallback = '-' if r['forest_fallback_rate'] is None else f"{r['forest_fallback_rate']:.2%}"
+            self.stdout.write(
+                f"{r['model']:<14} {r['accuracy']:>9.4f} {r['agreement_with_forest']:>8.4f} "
+                f"{r['mean_ms']:>9.2f} {r['p95_ms']:>8.2f} {fallback:>9}"
+            )
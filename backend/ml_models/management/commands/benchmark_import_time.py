@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Librerías que no deberían importarse al arrancar (se importan en la primera predicción o PDF)
+HEAVY_MODULES = ['pandas', 'sklearn', 'lightgbm', 'scipy', 'pytesseract', 'pdfminer', 'PyPDF2', 'reportlab', 'pdfrw', 'img2pdf']
+
+
+def parse_importtime(stderr):
+    """Líneas de -X importtime -> {módulo: (self_us, cumulative_us, nivel)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), level)
+    return modules
+
+
+def run_once(command, warmup):
+    env = {**os.environ, 'ML_WARMUP_MODELS': '1' if warmup else '0'}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', *command],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    return wall_ms, parse_importtime(result.stderr)
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de arranque (python -X importtime) de un comando de manage.py, por defecto check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Ejecuciones a promediar (mediana)')
+        parser.add_argument('--top', type=int, default=10, help='Módulos de primer nivel más costosos a mostrar')
+        parser.add_argument('--warmup', action='store_true', help='Mide con ML_WARMUP_MODELS=1')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+        parser.add_argument('command', nargs='*', default=['check'], help='Comando de manage.py a medir')
+
+    def handle(self, *args, **options):
+        command = options['command'] or ['check']
+        runs = [run_once(command, options['warmup']) for _ in range(options['repeat'])]
+        walls = [wall for wall, _ in runs]
+        # Los imports de la ejecución con la mediana de tiempo total
+        _, modules = runs[int(np.argsort(walls)[len(walls) // 2])]
+
+        top_level = {name: cumulative for name, (_, cumulative, level) in modules.items() if level == 0}
+        report = {
+            'command': ' '.join(command),
+            'warmup': options['warmup'],
+            'wall_ms': round(float(np.median(walls)), 1),
+            'import_ms': round(sum(top_level.values()) / 1000, 1),
+            'heavy_modules_imported': [name for name in HEAVY_MODULES if name in modules],
+            'top_modules': [
+                {'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+                for name, cumulative in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"manage.py {report['command']}{' (warmup)' if report['warmup'] else ''}: "
+            f"{report['wall_ms']} ms en total, {report['import_ms']} ms en imports"
+        )
+        self.stdout.write(f"Librerías pesadas importadas: {', '.join(report['heavy_modules_imported']) or 'ninguna'}")
+        for m in report['top_modules']:
+            self.stdout.write(f"  {m['cumulative_ms']:>8.1f} ms  {m['module']}")
@@ -0,0 +1,105 @@
+import json
+import multiprocessing
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from ml_models.utils.model_loader import clear_artifacts, default_artifact_paths, load_artifact
+
+
+def read_memory_kb():
+    """Lee Rss/Pss/Private del proceso actual desde /proc (solo Linux)."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def exercise_artifact(artifact):
+    """Hace una predicción mínima para que el worker toque las estructuras del modelo."""
+    if hasattr(artifact, 'type_encoder'):
+        artifact.predict_proba(['certificado medico de prueba'], [artifact.type_encoder.classes_[0]])
+    elif hasattr(artifact, 'steps'):
+        artifact.predict_proba(['certificado medico de prueba'])
+    elif hasattr(artifact, 'decision_function') and hasattr(artifact, 'n_features_in_'):
+        artifact.decision_function(np.zeros((1, artifact.n_features_in_)))
+
+
+def worker(paths, mmap_mode, queue):
+    for path in paths:
+        exercise_artifact(load_artifact(path, mmap_mode=mmap_mode))
+    queue.put(read_memory_kb())
+
+
+def run_scenario(paths, n_workers, mmap_mode):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    processes = [context.Process(target=worker, args=(paths, mmap_mode, queue)) for _ in range(n_workers)]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return results
+
+
+def summarize(results):
+    return {
+        'workers': len(results),
+        'avg_rss_mb': round(sum(r['rss'] for r in results) / len(results) / 1024, 1),
+        'avg_pss_mb': round(sum(r['pss'] for r in results) / len(results) / 1024, 1),
+        'avg_private_mb': round(sum(r['private'] for r in results) / len(results) / 1024, 1),
+        'total_pss_mb': round(sum(r['pss'] for r in results) / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Mide la memoria por worker con modelos cargados por proceso vs. precargados y mapeados en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Cantidad de workers simulados')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        paths = [p for p in default_artifact_paths(active_models=True) if p.exists()]
+        if not paths:
+            self.stderr.write('No hay artefactos de modelos para medir.')
+            return
+
+        connections.close_all()
+
+        # Antes: cada worker carga su propia copia completa de cada modelo
+        clear_artifacts()
+        before = summarize(run_scenario(paths, options['workers'], mmap_mode=None))
+
+        # Después: el master precarga con mmap y los workers heredan los objetos
+        clear_artifacts()
+        for path in paths:
+            load_artifact(path)
+        after = summarize(run_scenario(paths, options['workers'], mmap_mode='r'))
+
+        report = {
+            'artifacts': [p.name for p in paths],
+            'private_load': before,
+            'preload_mmap': after,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Artefactos: {', '.join(report['artifacts'])}")
+        for name in ('private_load', 'preload_mmap'):
+            s = report[name]
+            self.stdout.write(
+                f"{name:<14} workers={s['workers']} rss={s['avg_rss_mb']}MB "
+                f"pss={s['avg_pss_mb']}MB privada={s['avg_private_mb']}MB pss_total={s['total_pss_mb']}MB"
+            )
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import multiprocessing
+import queue
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from sklearn.metrics import accuracy_score, f1_score
+
+from ml_models.models import LicenseDatasetEntry, MLModel
+from ml_models.utils.coherence_model_ml import MODEL_PATH as COHERENCE_MODEL_PATH
+from ml_models.utils.evaluation_model import APPROVAL_MODEL_PATH, REJECTION_MODEL_PATH
+
+# Modelo -> (artefacto en producción, tipo de MLModel, registros del set de evaluación que usa, etiqueta)
+MODELS = {
+    'approval': (APPROVAL_MODEL_PATH, 'LICENSE_APPROVAL', lambda row: True, lambda row: int(row['status'] == 'approved')),
+    'rejection': (REJECTION_MODEL_PATH, 'REJECTION_REASON',
+                  lambda row: row['status'] == 'rejected' and row['reason'], lambda row: row['reason']),
+    'coherence': (COHERENCE_MODEL_PATH, 'CLASSIFICATION', lambda row: row['status'] == 'approved', lambda row: row['type']),
+}
+
+# Segundos máximos por versión (un hijo que muere sin responder, por ejemplo por OOM, no cuelga el comando)
+DEFAULT_TIMEOUT_SECONDS = 600
+
+
+def read_peak_kb():
+    """Pico y actual de memoria residente del proceso (VmHWM / VmRSS de /proc, solo Linux)."""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmHWM', 'VmRSS'):
+                values[key] = int(value.split()[0])
+    return values.get('VmHWM', 0), values.get('VmRSS', 0)
+
+
+def last_trained_id(model_type):
+    """Último registro del dataset que vio el modelo activo (los posteriores no se usaron para entrenar)."""
+    ml_model = MLModel.objects.filter(model_type=model_type, department__isnull=True, is_active=True).first()
+    return ml_model.last_training_id if ml_model else None
+
+
+def export_eval_set(path, after_id, limit=None):
+    """
+    Congela los registros del dataset posteriores a after_id (texto ya normalizado, etiquetas y peso)
+    en un JSON. Son registros que el modelo de referencia no vio al entrenar: medir sobre los de
+    entrenamiento favorece a la versión que vio más filas.
+    """
+    rows = LicenseDatasetEntry.objects.filter(id__gt=after_id).order_by('id').values(
+        'id', 'text', 'type', 'status', 'reason', 'weight'
+    )
+    if limit:
+        rows = rows[:limit]
+    rows = list(rows)
+    content = json.dumps(rows, ensure_ascii=False, sort_keys=True)
+    eval_set = {
+        'exported_at': timezone.now().isoformat(),
+        'after_id': after_id,
+        'sha256': hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        'rows': rows,
+    }
+    Path(path).write_text(json.dumps(eval_set, ensure_ascii=False), encoding='utf-8')
+    return eval_set
+
+
+def predict(model, texts, types):
+    if hasattr(model, 'type_encoder'):
+        return model.predict(texts, types)
+    return model.predict(texts)
+
+
+def benchmark_artifact(path, texts, types, y_true, weights, latency_samples, batch_size):
+    """Carga el artefacto y mide exactitud, latencias, throughput y memoria. Corre en un proceso aparte."""
+    _, rss_before = read_peak_kb()
+    start = time.perf_counter()
+    model = joblib.load(path, mmap_mode='r')
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Tipos de licencia que el modelo no vio al entrenar no se pueden codificar
+    if hasattr(model, 'type_encoder'):
+        known = np.isin(types, model.type_encoder.classes_)
+        texts, types, y_true, weights = texts[known], types[known], y_true[known], weights[known]
+
+    latencies = []
+    for i in range(min(latency_samples, len(texts))):
+        start = time.perf_counter()
+        predict(model, texts[i:i + 1].tolist(), types[i:i + 1].tolist())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    y_pred = np.concatenate([
+        predict(model, texts[i:i + batch_size].tolist(), types[i:i + batch_size].tolist())
+        for i in range(0, len(texts), batch_size)
+    ]) if len(texts) else np.empty(0)
+    batch_seconds = time.perf_counter() - start
+
+    peak_kb, _ = read_peak_kb()
+    return {
+        'artifact': str(path),
+        'size_kb': round(Path(path).stat().st_size / 1024, 1),
+        'load_ms': round(load_ms, 1),
+        'samples': len(y_true),
+        'accuracy': round(accuracy_score(y_true, y_pred, sample_weight=weights), 4),
+        'f1_macro': round(f1_score(y_true, y_pred, average='macro', sample_weight=weights, zero_division=0), 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        'throughput_per_s': round(len(texts) / batch_seconds, 1) if batch_seconds else None,
+        'peak_memory_mb': round((peak_kb - rss_before) / 1024, 1),
+    }
+
+
+def _child(results, *args):
+    try:
+        results.put(('ok', benchmark_artifact(*args)))
+    except Exception as e:
+        results.put(('error', f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(path, *args, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """Corre benchmark_artifact en un proceso nuevo: el pico de memoria y la carga no dependen del anterior."""
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=_child, args=(results, path, *args))
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            status, result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                process.join()
+                raise CommandError(f"{path}: el proceso terminó sin resultado (exitcode {process.exitcode})")
+            if time.monotonic() > deadline:
+                process.terminate()
+                process.join()
+                raise CommandError(f"{path}: sin resultado después de {timeout} s")
+    process.join()
+    if status == 'error':
+        raise CommandError(f"{path}: {result}")
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara dos versiones de un modelo (artefactos joblib) sobre un set de evaluación congelado: '
+        'exactitud/F1, latencia de a un certificado, throughput por lotes, memoria y tiempo de carga'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS), help='Modelo a comparar')
+        parser.add_argument('--baseline', default=None, help='Artefacto de referencia (por defecto, el de producción)')
+        parser.add_argument('--candidate', default=None, help='Artefacto a comparar contra el de referencia')
+        parser.add_argument('--eval-set', default=None, help='Set de evaluación exportado con --export-eval-set')
+        parser.add_argument('--export-eval-set', default=None,
+                            help='Exporta los registros que el modelo activo no vio al entrenar a este archivo y termina')
+        parser.add_argument('--after-id', type=int, default=None,
+                            help='Exporta los registros con id mayor a este (por defecto, last_training_id del modelo activo)')
+        parser.add_argument('--limit', type=int, default=None, help='Registros máximos a exportar')
+        parser.add_argument('--latency-samples', type=int, default=200, help='Predicciones individuales para p50/p95')
+        parser.add_argument('--batch-size', type=int, default=256, help='Tamaño de lote para el throughput')
+        parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT_SECONDS, help='Segundos máximos por versión')
+        parser.add_argument('--output', default=None, help='Agrega el resultado como una línea JSON a este archivo')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        production_path, model_type, include, label = MODELS[options['model']]
+        if options['export_eval_set']:
+            after_id = options['after_id'] if options['after_id'] is not None else last_trained_id(model_type)
+            if after_id is None:
+                raise CommandError(f"No hay un modelo activo de {model_type}: indicar --after-id")
+            eval_set = export_eval_set(options['export_eval_set'], after_id, options['limit'])
+            if not eval_set['rows']:
+                raise CommandError(f"No hay registros posteriores al id {after_id} (no usados para entrenar)")
+            self.stdout.write(
+                f"Set de evaluación: {len(eval_set['rows'])} registros con id > {after_id} "
+                f"(sha256 {eval_set['sha256'][:12]})"
+            )
+            return
+
+        if not options['eval_set']:
+            raise CommandError('Indicar --eval-set (se crea con --export-eval-set)')
+        eval_set = json.loads(Path(options['eval_set']).read_text(encoding='utf-8'))
+
+        rows = [row for row in eval_set['rows'] if include(row)]
+        if not rows:
+            raise CommandError('El set de evaluación no tiene registros para este modelo')
+        texts = np.asarray([row['text'] for row in rows], dtype=object)
+        types = np.asarray([row['type'] for row in rows], dtype=object)
+        y_true = np.asarray([label(row) for row in rows])
+        weights = np.asarray([row.get('weight', 1) for row in rows], dtype=np.float64)
+
+        versions = {'baseline': options['baseline'] or production_path}
+        if options['candidate']:
+            versions['candidate'] = options['candidate']
+        for path in versions.values():
+            if not Path(path).exists():
+                raise CommandError(f"No existe el artefacto {path}")
+
+        # Los procesos hijos no deben heredar las conexiones abiertas
+        connections.close_all()
+        results = {
+            name: run_isolated(
+                path, texts, types, y_true, weights, options['latency_samples'], options['batch_size'],
+                timeout=options['timeout']
+            )
+            for name, path in versions.items()
+        }
+
+        report = {
+            'model': options['model'],
+            'run_at': timezone.now().isoformat(),
+            'eval_set': {
+                'path': options['eval_set'], 'sha256': eval_set['sha256'], 'rows': len(rows),
+                'after_id': eval_set.get('after_id'),
+            },
+            **results,
+        }
+        if 'candidate' in results:
+            report['delta'] = {
+                key: round(results['candidate'][key] - results['baseline'][key], 4)
+                for key in ('accuracy', 'f1_macro', 'p50_ms', 'p95_ms', 'throughput_per_s', 'peak_memory_mb', 'load_ms')
+                if results['candidate'][key] is not None and results['baseline'][key] is not None
+            }
+
+        if options['output']:
+            with open(options['output'], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report) + '\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report['model']}: {len(rows)} registros del set {eval_set['sha256'][:12]}")
+        self.stdout.write(
+            f"{'versión':<10} {'exactitud':>9} {'f1':>7} {'p50 ms':>7} {'p95 ms':>7} "
+            f"{'filas/s':>9} {'pico MB':>8} {'carga ms':>9}"
+        )
+        for name, r in results.items():
+            p50, p95 = (f"{r[key]:.2f}" if r[key] is not None else '-' for key in ('p50_ms', 'p95_ms'))
+            self.stdout.write(
+                f"{name:<10} {r['accuracy']:>9.4f} {r['f1_macro']:>7.4f} {p50:>7} {p95:>7} "
+                f"{r['throughput_per_s']:>9.1f} {r['peak_memory_mb']:>8.1f} {r['load_ms']:>9.1f}"
+            )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_models.utils.feature_cache import backfill_entry_features, load_dataset_features
+
+
+class Command(BaseCommand):
+    help = 'Calcula los conteos hasheados (LicenseDatasetFeatures) de los registros del dataset que no los tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild-cache', action='store_true',
+                            help='Después reconstruye el caché de features de los entrenamientos incrementales')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stored = backfill_entry_features()
+        self.stdout.write(f"Features calculadas: {stored} registros ({time.perf_counter() - start:.1f} s)")
+
+        if options['rebuild_cache']:
+            start = time.perf_counter()
+            features, _ = load_dataset_features(rebuild=True)
+            self.stdout.write(
+                f"Caché reconstruido: {len(features.ids)} registros ({time.perf_counter() - start:.1f} s)"
+            )
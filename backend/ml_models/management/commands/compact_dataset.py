@@ -0,0 +1,34 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_models.utils.near_duplicates import NEAR_DUPLICATE_THRESHOLD, compact_near_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Colapsa los casi duplicados del dataset de entrenamiento (MinHash/LSH) sumando sus pesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=NEAR_DUPLICATE_THRESHOLD,
+                            help='Jaccard estimado mínimo para considerar dos certificados iguales')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo informa (los registros sin firma igual se indexan)')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        summary = compact_near_duplicates(threshold=options['threshold'], dry_run=options['dry_run'])
+        summary['seconds'] = round(time.perf_counter() - start, 2)
+        summary['dry_run'] = options['dry_run']
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'Simulación: ' if options['dry_run'] else ''}"
+            f"{summary['entries_before']} -> {summary['entries_after']} registros "
+            f"({summary['collapsed']} casi duplicados en {summary['clusters']} grupos), "
+            f"peso total {summary['total_weight']}, {summary['seconds']}s"
+        )
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ml_models.models import LicenseDatasetEntry
+from ml_models.utils.artifact_export import compact_model
+from ml_models.utils.coherence_model_ml import MODEL_PATH as COHERENCE_MODEL_PATH
+from ml_models.utils.evaluation_model import APPROVAL_MODEL_PATH, REJECTION_MODEL_PATH
+from ml_models.utils.file_utils import normalize_text
+from ml_models.utils.model_loader import save_artifact
+
+
+def load_time_ms(path, repeat=5):
+    """Mediana del tiempo de joblib.load (sin caché de proceso)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        joblib.load(path, mmap_mode='r')
+        times.append((time.perf_counter() - start) * 1000)
+    return round(float(np.median(times)), 1)
+
+
+def predictions(model, texts, types):
+    if hasattr(model, 'type_encoder'):
+        known = set(model.type_encoder.classes_)
+        rows = [i for i, t in enumerate(types) if t in known]
+        return model.predict_proba([texts[i] for i in rows], [types[i] for i in rows])
+    return model.predict_proba([normalize_text(text) for text in texts])
+
+
+class Command(BaseCommand):
+    help = 'Exporta los modelos de texto en formato compacto (vocabulario podado, sin atributos de entrenamiento)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo mide, no reemplaza los artefactos')
+        parser.add_argument('--samples', type=int, default=500, help='Registros del dataset para verificar predicciones')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        rows = list(LicenseDatasetEntry.objects.order_by('id').values_list('text', 'type')[:options['samples']])
+        texts = [text for text, _ in rows]
+        types = [license_type for _, license_type in rows]
+
+        report = []
+        for path in (APPROVAL_MODEL_PATH, REJECTION_MODEL_PATH, COHERENCE_MODEL_PATH):
+            path = Path(path)
+            if not path.exists():
+                continue
+
+            model = joblib.load(path)
+            compact = compact_model(model)
+            if compact is model:
+                report.append({'artifact': path.name, 'status': 'sin cambios'})
+                continue
+
+            # Las predicciones tienen que ser idénticas antes de reemplazar el artefacto
+            identical = bool(np.array_equal(predictions(model, texts, types), predictions(compact, texts, types)))
+
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.joblib')
+            os.close(fd)
+            try:
+                save_artifact(compact, tmp_path)
+                result = {
+                    'artifact': path.name,
+                    'status': 'compactado' if identical and not options['dry_run'] else 'medido',
+                    'identical_predictions': identical,
+                    'size_before_kb': round(path.stat().st_size / 1024, 1),
+                    'size_after_kb': round(os.path.getsize(tmp_path) / 1024, 1),
+                    'load_before_ms': load_time_ms(path),
+                    'load_after_ms': load_time_ms(tmp_path),
+                }
+                if identical and not options['dry_run']:
+                    save_artifact(compact, path)
+            finally:
+                os.remove(tmp_path)
+            report.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for r in report:
+            if 'size_before_kb' not in r:
+                self.stdout.write(f"{r['artifact']}: {r['status']}")
+                continue
+            self.stdout.write(
+                f"{r['artifact']}: {r['status']} (predicciones idénticas: {'sí' if r['identical_predictions'] else 'NO'}) "
+                f"tamaño {r['size_before_kb']} KB -> {r['size_after_kb']} KB, "
+                f"carga {r['load_before_ms']} ms -> {r['load_after_ms']} ms"
+            )
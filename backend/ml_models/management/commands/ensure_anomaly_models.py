@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ml_models.anomalies.isolation_forest import ANOMALY_MODELS, ensure_anomaly_model
+
+
+class Command(BaseCommand):
+    help = (
+        'Deja un modelo de anomalías activo por tipo antes de levantar el servidor: registra el último '
+        '.pkl existente o entrena uno nuevo. Las requests nunca entrenan (sin modelo responden 503)'
+    )
+
+    def handle(self, *args, **options):
+        for model_type in ANOMALY_MODELS:
+            action, ml_model = ensure_anomaly_model(model_type)
+            detail = f" ({ml_model}, {ml_model.artifact})" if ml_model else ''
+            self.stdout.write(f"{model_type:<30} {action}{detail}")
@@ -0,0 +1,49 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from ml_models.utils.anomaly_results import POPULATIONS, AnomalyModelNotReady, refresh_anomaly_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los resultados de anomalías de supervisores y empleados (todo el historial y las '
+        'ventanas indicadas) y los guarda para que los endpoints los lean sin volver a puntuar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--population', choices=sorted(POPULATIONS), nargs='+', default=sorted(POPULATIONS),
+                            help='Poblaciones a refrescar (por defecto, ambas)')
+        parser.add_argument('--window', nargs=2, action='append', default=[], metavar=('DESDE', 'HASTA'),
+                            help='Ventana adicional (YYYY-MM-DD YYYY-MM-DD); se puede repetir')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Minutos entre refrescos; sin esta opción refresca una vez y termina')
+
+    def handle(self, *args, **options):
+        windows = [(None, None)]
+        for start, end in options['window']:
+            try:
+                windows.append((date.fromisoformat(start), date.fromisoformat(end)))
+            except ValueError as e:
+                raise CommandError(f"Ventana inválida {start} {end}: {e}")
+
+        while True:
+            close_old_connections()
+            for population in options['population']:
+                for start, end in windows:
+                    started = time.perf_counter()
+                    try:
+                        result_set = refresh_anomaly_results(population, start, end)
+                    except AnomalyModelNotReady as e:
+                        self.stderr.write(str(e))
+                        break
+                    window = f"{start} - {end}" if start else 'todo'
+                    self.stdout.write(
+                        f"{population:<10} {window:<23} {result_set.rows:>7} filas  modelo {result_set.ml_model_id}  "
+                        f"{time.perf_counter() - started:.1f} s"
+                    )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'] * 60)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ml_models.utils.inference_server import (
+    DEFAULT_BATCH_WAIT_MS, DEFAULT_MAX_BATCH, InferenceServer, inference_socket
+)
+from ml_models.utils.model_loader import preload_artifacts
+
+
+class Command(BaseCommand):
+    help = 'Servidor local de inferencia: carga los modelos una vez y agrupa las predicciones de todos los workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help='Ruta del socket Unix (por defecto, ML_INFERENCE_SOCKET)')
+        parser.add_argument('--batch-wait-ms', type=float, default=DEFAULT_BATCH_WAIT_MS,
+                            help='Espera máxima para juntar solicitudes en un lote')
+        parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH, help='Solicitudes máximas por lote')
+
+    def handle(self, *args, **options):
+        address = options['socket'] or inference_socket()
+        if not address:
+            raise CommandError('Indicar --socket o configurar ML_INFERENCE_SOCKET')
+
+        loaded = preload_artifacts(active_models=True)
+        connections.close_all()
+        self.stdout.write(f"Modelos precargados: {', '.join(p.name for p in loaded) or 'ninguno'}")
+        self.stdout.write(f"Escuchando en {address}")
+
+        server = InferenceServer(address, batch_wait_ms=options['batch_wait_ms'], max_batch=options['max_batch'])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for name, stats in server.stats.items():
+                self.stdout.write(f"{name}: {stats['items']} solicitudes en {stats['batches']} lotes")
@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ml_models.utils.training_jobs import claim_next_job, fail_stale_jobs, run_job
+from ml_models.utils.training_orchestrator import default_cpu_budget
+
+
+class Command(BaseCommand):
+    help = 'Worker que ejecuta los entrenamientos de modelos encolados desde la API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesa los jobs pendientes y termina')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Segundos entre consultas de jobs nuevos')
+        parser.add_argument('--incremental', action='store_true', help='Entrena en modo incremental en lugar de completo')
+        parser.add_argument('--cpus', type=int, default=None, help='Núcleos para cada entrenamiento (por defecto, todos)')
+        parser.add_argument('--stale-after', type=int, default=10,
+                            help='Minutos sin latidos tras los cuales un job en ejecución se considera abandonado')
+
+    def handle(self, *args, **options):
+        n_jobs = options['cpus'] or default_cpu_budget()
+        stale_after = timedelta(minutes=options['stale_after'])
+        self.stdout.write(f"Worker de entrenamiento iniciado (n_jobs={n_jobs})")
+
+        while True:
+            close_old_connections()
+            stale = fail_stale_jobs(stale_after)
+            if stale:
+                self.stderr.write(f"{stale} job(s) abandonados marcados como fallidos")
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Job #{job.pk}: entrenando {job.model_type}")
+            ok = run_job(job, incremental=options['incremental'], n_jobs=n_jobs)
+            self.stdout.write(f"Job #{job.pk}: {'finalizado' if ok else 'fallido'}")
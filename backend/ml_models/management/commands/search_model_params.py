@@ -0,0 +1,77 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from sklearn.model_selection import StratifiedKFold
+
+from ml_models.utils.evaluation_model import (
+    ApprovalClassifier, load_approval_data, load_rejection_reasons_data, new_rejection_classifier
+)
+from ml_models.utils.model_selection import cross_validate_cached, sample_param_sets
+from ml_models.utils.training_orchestrator import default_cpu_budget
+
+# modelo -> (cargador, columna de etiquetas, constructor del clasificador, métrica)
+SEARCH_TARGETS = {
+    'LICENSE_APPROVAL': (load_approval_data, 'approved', ApprovalClassifier, 'accuracy'),
+    'REJECTION_REASON': (load_rejection_reasons_data, 'reasons', new_rejection_classifier, 'balanced_accuracy'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Búsqueda de hiperparámetros de LightGBM con validación cruzada sobre folds featurizados y cacheados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=list(SEARCH_TARGETS), default='LICENSE_APPROVAL')
+        parser.add_argument('--folds', type=int, default=3, help='Cantidad de folds')
+        parser.add_argument('--n-iter', type=int, default=10,
+                            help='Combinaciones al azar a evaluar (0 = grilla completa)')
+        parser.add_argument('--jobs', type=int, default=None, help='Ajustes en paralelo (por defecto, todos los núcleos)')
+        parser.add_argument('--top', type=int, default=5, help='Cantidad de resultados a mostrar')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado en JSON')
+
+    def handle(self, *args, **options):
+        load_data, label_key, make_model, scoring = SEARCH_TARGETS[options['model']]
+        data = load_data()
+        labels = data[label_key]
+        if len(labels) < options['folds'] * 2:
+            self.stderr.write('No hay suficientes registros para la validación cruzada.')
+            return
+
+        skf = StratifiedKFold(n_splits=options['folds'], shuffle=True, random_state=42)
+        splits = list(skf.split(np.zeros(len(labels)), labels))
+        watermark = {'first_id': data['first_id'], 'last_id': data['last_id'], 'n': len(labels)}
+        param_sets = [{}] + sample_param_sets(n_iter=options['n_iter'] or None)
+
+        start = time.perf_counter()
+        results = cross_validate_cached(
+            make_model, data['texts'], data['types'], labels, splits, watermark,
+            param_sets=param_sets,
+            scoring=scoring,
+            n_jobs=options['jobs'] or default_cpu_budget(),
+            weights=data['weights']
+        )
+        elapsed = round(time.perf_counter() - start, 2)
+
+        report = {
+            'model': options['model'],
+            'scoring': scoring,
+            'folds': options['folds'],
+            'param_sets': len(param_sets),
+            'seconds': elapsed,
+            'results': [
+                {'params': r['params'] or 'actuales', 'mean': r['mean'], 'std': r['std']}
+                for r in results[:options['top']]
+            ],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['model']}: {report['param_sets']} combinaciones x {report['folds']} folds "
+            f"en {elapsed}s ({scoring})"
+        )
+        for r in report['results']:
+            self.stdout.write(f"  {r['mean']:.4f} ± {r['std']:.4f}  {r['params']}")
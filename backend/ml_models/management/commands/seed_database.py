@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.utils.feature_cache import backfill_entry_features
+from ml_models.utils.synthetic_data import BATCH_SIZE, seed_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra la base con datos sintéticos a escala para benchmarks: departamentos, empleados, supervisores, '
+        'licencias con estado y certificado PDF y registros del dataset. Determinista por semilla'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=20, help='Departamentos')
+        parser.add_argument('--users', type=int, default=50000, help='Empleados')
+        parser.add_argument('--supervisors', type=int, default=None,
+                            help='Supervisores (por defecto uno cada 25 empleados y al menos uno por departamento)')
+        parser.add_argument('--licenses', type=int, default=1000000, help='Licencias')
+        parser.add_argument('--license-types', type=int, default=0,
+                            help='Tipos de licencia sintéticos a agregar al catálogo existente')
+        parser.add_argument('--dataset-entries', type=int, default=0, help='Registros de LicenseDatasetEntry')
+        parser.add_argument('--dataset-features', action='store_true',
+                            help='Después calcula los conteos hasheados de los registros del dataset (build_feature_store)')
+        parser.add_argument('--years', type=int, default=3, help='Años de historia de licencias')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Filas por bulk_create')
+        parser.add_argument('--json', action='store_true', help='Imprime el resumen en JSON')
+
+    def handle(self, *args, **options):
+        if options['departments'] < 1 or options['users'] < 1:
+            raise CommandError('Se necesita al menos un departamento y un empleado')
+        if options['supervisors'] is not None and options['supervisors'] < options['departments']:
+            raise CommandError('Cada departamento necesita al menos un supervisor')
+
+        log = None if options['json'] else self.stdout.write
+        start = time.perf_counter()
+        try:
+            summary = seed_database(
+                options['departments'], options['users'], options['licenses'], options['dataset_entries'],
+                n_supervisors=options['supervisors'], n_license_types=options['license_types'], years=options['years'],
+                seed=options['seed'], batch_size=options['batch_size'], log=log,
+            )
+        except ValueError as error:
+            # Semilla ya usada o sin tipos de licencia: se valida antes de escribir
+            raise CommandError(str(error))
+        if options['dataset_features']:
+            features_start = time.perf_counter()
+            summary['dataset_features'] = backfill_entry_features()
+            summary['seconds']['dataset_features'] = round(time.perf_counter() - features_start, 1)
+            if log:
+                log(f"dataset_features: {summary['dataset_features']} ({summary['seconds']['dataset_features']} s)")
+        summary['seconds']['total'] = round(time.perf_counter() - start, 1)
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(f"Sembrado con semilla {summary['seed']} en {summary['seconds']['total']} s")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from ml_models.anomalies.isolation_forest import train_department_anomaly_models
+from users.models import Department
+
+MODEL_TYPES = {'employee': 'EMPLOYEE_ANOMALY_DETECTION', 'supervisor': 'SUPERVISOR_ANOMALY_DETECTION'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Entrena en paralelo un detector de anomalías por departamento con las features de la base. '
+        'Los departamentos chicos usan el modelo global. Se usan al puntuar con ML_ANOMALY_DEPARTMENT_MODELS = True'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--population', choices=sorted(MODEL_TYPES), nargs='+', default=['employee'],
+                            help='Poblaciones a entrenar (por defecto, empleados)')
+        parser.add_argument('--min-size', type=int, default=None,
+                            help='Filas mínimas para un modelo propio (por defecto, ML_ANOMALY_DEPARTMENT_MIN_SIZE o 100)')
+        parser.add_argument('--jobs', type=int, default=None, help='Modelos a entrenar a la vez (por defecto, los núcleos)')
+
+    def handle(self, *args, **options):
+        departments = dict(Department.objects.values_list('department_id', 'name'))
+        for population in options['population']:
+            trained, sizes = train_department_anomaly_models(
+                MODEL_TYPES[population], min_size=options['min_size'], n_jobs=options['jobs']
+            )
+            self.stdout.write(f"{population}: {len(trained)} modelos por departamento")
+            for department_id, rows in sizes.items():
+                ml_model = trained.get(department_id)
+                target = f"v{ml_model.version} ({ml_model.artifact})" if ml_model else 'modelo global'
+                self.stdout.write(f"  {departments.get(department_id, department_id)!s:<30} {rows:>7} filas  {target}")
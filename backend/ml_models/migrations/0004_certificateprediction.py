@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0003_alter_mlmodel_model_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CertificatePrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(db_index=True, max_length=64, verbose_name='Hash del certificado')),
+                ('license_type', models.CharField(choices=[('accidente_trabajo', 'Accidente de trabajo'), ('donacion_sangre', 'Donación de sangre'), ('duelo', 'Duelo tipo A y B'), ('enfermedad', 'Enfermedad'), ('asistencia_familiares', 'Asistencia de familiares'), ('estudios', 'Estudios'), ('matrimonial', 'Matrimonial'), ('mudanza', 'Mudanza'), ('gremial', 'Gremial'), ('nacimiento', 'Nacimiento'), ('salud_materna', 'Salud Materna'), ('vacaciones', 'Vacaciones'), ('otro', 'Otro')], max_length=30, verbose_name='Tipo de licencia')),
+                ('probability_of_approval', models.FloatField(verbose_name='Probabilidad de aprobación')),
+                ('reason_of_rejection', models.TextField(blank=True, null=True, verbose_name='Motivo de rechazo')),
+                ('top_reasons', models.JSONField(blank=True, default=list, verbose_name='Motivos más probables')),
+                ('license_types', models.JSONField(blank=True, default=list, verbose_name='Tipos de licencia más probables')),
+                ('has_code', models.BooleanField(blank=True, null=True, verbose_name='¿Tiene código HFCOD?')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('approval_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ml_models.mlmodel')),
+                ('coherence_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ml_models.mlmodel')),
+                ('rejection_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ml_models.mlmodel')),
+            ],
+            options={
+                'verbose_name': 'Predicción de certificado',
+                'verbose_name_plural': 'Predicciones de certificados',
+                'unique_together': {('content_hash', 'license_type', 'approval_model', 'rejection_model', 'coherence_model')},
+            },
+        ),
+    ]
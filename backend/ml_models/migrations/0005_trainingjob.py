@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import ml_models.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ml_models', '0004_certificateprediction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='training_info',
+            field=models.JSONField(blank=True, encoder=ml_models.models.TrainingInfoEncoder, help_text='Métricas y distribución de clases del entrenamiento', null=True, verbose_name='Información de entrenamiento'),
+        ),
+        migrations.CreateModel(
+            name='TrainingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_type', models.CharField(choices=[('EMPLOYEE_ANOMALY_DETECTION', 'Detección de anomalías de empleados'), ('SUPERVISOR_ANOMALY_DETECTION', 'Detección de anomalías'), ('CLASSIFICATION', 'Coherencia de certificados'), ('REGRESSION', 'Regresión'), ('HEALTH_RISK', 'Predicción de riesgo de salud'), ('LICENSE_APPROVAL', 'Aprobación de licencias'), ('REJECTION_REASON', 'Clasificación de motivo de rechazo')], max_length=50, verbose_name='Tipo de modelo')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('RUNNING', 'En ejecución'), ('SUCCESS', 'Finalizado'), ('FAILED', 'Fallido')], default='PENDING', max_length=10, verbose_name='Estado')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Progreso (%)')),
+                ('message', models.CharField(blank=True, default='', max_length=255, verbose_name='Etapa actual')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('ml_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='training_jobs', to='ml_models.mlmodel', verbose_name='Modelo generado')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Entrenamiento en segundo plano',
+                'verbose_name_plural': 'Entrenamientos en segundo plano',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trainingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'RUNNING'])), fields=('model_type',), name='unique_active_training_job'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0005_trainingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='licensedatasetentry',
+            name='minhash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='licensedatasetentry',
+            name='weight',
+            field=models.PositiveIntegerField(default=1, verbose_name='Peso'),
+        ),
+        migrations.CreateModel(
+            name='LicenseDatasetBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='ml_models.licensedatasetentry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='licensedatasetband',
+            index=models.Index(fields=['band', 'bucket'], name='dataset_band_bucket_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0006_licensedataset_dedup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicenseDatasetFeatures',
+            fields=[
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='ml_models.licensedatasetentry')),
+                ('params_key', models.CharField(max_length=16)),
+                ('indices', models.BinaryField()),
+                ('counts', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0007_licensedatasetfeatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InferenceMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('runner', models.CharField(max_length=30, verbose_name='Modelo de inferencia')),
+                ('batches', models.PositiveBigIntegerField(default=0, verbose_name='Lotes')),
+                ('latency_ms', models.JSONField(default=dict, verbose_name='Latencia (ms)')),
+                ('batch_size', models.JSONField(default=dict, verbose_name='Tamaño de lote')),
+                ('scores', models.JSONField(default=dict, verbose_name='Distribución de scores')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ml_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inference_metrics', to='ml_models.mlmodel')),
+            ],
+            options={
+                'verbose_name': 'Métricas de inferencia',
+                'verbose_name_plural': 'Métricas de inferencia',
+                'unique_together': {('ml_model', 'runner')},
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import ml_models.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ml_models', '0008_inferencemetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyResultSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('population', models.CharField(choices=[('supervisor', 'Supervisores'), ('employee', 'Empleados')], max_length=10, verbose_name='Población')),
+                ('window_start', models.DateField(blank=True, null=True, verbose_name='Desde')),
+                ('window_end', models.DateField(blank=True, null=True, verbose_name='Hasta')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Filas')),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('ml_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_result_sets', to='ml_models.mlmodel')),
+            ],
+            options={
+                'verbose_name': 'Resultados de anomalías',
+                'verbose_name_plural': 'Resultados de anomalías',
+            },
+        ),
+        migrations.CreateModel(
+            name='AnomalyResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_requests', models.PositiveIntegerField()),
+                ('anomaly_score', models.FloatField()),
+                ('is_anomaly', models.BooleanField()),
+                ('data', models.JSONField(encoder=ml_models.models.TrainingInfoEncoder)),
+                ('result_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='ml_models.anomalyresultset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='anomalyresultset',
+            index=models.Index(fields=['population', 'window_start', 'window_end'], name='anomaly_set_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomalyresult',
+            index=models.Index(fields=['result_set', 'is_anomaly', 'anomaly_score'], name='anomaly_result_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomalyresult',
+            index=models.Index(fields=['result_set', 'anomaly_score'], name='anomaly_result_order_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='anomalyresult',
+            unique_together={('result_set', 'user')},
+        ),
+    ]
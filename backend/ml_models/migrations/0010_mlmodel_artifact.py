@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:58
+
+import os
+import re
+
+from django.db import migrations, models
+
+ANOMALY_ARTIFACTS = {
+    'SUPERVISOR_ANOMALY_DETECTION': 'isolation_forest_sup_model',
+    'EMPLOYEE_ANOMALY_DETECTION': 'isolation_forest_emp_model',
+}
+
+
+def link_anomaly_artifacts(apps, schema_editor):
+    """Los modelos de anomalías activos apuntan al último .pkl de su tipo (antes se buscaba en cada request)."""
+    MLModel = apps.get_model('ml_models', 'MLModel')
+    directory = os.path.join('ml_models', 'anomalies')
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    files = os.listdir(os.path.join(backend_dir, directory))
+
+    for model_type, base_name in ANOMALY_ARTIFACTS.items():
+        pattern = re.compile(rf"{re.escape(base_name)}_v(\d+)\.pkl")
+        versions = [(int(pattern.match(name).group(1)), name) for name in files if pattern.match(name)]
+        if versions:
+            MLModel.objects.filter(model_type=model_type, is_active=True, artifact='').update(
+                artifact=os.path.join(directory, max(versions)[1])
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0009_anomalyresultset_anomalyresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='artifact',
+            field=models.CharField(blank=True, default='', help_text='Archivo del modelo entrenado, relativo a BASE_DIR (modelos con versiones en archivos distintos)', max_length=255, verbose_name='Artefacto'),
+        ),
+        migrations.RunPython(link_anomaly_artifacts, migrations.RunPython.noop),
+    ]
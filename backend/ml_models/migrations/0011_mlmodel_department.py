@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 07:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_department_is_high_risk_department'),
+        ('ml_models', '0010_mlmodel_artifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='department',
+            field=models.ForeignKey(blank=True, help_text='Modelo propio de un departamento (anomalías); vacío = modelo global del tipo', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.department', verbose_name='Departamento'),
+        ),
+    ]
@@ -1,7 +1,19 @@
 from django.db import models
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 from django.db import transaction
+
+
+class TrainingInfoEncoder(DjangoJSONEncoder):
+    """Permite guardar métricas con tipos de numpy (np.int64, np.float64) en un JSONField."""
+
+    def default(self, o):
+        if hasattr(o, 'item'):
+            return o.item()
+        return super().default(o)
+
 # Create your models here.
 class LicenseDatasetEntry(models.Model):
     GROUP_CHOICES = [
@@ -29,6 +41,10 @@ class LicenseDatasetEntry(models.Model):
     type = models.CharField(max_length=30, choices=GROUP_CHOICES)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     reason = models.TextField(blank=True, null=True)
+    # Cantidad de certificados casi idénticos que representa este registro (ver compact_dataset)
+    weight = models.PositiveIntegerField(default=1, verbose_name="Peso")
+    # Firma MinHash del texto, para detectar casi duplicados
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
 
     def clean(self):
         if self.status == 'rejected' and not self.reason:
@@ -38,6 +54,37 @@ class LicenseDatasetEntry(models.Model):
         return f"{self.type} ({self.status})"
 
 
+class LicenseDatasetBand(models.Model):
+    """Índice LSH: un bucket por banda de la firma MinHash de cada registro del dataset."""
+    entry = models.ForeignKey(LicenseDatasetEntry, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['band', 'bucket'], name='dataset_band_bucket_idx')]
+
+    def __str__(self):
+        return f"{self.entry_id} banda {self.band}"
+
+
+class LicenseDatasetFeatures(models.Model):
+    """
+    Conteos hasheados del texto de un registro del dataset (ver feature_cache), calculados al
+    insertarlo: los entrenamientos incrementales los leen directamente sin volver a tokenizar.
+    """
+    entry = models.OneToOneField(
+        LicenseDatasetEntry, on_delete=models.CASCADE, primary_key=True, related_name='features'
+    )
+    # Configuración de hashing con la que se calcularon: si cambia, se recalculan
+    params_key = models.CharField(max_length=16)
+    # Columnas hasheadas con conteo distinto de cero y sus conteos, como arrays binarios
+    indices = models.BinaryField()
+    counts = models.BinaryField()
+
+    def __str__(self):
+        return f"Features de {self.entry_id}"
+
+
 class MLModel(models.Model):
     MODEL_TYPES = [
         ('EMPLOYEE_ANOMALY_DETECTION', 'Detección de anomalías de empleados'),
@@ -88,7 +135,30 @@ class MLModel(models.Model):
         null=True,
         blank=True
     )
-    
+    training_info = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=TrainingInfoEncoder,
+        verbose_name="Información de entrenamiento",
+        help_text="Métricas y distribución de clases del entrenamiento"
+    )
+    artifact = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        verbose_name="Artefacto",
+        help_text="Archivo del modelo entrenado, relativo a BASE_DIR (modelos con versiones en archivos distintos)"
+    )
+    department = models.ForeignKey(
+        'users.Department',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Departamento",
+        help_text="Modelo propio de un departamento (anomalías); vacío = modelo global del tipo"
+    )
+
 
     class Meta:
         verbose_name = "Modelo de ML"
@@ -105,8 +175,10 @@ class MLModel(models.Model):
         # Usar transacción atómica para evitar inconsistencias
         with transaction.atomic():
             # Bloquear el registro para evitar condiciones de carrera
+            # (hay una versión activa por tipo y departamento; la global no tiene departamento)
             active_model = MLModel.objects.select_for_update().filter(
                 model_type=self.model_type,
+                department=self.department,
                 is_active=True
             ).first()
             
@@ -119,3 +191,157 @@ class MLModel(models.Model):
                 
             self.is_active = True
             super().save(*args, **kwargs)
+
+            # Las predicciones guardadas con el modelo anterior dejan de ser válidas
+            CertificatePrediction.invalidate_for(self.model_type, active_model)
+
+
+class CertificatePrediction(models.Model):
+    # Tipo de modelo -> campo que guarda la versión usada en la predicción
+    MODEL_FIELDS = {
+        'LICENSE_APPROVAL': 'approval_model',
+        'REJECTION_REASON': 'rejection_model',
+        'CLASSIFICATION': 'coherence_model',
+    }
+
+    content_hash = models.CharField(max_length=64, db_index=True, verbose_name="Hash del certificado")
+    license_type = models.CharField(max_length=30, choices=LicenseDatasetEntry.GROUP_CHOICES, verbose_name="Tipo de licencia")
+    approval_model = models.ForeignKey(MLModel, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    rejection_model = models.ForeignKey(MLModel, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    coherence_model = models.ForeignKey(MLModel, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    probability_of_approval = models.FloatField(verbose_name="Probabilidad de aprobación")
+    reason_of_rejection = models.TextField(blank=True, null=True, verbose_name="Motivo de rechazo")
+    top_reasons = models.JSONField(default=list, blank=True, verbose_name="Motivos más probables")
+    license_types = models.JSONField(default=list, blank=True, verbose_name="Tipos de licencia más probables")
+    has_code = models.BooleanField(null=True, blank=True, verbose_name="¿Tiene código HFCOD?")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Predicción de certificado"
+        verbose_name_plural = "Predicciones de certificados"
+        unique_together = [['content_hash', 'license_type', 'approval_model', 'rejection_model', 'coherence_model']]
+
+    def __str__(self):
+        return f"Predicción {self.content_hash[:12]} ({self.license_type})"
+
+    @classmethod
+    def invalidate_for(cls, model_type, previous_model):
+        """Elimina las predicciones calculadas con el modelo que dejó de estar activo."""
+        field = cls.MODEL_FIELDS.get(model_type)
+        if field is None:
+            return
+        if previous_model is None:
+            cls.objects.filter(**{f'{field}__isnull': True}).delete()
+        else:
+            cls.objects.filter(**{field: previous_model}).delete()
+
+
+class InferenceMetrics(models.Model):
+    """
+    Latencias, tamaños de lote y distribución de scores de un modelo en producción, por versión.
+    Cada proceso acumula en memoria y suma sus histogramas acá periódicamente (ver inference_metrics).
+    """
+    ml_model = models.ForeignKey(MLModel, on_delete=models.CASCADE, null=True, blank=True, related_name='inference_metrics')
+    runner = models.CharField(max_length=30, verbose_name="Modelo de inferencia")
+    batches = models.PositiveBigIntegerField(default=0, verbose_name="Lotes")
+    # Histogramas {'edges', 'counts', 'count', 'sum', 'min', 'max'}
+    latency_ms = models.JSONField(default=dict, verbose_name="Latencia (ms)")
+    batch_size = models.JSONField(default=dict, verbose_name="Tamaño de lote")
+    scores = models.JSONField(default=dict, verbose_name="Distribución de scores")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Métricas de inferencia"
+        verbose_name_plural = "Métricas de inferencia"
+        unique_together = [['ml_model', 'runner']]
+
+    def __str__(self):
+        return f"{self.runner} ({self.ml_model_id})"
+
+
+class AnomalyResultSet(models.Model):
+    """
+    Resultados precalculados del detector de anomalías de una población, para una ventana de
+    fechas (vacía = todo el historial) y una versión del modelo. Los refresca refresh_anomaly_results.
+    """
+    POPULATIONS = [
+        ('supervisor', 'Supervisores'),
+        ('employee', 'Empleados'),
+    ]
+
+    population = models.CharField(max_length=10, choices=POPULATIONS, verbose_name="Población")
+    window_start = models.DateField(null=True, blank=True, verbose_name="Desde")
+    window_end = models.DateField(null=True, blank=True, verbose_name="Hasta")
+    ml_model = models.ForeignKey(MLModel, on_delete=models.CASCADE, null=True, blank=True, related_name='anomaly_result_sets')
+    rows = models.PositiveIntegerField(default=0, verbose_name="Filas")
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Resultados de anomalías"
+        verbose_name_plural = "Resultados de anomalías"
+        indexes = [models.Index(fields=['population', 'window_start', 'window_end'], name='anomaly_set_window_idx')]
+
+    def __str__(self):
+        window = f"{self.window_start} - {self.window_end}" if self.window_start else "todo"
+        return f"{self.population} ({window}, modelo {self.ml_model_id})"
+
+
+class AnomalyResult(models.Model):
+    """Fila de un AnomalyResultSet: un supervisor o empleado con sus features, score y diferencias."""
+    result_set = models.ForeignKey(AnomalyResultSet, on_delete=models.CASCADE, related_name='results')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    total_requests = models.PositiveIntegerField()
+    anomaly_score = models.FloatField()
+    is_anomaly = models.BooleanField()
+    # Fila completa (valores numéricos) tal como la devuelve get_supervisor/employee_anomalies
+    data = models.JSONField(encoder=TrainingInfoEncoder)
+
+    class Meta:
+        unique_together = [['result_set', 'user']]
+        indexes = [
+            models.Index(fields=['result_set', 'is_anomaly', 'anomaly_score'], name='anomaly_result_score_idx'),
+            models.Index(fields=['result_set', 'anomaly_score'], name='anomaly_result_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ({self.anomaly_score:.4f})"
+
+
+class TrainingJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pendiente'),
+        ('RUNNING', 'En ejecución'),
+        ('SUCCESS', 'Finalizado'),
+        ('FAILED', 'Fallido'),
+    ]
+    ACTIVE_STATUSES = ('PENDING', 'RUNNING')
+
+    model_type = models.CharField(max_length=50, choices=MLModel.MODEL_TYPES, verbose_name="Tipo de modelo")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', verbose_name="Estado")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="Progreso (%)")
+    message = models.CharField(max_length=255, blank=True, default='', verbose_name="Etapa actual")
+    error = models.TextField(blank=True, null=True, verbose_name="Error")
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    ml_model = models.ForeignKey(MLModel, on_delete=models.SET_NULL, null=True, blank=True, related_name='training_jobs', verbose_name="Modelo generado")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Lo actualiza el worker mientras entrena: un job en ejecución sin latidos recientes quedó abandonado
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Último latido")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Entrenamiento en segundo plano"
+        verbose_name_plural = "Entrenamientos en segundo plano"
+        constraints = [
+            # Un solo entrenamiento pendiente o en ejecución por tipo de modelo
+            models.UniqueConstraint(
+                fields=['model_type'],
+                condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                name='unique_active_training_job'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model_type} - {self.status} ({self.progress}%)"
+
@@ -4,4 +4,61 @@ from ml_models.models import *
 class MLModelSerializer(serializers.ModelSerializer):
     class Meta:
         model = MLModel
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class TrainingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrainingJob
+        fields = ['id', 'model_type', 'status', 'progress', 'message', 'error',
+                  'ml_model', 'created_at', 'started_at', 'finished_at']
+
+
+class FormattedNumberField(serializers.FloatField):
+    """Número con formato de presentación: `template` sobre el valor multiplicado por `scale`."""
+
+    def __init__(self, template, scale=1, **kwargs):
+        self.template = template
+        self.scale = scale
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.template.format(float(value) * self.scale)
+
+
+class SupervisorAnomalySerializer(serializers.Serializer):
+    """Fila de get_supervisor_anomalies: tasas como porcentaje y diferencias con signo."""
+    evaluator_id = serializers.IntegerField()
+    evaluator_name = serializers.CharField()
+    department = serializers.CharField()
+    total_requests = serializers.IntegerField()
+    approved_requests = serializers.IntegerField()
+    rejected_requests = serializers.IntegerField()
+    approval_rate = FormattedNumberField("{:.2f}%", scale=100)
+    rejection_rate = FormattedNumberField("{:.2f}%", scale=100)
+    anomaly_score = serializers.FloatField()
+    is_anomaly = serializers.IntegerField()
+    approval_rate_diff = FormattedNumberField("{:+.2f}%", scale=100)
+    rejection_rate_diff = FormattedNumberField("{:+.2f}%", scale=100)
+    total_requests_percent = FormattedNumberField("{:.2f}%", scale=100)
+
+
+class EmployeeAnomalySerializer(serializers.Serializer):
+    """Fila de get_employee_anomalies: diferencias con el promedio con signo y participación en %."""
+    employee_id = serializers.IntegerField()
+    employee_name = serializers.CharField()
+    department = serializers.CharField()
+    total_requests = serializers.IntegerField()
+    required_days = serializers.IntegerField()
+    required_days_rate = serializers.FloatField()
+    seniority_days = serializers.IntegerField()
+    days_per_year = serializers.FloatField()
+    mon_fri_requests = serializers.IntegerField()
+    anomaly_score = serializers.FloatField()
+    is_anomaly = serializers.IntegerField()
+    required_days_diff = FormattedNumberField("{:+.2f}")
+    total_requests_diff = FormattedNumberField("{:+.2f}")
+    days_per_year_diff = FormattedNumberField("{:+.2f}")
+    required_days_rate_diff = FormattedNumberField("{:+.2f}")
+    required_days_percent = FormattedNumberField("{:.2f}%", scale=100)
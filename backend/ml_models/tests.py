@@ -1,3 +1,777 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import pickle
+import tempfile
+import threading
+from datetime import date, timedelta
+from multiprocessing.connection import Listener
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PyPDF2 import PdfReader
+from rest_framework.test import APIClient
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from ml_models.anomalies.isolation_forest import (
+    ANOMALY_FEATURES, ANOMALY_MODELS, create_dataFrame_empleados, ensure_anomaly_model, score_isolation_forest,
+    train_department_anomaly_models,
+)
+from ml_models.models import (
+    AnomalyResultSet, CertificatePrediction, InferenceMetrics, LicenseDatasetEntry, LicenseDatasetFeatures, MLModel,
+    TrainingJob,
+)
+from ml_models.utils import training_jobs
+from ml_models.utils.anomaly_results import refresh_anomaly_results
+from ml_models.utils.artifact_export import PrunedTfidfVectorizer, compact_model
+from ml_models.utils import coherence_model_ml, inference_server, model_selection, prediction_store
+from ml_models.utils.evaluation_model import ApprovalClassifier, RejectionReasonClassifier
+from ml_models.utils.feature_cache import hash_texts, hashing_params_key, store_entry_features, stored_counts
+from ml_models.utils.inference_metrics import MetricsRecorder, StreamingHistogram, population_stability_index
+from ml_models.utils.near_duplicates import add_dataset_entry, compact_near_duplicates, weighted_fit_transform
+from ml_models.utils.model_loader import department_artifact_paths, forget_active_artifacts, load_artifact
+from ml_models.utils.synthetic_data import seed_database, synthetic_licenses, synthetic_users
+from licenses.models import Certificate, License, LicenseType, Status
+from licenses.usage import usage_differences
+from users.models import Department, HealthFirstUser, Role
+
+TEMPLATES = {
+    'enfermedad': 'certificado medico reposo por {n} dias diagnostico gripe fiebre consulta clinica',
+    'estudios': 'constancia de examen final universidad materia {n} alumno regular facultad',
+    'donacion_sangre': 'certificado de donacion de sangre banco de sangre hospital unidad {n}',
+    'mudanza': 'contrato de alquiler nuevo domicilio mudanza fecha {n} inmobiliaria',
+}
+REASONS = ['falta firma del medico', 'fecha ilegible', 'documento no corresponde']
+
+
+def synthetic_dataset(n=120, seed=0):
+    rng = np.random.RandomState(seed)
+    types = list(TEMPLATES)
+    texts, labels, approved, reasons = [], [], [], []
+    for i in range(n):
+        license_type = types[i % len(types)]
+        noise = ' '.join(rng.choice(['firma', 'sello', 'copia', 'original', 'ilegible', 'fecha'], size=3))
+        texts.append(f"{TEMPLATES[license_type].format(n=rng.randint(1, 30))} {noise}")
+        labels.append(license_type)
+        approved.append(int('ilegible' not in noise))
+        reasons.append(REASONS[i % len(REASONS)])
+    return texts, labels, approved, reasons
+
+
+class CompactArtifactTests(SimpleTestCase):
+    """El artefacto compacto tiene que predecir exactamente lo mismo que el original."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.texts, cls.types, cls.approved, cls.reasons = synthetic_dataset()
+        # Incluye términos fuera del vocabulario y un texto vacío
+        cls.eval_texts = cls.texts[:40] + ['palabras totalmente nuevas certificado medico', '']
+        cls.eval_types = cls.types[:40] + ['enfermedad', 'estudios']
+
+    def assert_smaller(self, original, compact):
+        self.assertLess(len(pickle.dumps(compact)), len(pickle.dumps(original)))
+
+    def test_approval_classifier(self):
+        model = ApprovalClassifier(vectorizer=TfidfVectorizer(ngram_range=(1, 3), sublinear_tf=True, min_df=2))
+        model.fit(
+            self.texts[:100], self.types[:100], self.approved[:100],
+            self.texts[100:], self.types[100:], self.approved[100:]
+        )
+        compact = compact_model(model)
+
+        self.assertIsInstance(compact.vectorizer, PrunedTfidfVectorizer)
+        self.assertFalse(hasattr(compact.vectorizer, 'stop_words_'))
+        self.assertIsInstance(model.vectorizer, TfidfVectorizer)
+        np.testing.assert_array_equal(
+            model.predict_proba(self.eval_texts, self.eval_types),
+            compact.predict_proba(self.eval_texts, self.eval_types)
+        )
+        self.assert_smaller(model, compact)
+
+    def test_rejection_reason_classifier(self):
+        model = RejectionReasonClassifier()
+        model.fit(self.texts, self.types, self.reasons)
+        compact = compact_model(model)
+
+        np.testing.assert_array_equal(
+            model.predict_proba(self.eval_texts, self.eval_types),
+            compact.predict_proba(self.eval_texts, self.eval_types)
+        )
+
+    def test_vectorizer_output_is_identical(self):
+        vectorizer = TfidfVectorizer(ngram_range=(1, 2)).fit(self.texts)
+        pruned = PrunedTfidfVectorizer(vectorizer, keep_columns=range(0, len(vectorizer.vocabulary_), 3))
+
+        expected = vectorizer.transform(self.eval_texts).toarray()
+        kept = np.zeros(expected.shape[1], dtype=bool)
+        kept[::3] = True
+        np.testing.assert_array_equal(pruned.transform(self.eval_texts).toarray(), np.where(kept, expected, 0))
+
+    def test_forest_pipeline(self):
+        model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), min_df=2),
+            RandomForestClassifier(n_estimators=20, oob_score=True, random_state=0)
+        )
+        model.fit(self.texts, self.types)
+        compact = compact_model(model)
+
+        np.testing.assert_array_equal(model.predict_proba(self.eval_texts), compact.predict_proba(self.eval_texts))
+        self.assert_smaller(model, compact)
+        # Las predicciones out-of-bag solo sirven para destilar: no van al artefacto
+        self.assertFalse(hasattr(compact[-1], 'oob_decision_function_'))
+        self.assertTrue(hasattr(model[-1], 'oob_decision_function_'))
+
+
+class CoherenceFastPathTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.texts, cls.types, _, _ = synthetic_dataset()
+        cls.forest = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), min_df=2),
+            RandomForestClassifier(n_estimators=20, oob_score=True, random_state=0)
+        ).fit(cls.texts, cls.types)
+
+    def test_distilled_model_keeps_every_forest_class(self):
+        forest = pickle.loads(pickle.dumps(self.forest))
+        # Una clase que ningún árbol predijo out-of-bag
+        forest[-1].oob_decision_function_[:, 0] = 0
+        X_train = forest[0].transform(self.texts)
+        fast = coherence_model_ml.distill_fast_model(forest, X_train)
+        np.testing.assert_array_equal(fast.classes_, forest.classes_)
+
+    def test_fast_model_with_other_classes_is_not_used(self):
+        keep = [t != 'mudanza' for t in self.types]
+        stale = make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(
+            [t for t, k in zip(self.texts, keep) if k], [t for t, k in zip(self.types, keep) if k]
+        )
+        with mock.patch.object(coherence_model_ml, 'get_model', return_value=self.forest), \
+                mock.patch.object(coherence_model_ml, 'get_fast_model', return_value=stale):
+            classes, probabilities = coherence_model_ml.coherence_proba_batch(self.texts[:10], min_confidence=0)
+        np.testing.assert_array_equal(classes, self.forest.classes_)
+        np.testing.assert_array_equal(probabilities, self.forest.predict_proba(self.texts[:10]))
+
+
+class AnomalyScoringTests(SimpleTestCase):
+    def test_chunked_scores_are_identical(self):
+        """Puntuar por trozos en paralelo da los mismos scores que decision_function y las etiquetas de predict."""
+        rng = np.random.RandomState(0)
+        X = rng.normal(size=(503, 4))
+        model = IsolationForest(n_estimators=20, contamination=0.1, random_state=42).fit(X)
+        scores = score_isolation_forest(model, X, n_jobs=3, chunk_size=50)
+        np.testing.assert_array_equal(scores, model.decision_function(X))
+        np.testing.assert_array_equal(np.where(scores < 0, -1, 1), model.predict(X))
+
+
+class WeightedVectorizerTests(SimpleTestCase):
+    """Ajustar con pesos equivale a ajustar con cada registro repetido weight veces."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.texts = synthetic_dataset(60)[0]
+
+    def assert_same_fit(self, vectorizer, expected, output, expected_output):
+        self.assertEqual(vectorizer.vocabulary_, expected.vocabulary_)
+        np.testing.assert_allclose(vectorizer.idf_, expected.idf_)
+        np.testing.assert_allclose(output.toarray(), expected_output.toarray())
+
+    def test_unit_weights_match_fit_transform(self):
+        params = {'ngram_range': (1, 2), 'min_df': 2, 'max_df': 0.9, 'max_features': 40}
+        vectorizer, expected = TfidfVectorizer(**params), TfidfVectorizer(**params)
+        output = weighted_fit_transform(vectorizer, self.texts, np.ones(len(self.texts)))
+        self.assert_same_fit(vectorizer, expected, output, expected.fit_transform(self.texts))
+
+    def test_weights_match_repeated_rows(self):
+        weights = np.random.RandomState(0).randint(1, 4, size=len(self.texts))
+        repeated = [text for text, weight in zip(self.texts, weights) for _ in range(weight)]
+        for params in ({'min_df': 3}, {'ngram_range': (1, 2), 'min_df': 0.05, 'max_df': 0.5, 'max_features': 30}):
+            with self.subTest(params=params):
+                vectorizer, expected = TfidfVectorizer(**params), TfidfVectorizer(**params)
+                output = weighted_fit_transform(vectorizer, self.texts, weights)
+                expected.fit(repeated)
+                self.assert_same_fit(vectorizer, expected, output, expected.transform(self.texts))
+
+
+class FoldCacheTests(SimpleTestCase):
+    def test_folds_use_the_training_weights(self):
+        """La validación cruzada pondera igual que el modelo final: pesos enteros = filas repetidas."""
+        texts, types, _, reasons = synthetic_dataset(60)
+        weights = np.random.RandomState(0).randint(1, 4, size=len(texts)).astype(float)
+        splits = [(np.arange(0, 40), np.arange(40, 60))]
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(model_selection, 'FOLDS_DIR', Path(directory)):
+            paths = model_selection.featurize_folds(RejectionReasonClassifier, texts, types, reasons, splits, 'w', weights)
+            unweighted = model_selection.featurize_folds(RejectionReasonClassifier, texts, types, reasons, splits, 'w')
+            self.assertNotEqual(paths, unweighted)
+
+            fold = load_artifact(paths[0])
+            np.testing.assert_array_equal(fold['w_train'], weights[:40])
+            expected = RejectionReasonClassifier()._prepare_features(
+                texts[:40], types[:40], fit_transform=True, sample_weight=weights[:40]
+            )
+            np.testing.assert_allclose(fold['X_train'].toarray(), expected.toarray())
+
+    def test_stale_folds_are_evicted(self):
+        texts, types, _, reasons = synthetic_dataset(60)
+        splits = [(np.arange(0, 40), np.arange(40, 60))]
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(model_selection, 'FOLDS_DIR', Path(directory)):
+            old = model_selection.featurize_folds(RejectionReasonClassifier, texts, types, reasons, splits, 'v1')
+            other = Path(directory) / 'otro-featurizador.joblib'
+            abandoned = Path(directory) / 'viejo.joblib'
+            other.touch()
+            abandoned.touch()
+            os.utime(abandoned, (0, 0))
+
+            # Otros folds de la misma versión se conservan
+            other_splits = model_selection.featurize_folds(
+                RejectionReasonClassifier, texts, types, reasons, [(np.arange(20, 60), np.arange(0, 20))], 'v1'
+            )
+            self.assertTrue(old[0].exists())
+
+            # Nueva versión del dataset: se borran los folds de la anterior del mismo featurizador
+            new = model_selection.featurize_folds(RejectionReasonClassifier, texts, types, reasons, splits, 'v2')
+            self.assertFalse(old[0].exists())
+            self.assertFalse(other_splits[0].exists())
+            self.assertTrue(new[0].exists())
+            self.assertTrue(other.exists())
+            self.assertFalse(abandoned.exists())
+
+
+class NearDuplicateTests(TestCase):
+    TEXT = 'certificado medico reposo por tres dias diagnostico gripe fiebre consulta clinica dr perez'
+
+    def test_near_duplicate_increments_weight(self):
+        entry, created = add_dataset_entry(self.TEXT, 'enfermedad', 'approved')
+        again, created_again = add_dataset_entry(self.TEXT + ' sello', 'enfermedad', 'approved')
+        self.assertEqual((created, created_again, again.pk, again.weight), (True, False, entry.pk, 2))
+        self.assertEqual(LicenseDatasetEntry.objects.count(), 1)
+
+        # Con otras etiquetas no es redundante
+        _, created_other = add_dataset_entry(self.TEXT, 'enfermedad', 'rejected', reason='certificado sin fechas')
+        self.assertTrue(created_other)
+
+    def test_compaction_keeps_total_weight(self):
+        for i, weight in enumerate([1, 3, 2]):
+            LicenseDatasetEntry.objects.create(text=self.TEXT + ' sello' * (i == 2), type='enfermedad', status='approved', weight=weight)
+        LicenseDatasetEntry.objects.create(text='constancia de examen final universidad', type='estudios', status='approved')
+
+        summary = compact_near_duplicates()
+        self.assertEqual(
+            (summary['entries_before'], summary['entries_after'], summary['total_weight']), (4, 2, 7)
+        )
+        weights = dict(LicenseDatasetEntry.objects.values_list('type', 'weight'))
+        self.assertEqual(weights, {'enfermedad': 6, 'estudios': 1})
+        self.assertEqual(sum(weights.values()), summary['total_weight'])
+
+
+class StoredFeaturesTests(TestCase):
+    TEXTS = [
+        'certificado medico reposo por tres dias diagnostico gripe fiebre',
+        'constancia de examen final universidad nacional',
+        'acta de defuncion del padre del trabajador',
+    ]
+
+    def rows(self, entries):
+        return list(
+            LicenseDatasetEntry.objects.filter(pk__in=[e.pk for e in entries]).order_by('pk')
+            .values_list('id', 'features__params_key', 'features__indices', 'features__counts')
+        )
+
+    def test_stored_counts_match_hashing_the_text(self):
+        stored, missing, stale = [
+            LicenseDatasetEntry.objects.create(text=text, type='enfermedad', status='approved') for text in self.TEXTS
+        ]
+        store_entry_features([(stored.pk, stored.text), (stale.pk, stale.text)])
+        # Calculado con otra configuración de hashing: se tiene que recalcular desde el texto
+        LicenseDatasetFeatures.objects.filter(entry=stale).update(params_key='otra')
+
+        counts = stored_counts(self.rows([stored, missing, stale]))
+        expected = hash_texts(self.TEXTS)
+        self.assertEqual(counts.shape, expected.shape)
+        self.assertEqual(counts.dtype, np.float32)
+        self.assertEqual((counts != expected).nnz, 0)
+
+        # Los recalculados quedan guardados y leídos del binario dan lo mismo
+        self.assertEqual(
+            LicenseDatasetFeatures.objects.filter(params_key=hashing_params_key()).count(), 3
+        )
+        self.assertEqual((stored_counts(self.rows([stored, missing, stale])) != expected).nnz, 0)
+
+
+class TrainingJobTests(TestCase):
+    MODEL_TYPE = 'CLASSIFICATION'
+
+    def test_second_submit_returns_active_job(self):
+        job, created = training_jobs.submit_training_job(self.MODEL_TYPE)
+        again, created_again = training_jobs.submit_training_job(self.MODEL_TYPE)
+        self.assertEqual((again.pk, created, created_again), (job.pk, True, False))
+        self.assertEqual(TrainingJob.objects.filter(model_type=self.MODEL_TYPE).count(), 1)
+
+        # Terminado el job, se libera el lock
+        TrainingJob.objects.filter(pk=job.pk).update(status='SUCCESS')
+        new, created_new = training_jobs.submit_training_job(self.MODEL_TYPE)
+        self.assertTrue(created_new)
+        self.assertNotEqual(new.pk, job.pk)
+
+    def test_stale_is_judged_by_heartbeat(self):
+        training_jobs.submit_training_job(self.MODEL_TYPE)
+        job = training_jobs.claim_next_job()
+        now = timezone.now()
+        # Empezó hace 3 horas pero sigue latiendo
+        TrainingJob.objects.filter(pk=job.pk).update(started_at=now - timedelta(hours=3), heartbeat_at=now)
+        self.assertEqual(training_jobs.fail_stale_jobs(timedelta(minutes=10)), 0)
+
+        TrainingJob.objects.filter(pk=job.pk).update(heartbeat_at=now - timedelta(minutes=20))
+        self.assertEqual(training_jobs.fail_stale_jobs(timedelta(minutes=10)), 1)
+
+    def test_result_does_not_overwrite_failed_job(self):
+        training_jobs.submit_training_job(self.MODEL_TYPE)
+        job = training_jobs.claim_next_job()
+
+        def train(incremental, n_jobs, progress):
+            # Otro worker lo da por abandonado a mitad del entrenamiento
+            TrainingJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+            training_jobs.fail_stale_jobs(timedelta(minutes=10))
+            progress(50, 'Entrenando')
+
+        with mock.patch.object(training_jobs, 'training_function', return_value=train):
+            self.assertFalse(training_jobs.run_job(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('FAILED', 0))
+
+
+class PredictionStoreTests(TestCase):
+    CERTIFICATE = base64.b64encode(b'%PDF-1.4 certificado de prueba').decode()
+    EVALUATION = {'approval_score': 0.8, 'reason_of_rejection': None, 'top_reasons': [], 'has_code': True}
+
+    def setUp(self):
+        for model_type in CertificatePrediction.MODEL_FIELDS:
+            self.new_model(model_type)
+
+        patches = [
+            mock.patch.object(prediction_store, 'is_pdf_image', return_value=False),
+            mock.patch.object(prediction_store, 'base64_to_text', return_value='reposo por gripe'),
+            mock.patch.object(prediction_store, 'predict_license_types', return_value=[('enfermedad', 0.9)]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        patch = mock.patch.object(prediction_store, 'predict_evaluation', return_value=self.EVALUATION)
+        self.evaluate = patch.start()
+        self.addCleanup(patch.stop)
+
+    def new_model(self, model_type):
+        return MLModel.objects.create(name=model_type, model_type=model_type, algorithm='LGBM', training_date=timezone.now())
+
+    def predict(self):
+        return prediction_store.get_certificate_prediction(self.CERTIFICATE, 'enfermedad')
+
+    def test_second_request_is_served_from_the_store(self):
+        first = self.predict()
+        second = self.predict()
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(self.evaluate.call_count, 1)
+        self.assertEqual(second.license_types, [['enfermedad', 0.9]])
+
+    def test_new_active_version_invalidates_the_prediction(self):
+        old = self.predict()
+        approval = self.new_model('LICENSE_APPROVAL')
+        self.assertFalse(CertificatePrediction.objects.filter(pk=old.pk).exists())
+
+        new = self.predict()
+        self.assertEqual(self.evaluate.call_count, 2)
+        self.assertEqual(new.approval_model_id, approval.pk)
+        self.assertEqual(CertificatePrediction.objects.count(), 1)
+
+    def test_failed_rejection_reason_is_not_persisted(self):
+        self.evaluate.return_value = {**self.EVALUATION, 'reason_of_rejection': None, 'error': 'sin modelo'}
+        prediction = self.predict()
+        self.assertIsNone(prediction.pk)
+        self.assertFalse(CertificatePrediction.objects.exists())
+
+        # La próxima consulta vuelve a intentar y, si sale bien, se guarda
+        self.evaluate.return_value = self.EVALUATION
+        self.assertIsNotNone(self.predict().pk)
+        self.assertEqual(self.evaluate.call_count, 2)
+
+
+class EmployeeFeatureFilterTests(TestCase):
+    WINDOW = (date(2025, 2, 10), date(2025, 11, 20))
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_database(2, 40, 400, 0, seed=5, today=date(2026, 1, 15))
+
+    def test_filters_match_filtering_the_whole_population(self):
+        everyone = create_dataFrame_empleados(*self.WINDOW)
+        department_id = int(everyone['department_id'].iloc[0])
+        for min_requests in (1, 3):
+            with self.subTest(min_requests=min_requests):
+                with CaptureQueriesContext(connection) as queries:
+                    df = create_dataFrame_empleados(*self.WINDOW, department_id=department_id, min_requests=min_requests)
+                expected = everyone[
+                    (everyone['department_id'] == department_id) & (everyone['total_requests'] >= min_requests)
+                ].reset_index(drop=True)
+                self.assertFalse(expected.empty)
+                pd.testing.assert_frame_equal(df, expected)
+                # El agregado solo se lee para los empleados filtrados
+                usage_queries = [q['sql'] for q in queries.captured_queries if 'licenses_licenseusage' in q['sql']]
+                self.assertTrue(usage_queries)
+                self.assertTrue(all('department_id' in sql for sql in usage_queries))
+
+
+class SeedDatabaseTests(TestCase):
+    def test_generation_is_deterministic(self):
+        types = list(LicenseType.objects.order_by('id'))
+
+        def generated(seed):
+            rng = np.random.RandomState(seed)
+            users = synthetic_users(50, 4, 3, rng, date(2026, 1, 15))
+            return users, synthetic_licenses(500, users, types, rng, date(2026, 1, 15))
+
+        (users, licenses), (users_again, licenses_again) = generated(3), generated(3)
+        for generated_arrays, again in ((users, users_again), (licenses, licenses_again)):
+            for field, values in generated_arrays.items():
+                np.testing.assert_array_equal(values, again[field])
+        self.assertFalse(np.array_equal(generated(4)[1]['request_date'], licenses['request_date']))
+
+    def test_seeded_database_is_consistent(self):
+        """El agregado de uso coincide con las licencias, evalúan supervisores del departamento y los PDF se leen."""
+        summary = seed_database(2, 40, 400, 30, seed=3, today=date(2026, 1, 15))
+        self.assertEqual((summary['users'], summary['licenses'], summary['dataset_entries']), (42, 400, 30))
+        self.assertEqual(License.objects.count(), 400)
+        self.assertEqual(usage_differences(), [])
+        self.assertFalse(License.objects.filter(evaluator__isnull=False).exclude(
+            evaluator__department=F('user__department')
+        ).exists())
+
+        certificate = Certificate.objects.select_related('license__user').first()
+        text = PdfReader(io.BytesIO(base64.b64decode(certificate.file))).pages[0].extract_text()
+        self.assertIn(str(certificate.license.user.dni), text)
+        self.assertIn(f'{certificate.license.start_date:%d/%m/%Y}', text)
+
+    def test_invalid_seeds_fail_before_writing(self):
+        seed_database(1, 5, 10, seed=7, today=date(2026, 1, 15))
+        users = HealthFirstUser.objects.count()
+        with self.assertRaisesMessage(ValueError, 'semilla 7'):
+            seed_database(1, 5, 10, seed=7, today=date(2026, 1, 15))
+
+        LicenseType.objects.update(is_deleted=True)
+        with self.assertRaisesMessage(ValueError, 'tipos de licencia'):
+            seed_database(1, 5, 10, seed=8, today=date(2026, 1, 15))
+        self.assertEqual(HealthFirstUser.objects.count(), users)
+
+        # Con tipos sintéticos no hace falta el catálogo
+        summary = seed_database(1, 5, 10, n_license_types=2, seed=8, today=date(2026, 1, 15))
+        self.assertEqual(summary['license_types'], 2)
+
+
+def scale_batch(values, factors):
+    """Runner de prueba del servidor de inferencia: una fila por ítem."""
+    return 'meta', np.asarray(values) * np.asarray(factors)
+
+
+# Sin hilo de flush: los tests llaman a flush() directamente
+@mock.patch.object(MetricsRecorder, '_start_flusher')
+class MetricsRecorderTests(TestCase):
+    def record(self, recorder):
+        recorder.record('coherence', 2, 12.5, ['enfermedad', 'estudios'], [[0.9, 0.1], [0.3, 0.7]])
+
+    def test_artifact_without_version_is_not_recorded(self, start_flusher):
+        recorder = MetricsRecorder()
+        self.record(recorder)
+        self.assertEqual(recorder.flush(), 0)
+        self.assertFalse(InferenceMetrics.objects.exists())
+
+    def test_flushes_add_to_the_active_version(self, start_flusher):
+        model = MLModel.objects.create(
+            name='coherencia', model_type='CLASSIFICATION', algorithm='RANDOM_FOREST', training_date=timezone.now()
+        )
+        recorder = MetricsRecorder()
+        for _ in range(2):
+            self.record(recorder)
+            self.assertEqual(recorder.flush(), 1)
+        row = InferenceMetrics.objects.get()
+        self.assertEqual((row.ml_model_id, row.runner, row.batches, row.scores['count']), (model.pk, 'coherence', 2, 4))
+
+
+class StreamingHistogramTests(SimpleTestCase):
+    EDGES = [round(x, 2) for x in np.arange(0.01, 1, 0.01)]
+
+    def histogram(self, values, edges=None):
+        histogram = StreamingHistogram(edges or self.EDGES)
+        # De a lotes, como en producción
+        for batch in np.array_split(values, 7):
+            histogram.add(batch)
+        return histogram
+
+    def test_quantiles_match_numpy_within_a_bucket(self):
+        values = np.random.RandomState(0).beta(2, 5, size=20000)
+        histogram = self.histogram(values)
+        for q in (0.01, 0.25, 0.5, 0.95, 0.99):
+            self.assertAlmostEqual(histogram.quantile(q), np.quantile(values, q), delta=0.01)
+        self.assertEqual(histogram.quantile(0), round(values.min(), 4))
+        self.assertEqual(histogram.quantile(1), round(values.max(), 4))
+        self.assertIsNone(StreamingHistogram(self.EDGES).quantile(0.5))
+
+    def test_quantiles_outside_the_edges_stay_within_min_and_max(self):
+        histogram = self.histogram(np.array([5.0, 6.0, 7.0, np.nan, np.inf]))
+        self.assertEqual(histogram.count, 3)
+        self.assertTrue(5.0 <= histogram.quantile(0.5) <= 7.0)
+        self.assertEqual(histogram.quantile(1), 7.0)
+
+    def test_merge_adds_counts_and_drops_old_edges(self):
+        rng = np.random.RandomState(1)
+        first, second = rng.uniform(size=300), rng.uniform(size=500)
+        merged = self.histogram(first).merge(self.histogram(second))
+        both = self.histogram(np.concatenate([first, second]))
+        self.assertEqual(merged.counts.tolist(), both.counts.tolist())
+        self.assertEqual((merged.count, merged.min, merged.max), (both.count, both.min, both.max))
+        self.assertAlmostEqual(merged.sum, both.sum)
+
+        # Con otros bordes gana el histograma nuevo y lo acumulado se descarta
+        other = self.histogram(second, edges=[0.5])
+        result = self.histogram(first).merge(other)
+        self.assertIs(result, other)
+        self.assertEqual((result.edges, result.count), ([0.5], 500))
+
+        # Un histograma vacío no cambia el mínimo ni el máximo
+        empty = StreamingHistogram(self.EDGES)
+        self.assertEqual((empty.merge(self.histogram(first)).min, empty.max), (first.min(), first.max()))
+
+    def test_population_stability_index(self):
+        rng = np.random.RandomState(2)
+        values = rng.beta(2, 5, size=5000)
+        self.assertEqual(population_stability_index(self.histogram(values), self.histogram(values)), 0)
+        self.assertLess(population_stability_index(self.histogram(values), self.histogram(rng.beta(2, 5, size=5000))), 0.1)
+        self.assertGreater(population_stability_index(self.histogram(values), self.histogram(rng.beta(5, 2, size=5000))), 0.2)
+
+        self.assertIsNone(population_stability_index(self.histogram(values), self.histogram(values, edges=[0.5])))
+        self.assertIsNone(population_stability_index(self.histogram(values), StreamingHistogram(self.EDGES)))
+
+    def test_dict_round_trip(self):
+        histogram = self.histogram(np.random.RandomState(3).uniform(size=100))
+        restored = StreamingHistogram.from_dict(histogram.to_dict(), [0.5])
+        self.assertEqual(restored.to_dict(), histogram.to_dict())
+        self.assertEqual(StreamingHistogram.from_dict({}, [0.5]).edges, [0.5])
+
+
+@override_settings(ML_METRICS_ENABLED=False)
+@mock.patch.dict(inference_server.INFERENCE_RUNNERS, {'scale': 'ml_models.tests.scale_batch'})
+class InferenceServerTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(inference_server._drop_connection)
+        self.address = os.path.join(self.directory.name, 'inference.sock')
+
+    def test_server_down_predicts_in_process(self):
+        with override_settings(ML_INFERENCE_SOCKET=self.address):
+            meta, rows = inference_server.infer('scale', [1, 2], [3, 3])
+        self.assertEqual(meta, 'meta')
+        np.testing.assert_array_equal(rows, [3, 6])
+
+    def test_stuck_server_times_out_and_predicts_in_process(self):
+        listener = Listener(self.address, family='AF_UNIX', authkey=inference_server._authkey())
+        self.addCleanup(listener.close)
+        accepted = []
+        # Acepta la conexión y nunca responde
+        threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True).start()
+
+        with override_settings(ML_INFERENCE_SOCKET=self.address, ML_INFERENCE_TIMEOUT=0.2):
+            _, rows = inference_server.infer('scale', [1, 2], [2, 2])
+        np.testing.assert_array_equal(rows, [2, 4])
+        # La conexión con una respuesta pendiente no se reutiliza
+        self.assertIsNone(inference_server._local.conn)
+
+    def test_batch_is_concatenated_and_split_per_request(self):
+        server = inference_server.InferenceServer(self.address)
+        items = [
+            inference_server._Pending('scale', (np.array([1, 2]), np.array([10, 10]))),
+            inference_server._Pending('scale', (np.array([3]), np.array([100]))),
+            inference_server._Pending('scale', (np.array([4, 5, 6]), np.array([1, 1, 1]))),
+        ]
+        server._run('scale', items)
+        self.assertEqual([item.result[0] for item in items], ['meta'] * 3)
+        for item, expected in zip(items, ([10, 20], [300], [4, 5, 6])):
+            np.testing.assert_array_equal(item.result[1], expected)
+        self.assertEqual(dict(server.stats['scale']), {'batches': 1, 'items': 3})
+
+        failing = [inference_server._Pending('scale', (np.array([1, 2]), np.array([1, 2, 3])))]
+        server._run('scale', failing)
+        self.assertTrue(failing[0].done.is_set())
+        self.assertIn('ValueError', failing[0].error)
+
+    def test_batcher_survives_errors(self):
+        server = inference_server.InferenceServer(self.address, batch_wait_ms=0)
+        side_effects = [RuntimeError('base caída'), None]
+        with mock.patch.object(inference_server, 'close_old_connections', side_effect=side_effects):
+            threading.Thread(target=server._batch_loop, daemon=True).start()
+            for expected_error in (True, False):
+                pending = inference_server._Pending('scale', (np.array([2]), np.array([3])))
+                server.requests.put(pending)
+                self.assertTrue(pending.done.wait(5))
+                self.assertEqual(pending.error is not None, expected_error)
+        np.testing.assert_array_equal(pending.result[1], [6])
+
+
+@override_settings(ML_METRICS_ENABLED=False)
+class AnomalyQueryCountTests(TestCase):
+    """Los endpoints de anomalías hacen la misma cantidad de consultas sin importar cuántos usuarios haya."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='IT')
+        cls.employee_role = Role.objects.create(name='employee')
+        cls.supervisor_role = Role.objects.create(name='supervisor')
+        cls.admin = cls.create_user('admin', Role.objects.create(name='admin'))
+        cls.supervisor = cls.create_user('supervisor', cls.supervisor_role)
+        # Registra los .pkl del repositorio como modelos activos (no entrena)
+        forget_active_artifacts()
+        for model_type in ANOMALY_MODELS:
+            ensure_anomaly_model(model_type)
+
+    @classmethod
+    def create_user(cls, username, role, department=None):
+        return HealthFirstUser.objects.create_user(
+            username=username, email=f'{username}@example.com', password='test',
+            first_name=username[:15], last_name='Test', phone='1234567890', dni=1,
+            date_of_birth='1990-01-01', employment_start_date='2020-01-01',
+            role=role, department=department
+        )
+
+    def add_staff(self, n):
+        """Agrega n empleados (la mitad sin departamento) y n supervisores, con una licencia evaluada cada uno."""
+        start = date(2024, 1, 1)
+        for i in range(n):
+            index = HealthFirstUser.objects.count()
+            employee = self.create_user(f'employee{index}', self.employee_role, self.department if i % 2 else None)
+            supervisor = self.create_user(f'supervisor{index}', self.supervisor_role, self.department)
+            license = License.objects.create(
+                user=employee, evaluator=supervisor, start_date=start + timedelta(days=i),
+                end_date=start + timedelta(days=i + 2), required_days=3, request_date=start
+            )
+            Status.objects.create(license=license, name='approved', evaluation_date=start)
+
+    def count_queries(self, url):
+        # El resumen de la población y la ruta del modelo activo se cachean: cada llamada arranca sin ellos
+        cache.clear()
+        forget_active_artifacts()
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries), response.json()
+
+    def test_constant_queries(self):
+        for url in ('/licenses/anomalies/employee?limit=100', '/licenses/anomalies/supervisor?limit=100'):
+            with self.subTest(url=url):
+                self.add_staff(2)
+                few, _ = self.count_queries(url)
+                self.add_staff(10)
+                many, data = self.count_queries(url)
+
+                self.assertEqual(few, many)
+                self.assertGreaterEqual(len(data['results']), 12)
+                for row in data['results']:
+                    self.assertTrue((row.get('employee_name') or row.get('evaluator_name')).endswith(' Test'))
+                    self.assertIn(row['department'], ('IT', 'Sin departamento'))
+
+    def test_stored_results_match_live(self):
+        """Los resultados precalculados responden igual que el cálculo en el momento, con filtros y paginación."""
+        self.add_staff(6)
+        urls = [
+            '/licenses/anomalies/employee?limit=4&offset=2', '/licenses/anomalies/employee?limit=100&is_anomaly=false',
+            '/licenses/anomalies/supervisor?limit=4&offset=2', '/licenses/anomalies/supervisor?limit=100&is_anomaly=true',
+        ]
+        live = [self.count_queries(url)[1] for url in urls]
+
+        for population in ('employee', 'supervisor'):
+            refresh_anomaly_results(population)
+        self.assertEqual(AnomalyResultSet.objects.count(), 2)
+        self.assertEqual([self.count_queries(url)[1] for url in urls], live)
+
+        employee_id = live[0]['results'][0]['employee_id']
+        _, data = self.count_queries(f'/licenses/anomalies/employee?limit=10&employee_id={employee_id}')
+        self.assertEqual([row['employee_id'] for row in data['results']], [employee_id])
+
+    def test_missing_model_is_not_trained_in_request(self):
+        """Sin modelo activo la request responde 503 y encola el entrenamiento, sin entrenar ni crear archivos."""
+        self.add_staff(2)
+        MLModel.objects.filter(model_type='EMPLOYEE_ANOMALY_DETECTION').update(is_active=False)
+        forget_active_artifacts()
+        for _ in range(2):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            response = client.get('/licenses/anomalies/employee?limit=10')
+            self.assertEqual(response.status_code, 503, response.content)
+        self.assertEqual(TrainingJob.objects.filter(model_type='EMPLOYEE_ANOMALY_DETECTION', status='PENDING').count(), 1)
+        self.assertFalse(MLModel.objects.filter(model_type='EMPLOYEE_ANOMALY_DETECTION', is_active=True).exists())
+
+        # Los supervisores siguen respondiendo con su modelo
+        self.count_queries('/licenses/anomalies/supervisor?limit=10')
+
+    def test_department_models(self):
+        """Con ML_ANOMALY_DEPARTMENT_MODELS cada empleado se puntúa con el modelo de su departamento, si tiene."""
+        self.add_staff(8)
+        url = '/licenses/anomalies/employee?limit=100'
+        _, global_data = self.count_queries(url)
+
+        trained, sizes = train_department_anomaly_models('EMPLOYEE_ANOMALY_DETECTION', min_size=3)
+        for ml_model in trained.values():
+            self.addCleanup(os.remove, os.path.join(settings.BASE_DIR, ml_model.artifact))
+        self.assertEqual(list(trained), [self.department.department_id])
+        self.assertEqual(sizes[self.department.department_id], 4)
+
+        with override_settings(ML_ANOMALY_DEPARTMENT_MODELS=True):
+            _, data = self.count_queries(url)
+        rows = {row['employee_id']: row for row in data['results']}
+        model = load_artifact(department_artifact_paths('EMPLOYEE_ANOMALY_DETECTION')[self.department.department_id])
+        for row in global_data['results']:
+            if row['department'] == 'IT':
+                features = pd.DataFrame([{column: row[column] for column in ANOMALY_FEATURES['EMPLOYEE_ANOMALY_DETECTION']}])
+                expected = model.decision_function(features)[0]
+            else:
+                expected = row['anomaly_score']
+            self.assertAlmostEqual(rows[row['employee_id']]['anomaly_score'], expected)
+
+        # Si el departamento queda chico vuelve al modelo global
+        train_department_anomaly_models('EMPLOYEE_ANOMALY_DETECTION', min_size=1000)
+        forget_active_artifacts()
+        self.assertEqual(department_artifact_paths('EMPLOYEE_ANOMALY_DETECTION'), {})
+
+    def test_subset_matches_population(self):
+        """Puntuar solo un empleado o un departamento da las mismas filas (y diferencias) que toda la población."""
+        self.add_staff(6)
+        for population, key in (('employee', 'employee_id'), ('supervisor', 'evaluator_id')):
+            with self.subTest(population=population):
+                _, full = self.count_queries(f'/licenses/anomalies/{population}?limit=100')
+                rows = {row[key]: row for row in full['results']}
+
+                one = full['results'][1][key]
+                param = 'employee_id' if population == 'employee' else 'user_id'
+                _, data = self.count_queries(f'/licenses/anomalies/{population}?limit=10&{param}={one}')
+                self.assertEqual(data['results'], [rows[one]])
+
+                _, data = self.count_queries(
+                    f'/licenses/anomalies/{population}?limit=100&department_id={self.department.department_id}'
+                )
+                expected = [row for row in full['results'] if row['department'] == 'IT']
+                self.assertTrue(expected)
+                self.assertEqual(data['results'], expected)
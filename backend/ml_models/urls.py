@@ -4,7 +4,10 @@ from .views import *
 
 urlpatterns = [
     path('actives', active_models),
+    path('actives/metrics', active_models_metrics),
     path('all', all_models),
     path('training', train_models),
+    path('training/jobs', training_jobs),
+    path('training/<int:job_id>', training_job_status),
  
 ]
\ No newline at end of file
@@ -0,0 +1,101 @@
+import logging
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+
+from ml_models.models import AnomalyResult, AnomalyResultSet, MLModel
+
+logger = logging.getLogger('automatic_models_training')
+
+# Población -> (columna con el id del usuario, MLModel.model_type del detector)
+POPULATIONS = {
+    'supervisor': ('evaluator_id', 'SUPERVISOR_ANOMALY_DETECTION'),
+    'employee': ('employee_id', 'EMPLOYEE_ANOMALY_DETECTION'),
+}
+
+
+
+class AnomalyModelNotReady(Exception):
+    """No hay un modelo de anomalías activo: se encoló su entrenamiento y la request no lo espera."""
+
+
+def anomaly_window(start_date=None, end_date=None):
+    """Ventana (desde, hasta) como fechas. Igual que en las features, solo cuenta si vienen ambas."""
+    if not (start_date and end_date):
+        return None, None
+    parse = lambda value: value if isinstance(value, date) else date.fromisoformat(str(value))
+    return parse(start_date), parse(end_date)
+
+
+def active_model_id(population):
+    _, model_type = POPULATIONS[population]
+    return MLModel.objects.filter(
+        model_type=model_type, department__isnull=True, is_active=True
+    ).values_list('id', flat=True).first()
+
+
+def compute_anomalies(population, start_date=None, end_date=None, **filters):
+    """
+    Features y scores de la población, ordenados del más anómalo al menos anómalo. Los filtros
+    (ids, department_id, min_requests; ver get_*_anomalies) se aplican antes de puntuar.
+    """
+    # import diferido (pandas, sklearn)
+    from ml_models.anomalies.isolation_forest import get_employee_anomalies, get_supervisor_anomalies
+    compute = get_supervisor_anomalies if population == 'supervisor' else get_employee_anomalies
+    id_column, _ = POPULATIONS[population]
+    df = compute(start_date, end_date, **filters)
+    if df.empty:
+        return df
+    return df.sort_values(['anomaly_score', id_column], kind='stable').reset_index(drop=True)
+
+
+def refresh_anomaly_results(population, start_date=None, end_date=None):
+    """
+    Recalcula y guarda los resultados de la población para la ventana con el modelo activo.
+    Los resultados anteriores de la misma ventana se reemplazan en la misma transacción.
+    """
+    window_start, window_end = anomaly_window(start_date, end_date)
+    df = compute_anomalies(population, window_start, window_end)
+    id_column, _ = POPULATIONS[population]
+    # El modelo se busca después de calcular: sin modelo activo, get_*_anomalies ya lanzó
+    # AnomalyModelNotReady (y encoló su entrenamiento) antes de llegar acá
+    model_id = active_model_id(population)
+
+    # JSON no admite NaN (participación sobre un total de 0)
+    records = df.astype(object).where(df.notna(), None).to_dict(orient='records') if not df.empty else []
+    with transaction.atomic():
+        AnomalyResultSet.objects.filter(
+            population=population, window_start=window_start, window_end=window_end
+        ).delete()
+        result_set = AnomalyResultSet.objects.create(
+            population=population, window_start=window_start, window_end=window_end,
+            ml_model_id=model_id, rows=len(records),
+        )
+        AnomalyResult.objects.bulk_create([
+            AnomalyResult(
+                result_set=result_set, user_id=row[id_column], total_requests=row['total_requests'],
+                anomaly_score=row['anomaly_score'], is_anomaly=bool(row['is_anomaly']), data=row,
+            )
+            for row in records
+        ], batch_size=2000)
+
+    anomalies = int(np.sum(df['is_anomaly'])) if not df.empty else 0
+    logger.info(f"Resultados de anomalías ({population}, {window_start} - {window_end}): "
+                f"{len(records)} filas, {anomalies} anómalas, modelo {model_id}")
+    return result_set
+
+
+def stored_anomaly_results(population, start_date=None, end_date=None):
+    """
+    Resultados guardados de la ventana con el modelo activo, del más anómalo al menos anómalo,
+    o None si no hay (ventana no precalculada o modelo reentrenado desde el último refresco).
+    """
+    window_start, window_end = anomaly_window(start_date, end_date)
+    result_set = AnomalyResultSet.objects.filter(
+        population=population, window_start=window_start, window_end=window_end,
+        ml_model_id=active_model_id(population),
+    ).order_by('-computed_at').first()
+    if result_set is None:
+        return None
+    return AnomalyResult.objects.filter(result_set=result_set).order_by('anomaly_score', 'user_id')
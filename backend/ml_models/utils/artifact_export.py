@@ -0,0 +1,130 @@
+import copy
+import hashlib
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import Pipeline
+
+
+def term_hash(term):
+    """Hash de 64 bits de un término (las colisiones con términos fuera del vocabulario son despreciables)."""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class PrunedTfidfVectorizer:
+    """
+    Versión de solo inferencia de un TfidfVectorizer ajustado que guarda como texto únicamente
+    los términos que usa el clasificador. Los términos podados se guardan como hash de 64 bits
+    -> columna: no generan valores en la salida, pero siguen participando de la norma de cada
+    documento. El TF-IDF se calcula con el mismo TfidfTransformer de scikit-learn, así la salida
+    es idéntica a la del vectorizador original en las columnas conservadas.
+    """
+
+    def __init__(self, vectorizer, keep_columns):
+        n_features = len(vectorizer.vocabulary_)
+        self.kept_ = np.zeros(n_features, dtype=bool)
+        self.kept_[np.asarray(list(keep_columns), dtype=np.int64)] = True
+
+        # Mismos parámetros de análisis (tokenización, n-gramas, stop words) sin el estado ajustado
+        self.analyzer_params = clone(vectorizer)
+
+        self.tfidf_ = TfidfTransformer(
+            norm=vectorizer.norm,
+            use_idf=vectorizer.use_idf,
+            smooth_idf=vectorizer.smooth_idf,
+            sublinear_tf=vectorizer.sublinear_tf
+        )
+        if vectorizer.use_idf:
+            self.tfidf_.idf_ = vectorizer.idf_
+        self.tfidf_.n_features_in_ = n_features
+
+        self.vocabulary_ = {}
+        pruned = []
+        for term, column in vectorizer.vocabulary_.items():
+            if self.kept_[column]:
+                self.vocabulary_[term] = column
+            else:
+                pruned.append((term_hash(term), column))
+        pruned.sort()
+        self.pruned_hashes_ = np.asarray([h for h, _ in pruned], dtype=np.uint64)
+        self.pruned_columns_ = np.asarray([c for _, c in pruned], dtype=np.int64)
+
+    def _column(self, term):
+        column = self.vocabulary_.get(term)
+        if column is not None or not len(self.pruned_hashes_):
+            return column
+        h = np.uint64(term_hash(term))
+        i = np.searchsorted(self.pruned_hashes_, h)
+        if i < len(self.pruned_hashes_) and self.pruned_hashes_[i] == h:
+            return int(self.pruned_columns_[i])
+        return None
+
+    def transform(self, raw_documents):
+        analyze = self.analyzer_params.build_analyzer()
+        counts, indices, indptr = [], [], [0]
+
+        # Conteos de todos los términos del vocabulario original, como CountVectorizer.transform
+        for doc in raw_documents:
+            for term, count in Counter(analyze(doc)).items():
+                column = self._column(term)
+                if column is not None:
+                    indices.append(column)
+                    counts.append(count)
+            indptr.append(len(indices))
+
+        X = csr_matrix(
+            (np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+            shape=(len(indptr) - 1, len(self.kept_))
+        )
+        X.sort_indices()
+        X = self.tfidf_.transform(X, copy=False)
+
+        # Las columnas podadas solo servían para la norma
+        X.data[~self.kept_[X.indices]] = 0
+        X.eliminate_zeros()
+        return X
+
+
+def forest_used_features(forest):
+    """Columnas usadas en algún split de algún árbol del bosque."""
+    used = [tree.tree_.feature[tree.tree_.feature >= 0] for tree in forest.estimators_]
+    return np.unique(np.concatenate(used)) if used else np.empty(0, dtype=int)
+
+
+# Atributos de entrenamiento del bosque con oob_score=True (una fila por registro de entrenamiento)
+OOB_ATTRIBUTES = ('oob_decision_function_', 'oob_score_')
+
+
+def without_oob(classifier):
+    """Copia superficial del bosque sin las predicciones out-of-bag, que solo sirven al entrenar."""
+    if not any(hasattr(classifier, attr) for attr in OOB_ATTRIBUTES):
+        return classifier
+    classifier = copy.copy(classifier)
+    for attr in OOB_ATTRIBUTES:
+        classifier.__dict__.pop(attr, None)
+    return classifier
+
+
+def compact_model(model):
+    """
+    Devuelve una copia del modelo para producción: el TfidfVectorizer se reemplaza por un
+    PrunedTfidfVectorizer con solo los términos usados por el clasificador (sin stop_words_ ni el
+    resto del vocabulario) y el bosque pierde las predicciones out-of-bag. Las predicciones no cambian. El modelo recibido no se modifica.
+    Los modelos incrementales (hashing) y los que ya están compactados se devuelven tal cual.
+    """
+    if isinstance(model, Pipeline):
+        vectorizer, classifier = model.steps[0][1], model.steps[-1][1]
+        if len(model.steps) != 2 or not isinstance(vectorizer, TfidfVectorizer) or not hasattr(classifier, 'estimators_'):
+            return model
+        pruned = PrunedTfidfVectorizer(vectorizer, forest_used_features(classifier))
+        return Pipeline([(model.steps[0][0], pruned), (model.steps[-1][0], without_oob(classifier))])
+
+    if isinstance(getattr(model, 'vectorizer', None), TfidfVectorizer) and hasattr(model, 'text_columns_used'):
+        compact = copy.copy(model)
+        compact.vectorizer = PrunedTfidfVectorizer(model.vectorizer, model.text_columns_used())
+        return compact
+
+    return model
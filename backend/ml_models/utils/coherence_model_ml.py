@@ -1,77 +1,139 @@
 from cProfile import label
+import logging
 import pandas as pd
 import joblib
+import numpy as np
 from pathlib import Path
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import make_pipeline
+from scipy.sparse import vstack
 from .file_utils import normalize_text
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 from .spanish_stopwords import SPANISH_STOPWORDS
+from .model_loader import load_artifact, save_artifact
+from .artifact_export import compact_model
+from .feature_cache import load_dataset_features, make_hashed_text_pipeline
+from .dataset_stream import load_text_dataset
+from .inference_server import infer
+from .near_duplicates import entry_weights, weighted_fit_transform
 from ml_models.models import MLModel
 from datetime import datetime
 from ml_models.models import LicenseDatasetEntry
+from django.conf import settings
 from django.utils import timezone
+
+logger = logging.getLogger('automatic_models_training')
+
 # Paths
 MODEL_PATH = Path(__file__).resolve().parent / 'modelo_clasificador.joblib'
+FAST_MODEL_PATH = Path(__file__).resolve().parent / 'modelo_clasificador_rapido.joblib'
+
+# Confianza mínima del modelo destilado para no consultar al bosque
+FAST_MODEL_MIN_CONFIDENCE = 0.4
 DATASET_PATH = Path(__file__).resolve().parent / 'coherence_license_type_dataset.csv'
 
 
 def load_data_from_db():
     """Carga el dataset desde la base de datos, manteniendo solo las filas con estado='approved'."""
-    queryset = LicenseDatasetEntry.objects.filter(
-        status='approved'
-    ).values('id', 'text', 'type')
-    
-    df = pd.DataFrame.from_records(queryset)
+    data = load_text_dataset(LicenseDatasetEntry.objects.filter(status='approved'), ['weight'])
+    data['weights'] = np.asarray(data['weight'], dtype=np.float64)
+    return data
+
 
-    first_id = df['id'].min() if not df.empty else None
-    last_id = df['id'].max() if not df.empty else None
+
+def load_features_from_cache():
+    """Como load_data_from_db, pero con los conteos hasheados del caché incremental en lugar del texto."""
+    features, _ = load_dataset_features()
+    watermark = MLModel.objects.filter(
+        model_type='CLASSIFICATION', is_active=True
+    ).values_list('last_training_id', flat=True).first()
+    data = features.subset(features.statuses == 'approved', since_id=watermark)
 
     return {
-        'texts': df['text'].tolist(),
-        'types': df['type'].tolist(),
-        'first_id': first_id,
-        'last_id': last_id
+        'counts': data['counts'],
+        'types': data['types'],
+        # Los pesos cambian al insertar casi duplicados: se leen de la base, no del caché
+        'weights': entry_weights(data['ids']),
+        'first_id': int(data['ids'].min()) if len(data['ids']) else None,
+        'last_id': int(data['ids'].max()) if len(data['ids']) else None,
+        'new_samples': data['new_samples']
     }
 
 
-
-def train_and_save_coherence_model():
-    data = load_data_from_db()
-    texts = data['texts']
+def train_and_save_coherence_model(incremental=False, n_jobs=None, progress=None):
+    """
+    Entrena el modelo de coherencia. Con incremental=True solo se hashean los registros nuevos
+    y el bosque se reajusta sobre el caché de features, sin volver a tokenizar todo el dataset.
+    n_jobs es la cantidad de procesos del RandomForest (None = uno solo).
+    progress(porcentaje, etapa) es opcional y se usa para informar el avance de los entrenamientos en segundo plano.
+    """
+    if progress:
+        progress(10, 'Cargando datos')
+    if incremental:
+        data = load_features_from_cache()
+        texts = data['counts']
+    else:
+        data = load_data_from_db()
+        texts = data['texts']
     types = data['types']
+    weights = data['weights']
     first_id = data['first_id']
     last_id = data['last_id']
 
-    # Dividir en entrenamiento y test
-    X_train, X_test, y_train, y_test = train_test_split(
-        texts, types, test_size=20, random_state=42, stratify=types
-    )
+    classifier = new_forest_classifier(n_jobs)
 
-    model = make_pipeline(
-        TfidfVectorizer(
-            max_features=5000,
-            ngram_range=(1, 2),
-            min_df=2,
-            stop_words=SPANISH_STOPWORDS
-        ),
-        RandomForestClassifier(
-            n_estimators=500,
-            class_weight='balanced',
-        )
+    # Split sobre posiciones (sirve tanto para textos como para conteos)
+    indices = np.arange(len(types))
+    train_idx, test_idx, y_train, y_test = train_test_split(
+        indices, types, test_size=20, random_state=42, stratify=types
     )
 
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-
-    # # Mostrar métricas
-    # accuracy_score(y_test, y_pred)
-    # classification_report(y_test, y_pred)
+    if progress:
+        progress(30, 'Entrenando modelo')
+    if incremental:
+        text_steps = make_hashed_text_pipeline(min_df=2, max_features=5000)
+        # El hashing no tiene estado: solo se ajustan la selección, el TF-IDF y el bosque sobre los conteos
+        X_train = weighted_fit_transform(text_steps[1:], texts[train_idx], weights[train_idx])
+        X_test = text_steps[1:].transform(texts[test_idx])
+        vectorizer_steps = [step for _, step in text_steps.steps]
+    else:
+        vectorizer = new_tfidf_vectorizer()
+        # Los textos se decodifican de a uno mientras el vectorizador los recorre
+        X_train = weighted_fit_transform(vectorizer, texts.take(train_idx), weights[train_idx])
+        X_test = vectorizer.transform(texts.take(test_idx))
+        vectorizer_steps = [vectorizer]
+
+    classifier.fit(X_train, y_train, sample_weight=weights[train_idx])
+    y_pred = classifier.predict(X_test)
+    model = make_pipeline(*vectorizer_steps, classifier)
+
+    # Modelo lineal rápido que imita al bosque, sobre las mismas features
+    if progress:
+        progress(70, 'Destilando modelo rápido')
+    fast_model = distill_fast_model(model, X_train, sample_weight=weights[train_idx])
+    fast_pred = fast_model[-1].predict(X_test)
+
+    training_info = {
+        'model_type': 'coherence',
+        'mode': 'incremental' if incremental else 'full',
+        'new_samples': data.get('new_samples', len(types)),
+        'total_samples': len(types),
+        'total_weight': int(weights.sum()),
+        'train_samples': len(y_train),
+        'test_samples': len(y_test),
+        'accuracy': round(accuracy_score(y_test, y_pred, sample_weight=weights[test_idx]), 4),
+        'fast_accuracy': round(accuracy_score(y_test, fast_pred, sample_weight=weights[test_idx]), 4),
+        'unique_types': len(set(types))
+    }
 
     # Guardar modelo
-    joblib.dump(model, MODEL_PATH)
+    if progress:
+        progress(90, 'Guardando modelo')
+    save_artifact(compact_model(model), MODEL_PATH)
+    save_artifact(fast_model, FAST_MODEL_PATH)
     MLModel.objects.create(
         model_type= 'CLASSIFICATION',
         name= 'Modelo de coherencia de certificados',
@@ -79,26 +141,109 @@ def train_and_save_coherence_model():
         is_active= True,
         training_date = timezone.now(),
         first_training_id= first_id,
-        last_training_id= last_id
+        last_training_id= last_id,
+        training_info= training_info
         )
 
     return model
 
+def new_tfidf_vectorizer():
+    return TfidfVectorizer(
+        max_features=5000,
+        ngram_range=(1, 2),
+        min_df=2,
+        stop_words=SPANISH_STOPWORDS
+    )
+
+
+def new_forest_classifier(n_jobs=None):
+    # oob_score no cambia los árboles: deja las probabilidades out-of-bag para la destilación
+    return RandomForestClassifier(
+        n_estimators=500,
+        class_weight='balanced',
+        oob_score=True,
+        n_jobs=n_jobs,
+    )
+
+
+def distill_fast_model(forest_model, X_train, C=10.0, sample_weight=None):
+    """
+    Entrena una regresión logística sobre las mismas features del bosque para que reproduzca
+    sus probabilidades out-of-bag (cross-entropy contra etiquetas blandas: cada fila se repite
+    una vez por clase, con la probabilidad del bosque como peso, multiplicada por sample_weight).
+    Devuelve un pipeline con los mismos pasos de vectorización y la regresión al final, que
+    tiene siempre las mismas clases que el bosque.
+    """
+    forest = forest_model[-1]
+    soft_targets = np.nan_to_num(forest.oob_decision_function_)
+    n_samples, n_classes = soft_targets.shape
+    missing = ~(soft_targets > 0).any(axis=0)
+    if missing.any():
+        # Clases que ningún árbol predijo out-of-bag (pocas filas): se usan las probabilidades
+        # del bosque sobre sus propias filas de entrenamiento, así la regresión no las pierde
+        soft_targets[:, missing] = forest.predict_proba(X_train)[:, missing]
+    if sample_weight is not None:
+        soft_targets = soft_targets * np.asarray(sample_weight)[:, None]
+
+    X_repeated = vstack([X_train] * n_classes, format='csr')
+    y_repeated = np.repeat(forest.classes_, n_samples)
+    weights = soft_targets.T.ravel()
+    keep = weights > 0
+
+    linear = LogisticRegression(C=C, max_iter=1000)
+    linear.fit(X_repeated[keep], y_repeated[keep], sample_weight=weights[keep])
+    return make_pipeline(*[step for _, step in forest_model.steps[:-1]], linear)
+
+
 def get_model():
     if MODEL_PATH.exists():
-        return joblib.load(MODEL_PATH)
+        return load_artifact(MODEL_PATH)
     else:
         return train_and_save_coherence_model()
 
 
-def predict_license_types(text):
+def get_fast_model():
+    """Modelo destilado, si está habilitado (ML_COHERENCE_FAST_PATH) y ya fue entrenado."""
+    if getattr(settings, 'ML_COHERENCE_FAST_PATH', True) and FAST_MODEL_PATH.exists():
+        return load_artifact(FAST_MODEL_PATH)
+    return None
+
+
+def coherence_proba_batch(normalized_texts, min_confidence=FAST_MODEL_MIN_CONFIDENCE):
+    """
+    Probabilidades por tipo de licencia para un lote de textos normalizados. Responde el modelo
+    lineal destilado y solo se consulta al bosque por las filas en las que la confianza del
+    lineal queda por debajo de min_confidence. Devuelve (clases, probabilidades).
+    El lineal solo se usa si tiene las mismas clases que el bosque (puede quedar de otro entrenamiento).
+    """
     model = get_model()
+    fast_model = get_fast_model()
+    if fast_model is not None and not np.array_equal(fast_model.classes_, model.classes_):
+        logger.warning("El modelo de coherencia rápido no tiene las mismas clases que el bosque: se usa solo el bosque")
+        fast_model = None
+    if fast_model is not None:
+        probabilities = fast_model.predict_proba(normalized_texts)
+        fallback = probabilities.max(axis=1) < min_confidence
+        if not fallback.any():
+            return fast_model.classes_, probabilities
+    else:
+        probabilities, fallback = None, np.ones(len(normalized_texts), dtype=bool)
+
+    forest_probabilities = model.predict_proba([text for text, f in zip(normalized_texts, fallback) if f])
+    if probabilities is None:
+        return model.classes_, forest_probabilities
+    probabilities[fallback] = forest_probabilities
+    return model.classes_, probabilities
+
+
+def predict_license_types(text):
     normalized_text = normalize_text(text)
-    probabilities = model.predict_proba([normalized_text])[0]
+    classes, probabilities = infer('coherence', [normalized_text])
+    probabilities = probabilities[0]
 
     results = [
         (str(label), f"{prob * 100:.1f}%")
-        for label, prob in zip(model.classes_, probabilities)
+        for label, prob in zip(classes, probabilities)
     ]
 
     return sorted(results, key=lambda x: float(x[1][:-1]), reverse=True)[:3]
@@ -0,0 +1,113 @@
+from array import array
+from itertools import islice
+
+import numpy as np
+from scipy.sparse import issparse
+
+# Filas por bloque al recorrer LicenseDatasetEntry (en PostgreSQL, un cursor del lado del servidor)
+CHUNK_SIZE = 2000
+
+
+class CompactTexts:
+    """
+    Secuencia de textos guardada en un único buffer UTF-8 con offsets, en lugar de
+    un objeto str por fila. Cada texto se decodifica recién al accederlo, así los
+    vectorizadores lo recorren de a uno sin materializar la lista completa.
+    take() devuelve una vista sobre las mismas filas, sin copiar el buffer.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = array('q', [0])
+        self._rows = None
+
+    def append(self, text):
+        if self._rows is not None:
+            raise ValueError('No se puede agregar texto a una vista de CompactTexts')
+        self._buffer += (text or '').encode('utf-8')
+        self._offsets.append(len(self._buffer))
+
+    def extend(self, texts):
+        for text in texts:
+            self.append(text)
+
+    def __len__(self):
+        if self._rows is not None:
+            return len(self._rows)
+        return len(self._offsets) - 1
+
+    def _text(self, position):
+        return self._buffer[self._offsets[position]:self._offsets[position + 1]].decode('utf-8')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(np.arange(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._text(self._rows[index] if self._rows is not None else index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices):
+        view = CompactTexts.__new__(CompactTexts)
+        view._buffer = self._buffer
+        view._offsets = self._offsets
+        indices = np.asarray(indices, dtype=np.int64)
+        view._rows = self._rows[indices] if self._rows is not None else indices
+        return view
+
+    @property
+    def nbytes(self):
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+
+def take_rows(values, indices):
+    """Selecciona filas de una lista de textos/tipos, de un CompactTexts o de una matriz de conteos."""
+    if issparse(values):
+        return values[indices]
+    if isinstance(values, CompactTexts):
+        return values.take(indices)
+    return [values[i] for i in indices]
+
+
+def iter_dataset_chunks(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Recorre el queryset ordenado por id y devuelve bloques de hasta chunk_size tuplas con los campos pedidos."""
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_text_dataset(queryset, label_fields=(), chunk_size=CHUNK_SIZE):
+    """
+    Carga id, texto, tipo y los campos de etiqueta pedidos leyendo de a bloques.
+    Los textos quedan en un CompactTexts; first_id/last_id son el menor y mayor id leídos.
+    """
+    texts = CompactTexts()
+    types = []
+    labels = {field: [] for field in label_fields}
+    first_id = last_id = None
+
+    for chunk in iter_dataset_chunks(queryset, ('id', 'text', 'type', *label_fields), chunk_size):
+        if first_id is None:
+            first_id = chunk[0][0]
+        last_id = chunk[-1][0]
+        for row in chunk:
+            texts.append(row[1])
+            types.append(row[2])
+            for field, value in zip(label_fields, row[3:]):
+                labels[field].append(value)
+
+    return {
+        'texts': texts,
+        'types': types,
+        **labels,
+        'first_id': first_id,
+        'last_id': last_id,
+    }
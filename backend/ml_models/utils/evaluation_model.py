@@ -5,11 +5,18 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score, confusion_matrix
 from sklearn.preprocessing import LabelEncoder, StandardScaler
-from scipy.sparse import hstack, csr_matrix
+from scipy.sparse import hstack, csr_matrix, issparse
 import lightgbm as lgb
 import numpy as np
 from ml_models.models import MLModel
 from ml_models.utils.file_utils import normalize_text
+from ml_models.utils.model_loader import load_artifact, save_artifact
+from ml_models.utils.artifact_export import compact_model
+from ml_models.utils.feature_cache import load_dataset_features, make_hashed_text_pipeline
+from ml_models.utils.dataset_stream import load_text_dataset, take_rows
+from ml_models.utils.model_selection import cross_validate_cached
+from ml_models.utils.inference_server import infer
+from ml_models.utils.near_duplicates import entry_weights, weighted_fit_transform
 from .spanish_stopwords import SPANISH_STOPWORDS
 from sklearn.model_selection import cross_val_score, StratifiedKFold
 from django.utils import timezone
@@ -24,50 +31,61 @@ DATASET_PATH = Path(__file__).resolve().parent / 'coherence_license_type_dataset
 
 
 def load_approval_data():
-    """Carga datos desde la base de datos para el modelo de aprobación/rechazo."""
-    queryset = LicenseDatasetEntry.objects.all().values('id', 'text', 'status', 'type')
-    df = pd.DataFrame.from_records(queryset)
-
-    df['approved'] = (df['status'] == 'approved').astype(int)
-
-    first_id = df['id'].min() if not df.empty else None
-    last_id = df['id'].max() if not df.empty else None
+    """Carga datos desde la base de datos para el modelo de aprobación/rechazo, leyendo de a bloques."""
+    data = load_text_dataset(LicenseDatasetEntry.objects.all(), ['status', 'weight'])
 
     return {
-        'texts': df['text'].tolist(),
-        'types': df['type'].tolist(),
-        'approved': df['approved'].tolist(),
-        'first_id': first_id,
-        'last_id': last_id
+        'texts': data['texts'],
+        'types': data['types'],
+        'approved': [int(status == 'approved') for status in data['status']],
+        'weights': np.asarray(data['weight'], dtype=np.float64),
+        'first_id': data['first_id'],
+        'last_id': data['last_id']
     }
 
 
 def load_rejection_reasons_data():
-    """Carga datos desde la base de datos para el modelo de motivos de rechazo."""
+    """Carga datos desde la base de datos para el modelo de motivos de rechazo, leyendo de a bloques."""
     queryset = LicenseDatasetEntry.objects.filter(
         status='rejected',
         reason__isnull=False
-    ).values('id', 'text', 'reason', 'type')
-    df = pd.DataFrame.from_records(queryset)
-
-    first_id = df['id'].min() if not df.empty else None
-    last_id = df['id'].max() if not df.empty else None
+    )
+    data = load_text_dataset(queryset, ['reason', 'weight'])
 
     return {
-        'texts': df['text'].tolist(),
-        'types': df['type'].tolist(),
-        'reasons': df['reason'].tolist(),
-        'first_id': first_id,
-        'last_id': last_id
+        'texts': data['texts'],
+        'types': data['types'],
+        'reasons': data['reason'],
+        'weights': np.asarray(data['weight'], dtype=np.float64),
+        'first_id': data['first_id'],
+        'last_id': data['last_id']
     }
 
 
+def vectorize_texts(vectorizer, texts, fit_transform=False, sample_weight=None):
+    """
+    Vectoriza los textos. Con el vectorizador por hashing también acepta la matriz de
+    conteos ya cacheada, en cuyo caso solo se ajusta/aplica el TF-IDF final.
+    Con sample_weight (registros que representan casi duplicados) el ajuste es ponderado.
+    """
+    if fit_transform and sample_weight is not None:
+        steps = vectorizer[1:] if issparse(texts) else vectorizer
+        return weighted_fit_transform(steps, texts, sample_weight)
+    if issparse(texts):
+        # Todos los pasos posteriores al hashing (que no tiene estado)
+        steps = vectorizer[1:]
+        return steps.fit_transform(texts) if fit_transform else steps.transform(texts)
+    if fit_transform:
+        return vectorizer.fit_transform(texts)
+    return vectorizer.transform(texts)
+
+
 class ApprovalClassifier:
-    def __init__(self, text_weight=0.7, type_weight=0.3):
+    def __init__(self, text_weight=0.7, type_weight=0.3, vectorizer=None, n_jobs=None):
         self.text_weight = text_weight
         self.type_weight = type_weight
         
-        self.vectorizer = TfidfVectorizer(
+        self.vectorizer = vectorizer if vectorizer is not None else TfidfVectorizer(
             max_features=8000,
             ngram_range=(1, 3),
             min_df=2,
@@ -89,24 +107,22 @@ class ApprovalClassifier:
             class_weight='balanced',
             random_state=42,
             verbose=-1,
-            early_stopping_rounds=100
+            early_stopping_rounds=100,
+            n_jobs=n_jobs
         )
         
-    def _prepare_features(self, texts, types, fit_transform=False):
+    def _prepare_features(self, texts, types, fit_transform=False, sample_weight=None):
         """Combina características de texto y tipo con pesos balanceados."""
+        text_features = vectorize_texts(self.vectorizer, texts, fit_transform, sample_weight)
         if fit_transform:
-            text_features = self.vectorizer.fit_transform(texts)
             type_features_encoded = self.type_encoder.fit_transform(types)
         else:
-            text_features = self.vectorizer.transform(texts)
             type_features_encoded = self.type_encoder.transform(types)
         
         # Crear características de tipo expandidas (one-hot + replicación)
         n_types = len(self.type_encoder.classes_) if hasattr(self.type_encoder, 'classes_') else len(set(types))
         type_features_onehot = np.zeros((len(types), n_types))
-        for i, encoded_type in enumerate(type_features_encoded):
-            if encoded_type < n_types:
-                type_features_onehot[i, encoded_type] = 1
+        type_features_onehot[np.arange(len(types)), type_features_encoded] = 1
         
         # Expandir las características de tipo para darle más peso dimensional
         type_features_expanded = np.tile(type_features_onehot, (1, 20))  # Replicar 20 veces
@@ -122,15 +138,9 @@ class ApprovalClassifier:
         type_features_weighted = type_features_scaled * self.type_weight
         
         # Crear características de interacción (texto modulado por tipo)
-        text_dense = text_features.toarray() if hasattr(text_features, 'toarray') else text_features
-        interaction_features = []
-        for i in range(len(texts)):
-            # Tomar las top 100 características de texto y modularlas por el tipo
-            top_text_features = text_dense[i][:100] if text_dense.shape[1] >= 100 else text_dense[i]
-            interaction = top_text_features * (1 + type_features_encoded[i] * 0.1)
-            interaction_features.append(interaction)
-        
-        interaction_features = np.array(interaction_features)
+        # Tomar las top 100 características de texto y modularlas por el tipo (solo se densifican esas columnas)
+        top_text_features = text_features[:, :100].toarray()
+        interaction_features = top_text_features * (1 + type_features_encoded[:, np.newaxis] * 0.1)
         interaction_weighted = interaction_features * (self.text_weight * self.type_weight)
         
         # Combinar todas las características
@@ -142,18 +152,19 @@ class ApprovalClassifier:
         
         return combined_features
         
-    def fit(self, X_train_text, X_train_type, y_train, X_val_text=None, X_val_type=None, y_val=None):
-        X_train_combined = self._prepare_features(X_train_text, X_train_type, fit_transform=True)
+    def fit(self, X_train_text, X_train_type, y_train, X_val_text=None, X_val_type=None, y_val=None, sample_weight=None):
+        X_train_combined = self._prepare_features(X_train_text, X_train_type, fit_transform=True, sample_weight=sample_weight)
         
         if X_val_text is not None and X_val_type is not None and y_val is not None:
             X_val_combined = self._prepare_features(X_val_text, X_val_type, fit_transform=False)
             self.classifier.fit(
                 X_train_combined, y_train,
+                sample_weight=sample_weight,
                 eval_set=[(X_val_combined, y_val)],
                 callbacks=[lgb.early_stopping(100), lgb.log_evaluation(0)]
             )
         else:
-            self.classifier.fit(X_train_combined, y_train)
+            self.classifier.fit(X_train_combined, y_train, sample_weight=sample_weight)
     
     def predict(self, texts, types):
         X_combined = self._prepare_features(texts, types, fit_transform=False)
@@ -163,13 +174,22 @@ class ApprovalClassifier:
         X_combined = self._prepare_features(texts, types, fit_transform=False)
         return self.classifier.predict_proba(X_combined)
 
+    def text_columns_used(self):
+        """Columnas del vectorizador usadas en algún split, directamente o a través de las interacciones."""
+        importance = self.classifier.booster_.feature_importance(importance_type='split')
+        n_text = len(self.vectorizer.vocabulary_)
+        n_types = len(self.type_encoder.classes_) * 20
+        direct = np.flatnonzero(importance[:n_text])
+        interactions = np.flatnonzero(importance[n_text + n_types:n_text + n_types + min(100, n_text)])
+        return np.union1d(direct, interactions)
+
 
 class RejectionReasonClassifier:
-    def __init__(self, text_weight=0.6, type_weight=0.4):
+    def __init__(self, text_weight=0.6, type_weight=0.4, vectorizer=None, n_jobs=None):
         self.text_weight = text_weight
         self.type_weight = type_weight
         
-        self.vectorizer = TfidfVectorizer(
+        self.vectorizer = vectorizer if vectorizer is not None else TfidfVectorizer(
             max_features=3000,
             ngram_range=(1, 2),
             min_df=1,
@@ -195,23 +215,21 @@ class RejectionReasonClassifier:
             reg_alpha=0.1,
             reg_lambda=0.1,
             min_child_samples=1,
+            n_jobs=n_jobs
         )
     
-    def _prepare_features(self, texts, types, fit_transform=False):
+    def _prepare_features(self, texts, types, fit_transform=False, sample_weight=None):
         """Combina características de texto y tipo con pesos balanceados."""
+        text_features = vectorize_texts(self.vectorizer, texts, fit_transform, sample_weight)
         if fit_transform:
-            text_features = self.vectorizer.fit_transform(texts)
             type_features_encoded = self.type_encoder.fit_transform(types)
         else:
-            text_features = self.vectorizer.transform(texts)
             type_features_encoded = self.type_encoder.transform(types)
         
         # Crear características de tipo expandidas (one-hot + replicación)
         n_types = len(self.type_encoder.classes_) if hasattr(self.type_encoder, 'classes_') else len(set(types))
         type_features_onehot = np.zeros((len(types), n_types))
-        for i, encoded_type in enumerate(type_features_encoded):
-            if encoded_type < n_types:
-                type_features_onehot[i, encoded_type] = 1
+        type_features_onehot[np.arange(len(types)), type_features_encoded] = 1
         
         # Expandir las características de tipo para darle más peso dimensional
         type_features_expanded = np.tile(type_features_onehot, (1, 25))  # Replicar 25 veces
@@ -226,20 +244,10 @@ class RejectionReasonClassifier:
         text_features_weighted = text_features * self.text_weight
         type_features_weighted = type_features_scaled * self.type_weight
         
-        # Crear características específicas por tipo (para motivos de rechazo)
-        text_dense = text_features.toarray() if hasattr(text_features, 'toarray') else text_features
-        type_specific_features = []
-        for i in range(len(texts)):
-            # Crear características que son específicas del tipo
-            type_multiplier = np.zeros(n_types)
-            type_multiplier[type_features_encoded[i]] = 1
-            
-            # Características de texto moduladas por tipo (más específicas para motivos)
-            top_text = text_dense[i][:50] if text_dense.shape[1] >= 50 else text_dense[i]
-            text_by_type = np.outer(type_multiplier, top_text).flatten()
-            type_specific_features.append(text_by_type)
-        
-        type_specific_features = np.array(type_specific_features)
+        # Crear características específicas por tipo (para motivos de rechazo):
+        # características de texto moduladas por tipo, equivalente a outer(one_hot_tipo, top_text) por fila
+        top_text = text_features[:, :50].toarray()
+        type_specific_features = (type_features_onehot[:, :, np.newaxis] * top_text[:, np.newaxis, :]).reshape(len(types), -1)
         type_specific_weighted = type_specific_features * self.type_weight * 0.5
         
         # Combinar todas las características
@@ -251,9 +259,9 @@ class RejectionReasonClassifier:
         
         return combined_features
     
-    def fit(self, X_train_text, X_train_type, y_train):
-        X_train_combined = self._prepare_features(X_train_text, X_train_type, fit_transform=True)
-        self.classifier.fit(X_train_combined, y_train)
+    def fit(self, X_train_text, X_train_type, y_train, sample_weight=None):
+        X_train_combined = self._prepare_features(X_train_text, X_train_type, fit_transform=True, sample_weight=sample_weight)
+        self.classifier.fit(X_train_combined, y_train, sample_weight=sample_weight)
     
     def predict(self, texts, types):
         X_combined = self._prepare_features(texts, types, fit_transform=False)
@@ -263,43 +271,116 @@ class RejectionReasonClassifier:
         X_combined = self._prepare_features(texts, types, fit_transform=False)
         return self.classifier.predict_proba(X_combined)
 
+    def text_columns_used(self):
+        """Columnas del vectorizador usadas en algún split, directamente o a través de las features por tipo."""
+        importance = self.classifier.booster_.feature_importance(importance_type='split')
+        n_text = len(self.vectorizer.vocabulary_)
+        n_types = len(self.type_encoder.classes_) * 25
+        direct = np.flatnonzero(importance[:n_text])
+        # Las features por tipo son outer(one_hot_tipo, top_50): la columna k corresponde al texto k % 50
+        type_specific = np.flatnonzero(importance[n_text + n_types:]) % min(50, n_text)
+        return np.union1d(direct, type_specific)
+
+
+def load_approval_features():
+    """Como load_approval_data, pero con los conteos hasheados del caché incremental en lugar del texto."""
+    features, _ = load_dataset_features()
+    data = features.subset(
+        np.ones(len(features.ids), dtype=bool),
+        since_id=active_training_watermark('LICENSE_APPROVAL')
+    )
+
+    return {
+        'counts': data['counts'],
+        'types': data['types'],
+        'approved': [int(status == 'approved') for status in data['statuses']],
+        # Los pesos cambian al insertar casi duplicados: se leen de la base, no del caché
+        'weights': entry_weights(data['ids']),
+        'first_id': int(data['ids'].min()) if len(data['ids']) else None,
+        'last_id': int(data['ids'].max()) if len(data['ids']) else None,
+        'new_samples': data['new_samples']
+    }
+
+
+def load_rejection_reasons_features():
+    """Como load_rejection_reasons_data, pero con los conteos hasheados del caché incremental."""
+    features, _ = load_dataset_features()
+    data = features.subset(
+        (features.statuses == 'rejected') & (features.reasons != None),
+        since_id=active_training_watermark('REJECTION_REASON')
+    )
+
+    return {
+        'counts': data['counts'],
+        'types': data['types'],
+        'reasons': data['reasons'],
+        'weights': entry_weights(data['ids']),
+        'first_id': int(data['ids'].min()) if len(data['ids']) else None,
+        'last_id': int(data['ids'].max()) if len(data['ids']) else None,
+        'new_samples': data['new_samples']
+    }
+
+
+def active_training_watermark(model_type):
+    """last_training_id del modelo activo: los registros posteriores son los nuevos."""
+    return MLModel.objects.filter(
+        model_type=model_type, is_active=True
+    ).values_list('last_training_id', flat=True).first()
+
 
-def train_and_save_approval_model():
-    data = load_approval_data()
-    texts = data['texts']
+def new_rejection_classifier(incremental=False, n_jobs=None):
+    vectorizer = None
+    if incremental:
+        vectorizer = make_hashed_text_pipeline(max_features=3000, sublinear_tf=True)
+    return RejectionReasonClassifier(vectorizer=vectorizer, n_jobs=n_jobs)
+
+
+def train_and_save_approval_model(incremental=False, n_jobs=None, progress=None):
+    """
+    Entrena el modelo de aprobación. Con incremental=True solo se hashean los registros
+    nuevos desde el último entrenamiento y el clasificador se reajusta sobre el caché de features.
+    n_jobs limita los hilos de LightGBM (None = todos los núcleos).
+    progress(porcentaje, etapa) es opcional y se usa para informar el avance de los entrenamientos en segundo plano.
+    """
+    if progress:
+        progress(10, 'Cargando datos')
+    if incremental:
+        data = load_approval_features()
+        texts = data['counts']
+    else:
+        data = load_approval_data()
+        texts = data['texts']
     types = data['types']
-    labels = data['approved']
+    labels = pd.Series(data['approved'])
+    # Cada registro cuenta tantas veces como casi duplicados representa
+    weights = data['weights']
     first_id = data['first_id']
     last_id = data['last_id']
     
-    # Crear DataFrame para facilitar el split estratificado
-    df_temp = pd.DataFrame({
-        'text': texts,
-        'type': types,
-        'label': labels
-    })
+    # Split estratificado sobre posiciones (sirve tanto para textos como para conteos)
+    indices = np.arange(len(labels))
     
     X_train, X_test, y_train, y_test = train_test_split(
-        df_temp[['text', 'type']], df_temp['label'], 
+        indices, labels, 
         test_size=0.2, 
         random_state=42, 
-        stratify=df_temp['label']
+        stratify=labels
     )
     
     if len(set(y_train)) < 2:
         X_train, X_test, y_train, y_test = train_test_split(
-            df_temp[['text', 'type']], df_temp['label'], 
+            indices, labels, 
             test_size=0.3, 
             random_state=123, 
-            stratify=df_temp['label']
+            stratify=labels
         )
     
     if len(set(y_test)) < 2:
         X_train, X_test, y_train, y_test = train_test_split(
-            df_temp[['text', 'type']], df_temp['label'], 
-            test_size=min(0.4, len(texts) // 2), 
+            indices, labels, 
+            test_size=min(0.4, len(labels) // 2), 
             random_state=456, 
-            stratify=df_temp['label']
+            stratify=labels
         )
     
     X_train_split, X_val, y_train_split, y_val = train_test_split(
@@ -309,19 +390,25 @@ def train_and_save_approval_model():
         stratify=y_train
     )
     
-    model = ApprovalClassifier()
+    if progress:
+        progress(30, 'Entrenando modelo')
+    vectorizer = None
+    if incremental:
+        vectorizer = make_hashed_text_pipeline(min_df=2, max_df=0.95, max_features=8000, sublinear_tf=True)
+    model = ApprovalClassifier(vectorizer=vectorizer, n_jobs=n_jobs)
     model.fit(
-        X_train_split['text'].tolist(), 
-        X_train_split['type'].tolist(), 
+        take_rows(texts, X_train_split), 
+        take_rows(types, X_train_split), 
         y_train_split, 
-        X_val['text'].tolist(), 
-        X_val['type'].tolist(), 
-        y_val
+        take_rows(texts, X_val), 
+        take_rows(types, X_val), 
+        y_val,
+        sample_weight=weights[X_train_split]
     )
     
     # Evaluar el modelo
-    y_pred = model.predict(X_test['text'].tolist(), X_test['type'].tolist())
-    accuracy = accuracy_score(y_test, y_pred)
+    y_pred = model.predict(take_rows(texts, X_test), take_rows(types, X_test))
+    accuracy = accuracy_score(y_test, y_pred, sample_weight=weights[X_test])
     
     # Distribución de clases
     train_dist = pd.Series(y_train).value_counts()
@@ -329,7 +416,10 @@ def train_and_save_approval_model():
     
     training_info = {
         'model_type': 'approval',
-        'total_samples': len(texts),
+        'mode': 'incremental' if incremental else 'full',
+        'new_samples': data.get('new_samples', len(labels)),
+        'total_samples': len(labels),
+        'total_weight': int(weights.sum()),
         'train_samples': len(y_train),
         'test_samples': len(y_test),
         'accuracy': round(accuracy, 4),
@@ -344,7 +434,9 @@ def train_and_save_approval_model():
         'unique_types': len(set(types))
     }
     
-    joblib.dump(model, APPROVAL_MODEL_PATH)
+    if progress:
+        progress(90, 'Guardando modelo')
+    save_artifact(compact_model(model), APPROVAL_MODEL_PATH)
     MLModel.objects.create(
         model_type='LICENSE_APPROVAL',
         name='Modelo de aprobación de licencias',
@@ -352,61 +444,74 @@ def train_and_save_approval_model():
         is_active=True,
         training_date = timezone.now(),
         first_training_id=first_id,
-        last_training_id=last_id
+        last_training_id=last_id,
+        training_info=training_info
     )
     return model, training_info
 
 
-def train_and_save_rejection_reason_model():
-    data = load_rejection_reasons_data()
-    texts = data['texts']
+def train_and_save_rejection_reason_model(incremental=False, n_jobs=None, progress=None):
+    """
+    Entrena el modelo de motivos de rechazo. Con incremental=True reutiliza el caché
+    de features hasheadas en lugar de volver a procesar todos los textos.
+    n_jobs limita los hilos de LightGBM (None = todos los núcleos).
+    progress(porcentaje, etapa) es opcional y se usa para informar el avance de los entrenamientos en segundo plano.
+    """
+    if progress:
+        progress(10, 'Cargando datos')
+    if incremental:
+        data = load_rejection_reasons_features()
+        texts = data['counts']
+    else:
+        data = load_rejection_reasons_data()
+        texts = data['texts']
     types = data['types']
     reasons = data['reasons']
+    weights = data['weights']
     first_id = data['first_id']
     last_id = data['last_id']
     
-    if len(texts) == 0:
+    if len(reasons) == 0:
         return None, None
 
     reason_counts = pd.Series(reasons).value_counts()
     min_samples_per_class = 2
     classes_with_few_samples = reason_counts[reason_counts < min_samples_per_class]
     
-    if len(classes_with_few_samples) > 0 and len(texts) < 20:
-        return train_with_cross_validation(texts, types, reasons, first_id, last_id)
+    if progress:
+        progress(30, 'Entrenando modelo')
+    if len(classes_with_few_samples) > 0 and len(reasons) < 20:
+        return train_with_cross_validation(texts, types, reasons, first_id, last_id, incremental, n_jobs, weights)
 
-    # Crear DataFrame para facilitar el manejo
-    df_temp = pd.DataFrame({
-        'text': texts,
-        'type': types,
-        'reason': reasons
-    })
+    # Split sobre posiciones (sirve tanto para textos como para conteos)
+    indices = np.arange(len(reasons))
+    reasons_series = pd.Series(reasons)
 
     try:
-        if len(texts) < 30:
-            test_size = max(0.2, 2/len(texts)) 
+        if len(reasons) < 30:
+            test_size = max(0.2, 2/len(reasons)) 
         else:
             test_size = 0.25
             
         X_train, X_test, y_train, y_test = train_test_split(
-            df_temp[['text', 'type']], df_temp['reason'],
+            indices, reasons_series,
             test_size=test_size,
             random_state=42,
-            stratify=df_temp['reason']
+            stratify=reasons_series
         )
     except ValueError:
         X_train, X_test, y_train, y_test = train_test_split(
-            df_temp[['text', 'type']], df_temp['reason'],
+            indices, reasons_series,
             test_size=test_size,
             random_state=42
         )
     
-    model = RejectionReasonClassifier()
-    model.fit(X_train['text'].tolist(), X_train['type'].tolist(), y_train)
+    model = new_rejection_classifier(incremental, n_jobs)
+    model.fit(take_rows(texts, X_train), take_rows(types, X_train), y_train, sample_weight=weights[X_train])
     
     # Evaluar el modelo
-    y_pred = model.predict(X_test['text'].tolist(), X_test['type'].tolist())
-    accuracy = accuracy_score(y_test, y_pred)
+    y_pred = model.predict(take_rows(texts, X_test), take_rows(types, X_test))
+    accuracy = accuracy_score(y_test, y_pred, sample_weight=weights[X_test])
     
     # Distribución de motivos
     train_dist = pd.Series(y_train).value_counts()
@@ -414,7 +519,10 @@ def train_and_save_rejection_reason_model():
     
     training_info = {
         'model_type': 'rejection_reasons',
-        'total_samples': len(texts),
+        'mode': 'incremental' if incremental else 'full',
+        'new_samples': data.get('new_samples', len(reasons)),
+        'total_samples': len(reasons),
+        'total_weight': int(weights.sum()),
         'train_samples': len(y_train),
         'test_samples': len(y_test),
         'accuracy': round(accuracy, 4),
@@ -425,7 +533,9 @@ def train_and_save_rejection_reason_model():
         'classes_with_few_samples': len(classes_with_few_samples)
     }
     
-    joblib.dump(model, REJECTION_MODEL_PATH)
+    if progress:
+        progress(90, 'Guardando modelo')
+    save_artifact(compact_model(model), REJECTION_MODEL_PATH)
 
     MLModel.objects.create(
         model_type='REJECTION_REASON',
@@ -434,52 +544,43 @@ def train_and_save_rejection_reason_model():
         is_active=True,
         training_date = timezone.now(),
         first_training_id=first_id,
-        last_training_id=last_id
+        last_training_id=last_id,
+        training_info=training_info
     )
 
     return model, training_info
 
 
-def train_with_cross_validation(texts, types, reasons, first_id, last_id):
+def train_with_cross_validation(texts, types, reasons, first_id, last_id, incremental=False, n_jobs=None, weights=None):
     """Entrena usando validación cruzada para datasets muy pequeños."""
-    from sklearn.model_selection import cross_val_score, StratifiedKFold
-    
-    model = RejectionReasonClassifier()
+    model = new_rejection_classifier(incremental, n_jobs)
     cv_folds = min(3, len(set(reasons)))
     
     cv_scores = None
     try:
         skf = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
-        # Para cross_val_score necesitamos una función que combine las features
-        class TempModel:
-            def __init__(self, model):
-                self.model = model
-            
-            def fit(self, X, y):
-                texts_cv = [x[0] for x in X]
-                types_cv = [x[1] for x in X]
-                self.model.fit(texts_cv, types_cv, y)
-                return self
-            
-            def predict(self, X):
-                texts_cv = [x[0] for x in X]
-                types_cv = [x[1] for x in X]
-                return self.model.predict(texts_cv, types_cv)
-        
-        X_combined = list(zip(texts, types))
-        temp_model = TempModel(RejectionReasonClassifier())
-        cv_scores = cross_val_score(temp_model, X_combined, reasons, cv=skf, scoring='balanced_accuracy')
+        # Los folds se featurizan una sola vez y quedan cacheados en disco
+        results = cross_validate_cached(
+            lambda: new_rejection_classifier(incremental),
+            texts, types, reasons,
+            skf.split(np.zeros(len(reasons)), reasons),
+            watermark={'first_id': first_id, 'last_id': last_id, 'n': len(reasons)},
+            scoring='balanced_accuracy',
+            n_jobs=n_jobs,
+            weights=weights
+        )
+        cv_scores = results[0]['scores']
     except:
         pass
     
-    model.fit(texts, types, reasons)
+    model.fit(texts, types, reasons, sample_weight=weights)
     
     # Información del entrenamiento con validación cruzada
     reason_counts = pd.Series(reasons).value_counts()
     training_info = {
         'model_type': 'rejection_reasons_cv',
-        'total_samples': len(texts),
-        'train_samples': len(texts),
+        'total_samples': len(reasons),
+        'train_samples': len(reasons),
         'test_samples': 0,
         'cv_folds': cv_folds,
         'cv_mean_score': round(cv_scores.mean(), 4) if cv_scores is not None else None,
@@ -489,14 +590,24 @@ def train_with_cross_validation(texts, types, reasons, first_id, last_id):
         'distribution': reason_counts.to_dict()
     }
     
-    joblib.dump(model, REJECTION_MODEL_PATH)
+    save_artifact(compact_model(model), REJECTION_MODEL_PATH)
+    MLModel.objects.create(
+        model_type='REJECTION_REASON',
+        name='Modelo de clasificacion de motivos de rechazo',
+        algorithm='LGBM',
+        is_active=True,
+        training_date = timezone.now(),
+        first_training_id=first_id,
+        last_training_id=last_id,
+        training_info=training_info
+    )
     return model, training_info
 
 
 def get_approval_model():
     """Carga el modelo de aprobación."""
     if APPROVAL_MODEL_PATH.exists():
-        return joblib.load(APPROVAL_MODEL_PATH), None
+        return load_artifact(APPROVAL_MODEL_PATH), None
     else:
         return train_and_save_approval_model()
 
@@ -504,11 +615,28 @@ def get_approval_model():
 def get_rejection_model():
     """Carga el modelo de motivos de rechazo."""
     if REJECTION_MODEL_PATH.exists():
-        return joblib.load(REJECTION_MODEL_PATH), None
+        return load_artifact(REJECTION_MODEL_PATH), None
     else:
         return train_and_save_rejection_reason_model()
 
 
+def approval_proba_batch(normalized_texts, license_types):
+    """Probabilidades [rechazo, aprobación] para un lote (lo usa el servidor de inferencia)."""
+    approval_model, _ = get_approval_model()
+    return approval_model.classifier.classes_, approval_model.predict_proba(normalized_texts, license_types)
+
+
+def rejection_proba_batch(normalized_texts, license_types):
+    """
+    Probabilidades por motivo de rechazo para un lote. Devuelve (motivos, probabilidades),
+    o motivos None si no hay modelo de motivos (pocos rechazos para entrenarlo).
+    """
+    rejection_model, _ = get_rejection_model()
+    if rejection_model is None:
+        return None, [None] * len(normalized_texts)
+    return rejection_model.classifier.classes_, rejection_model.predict_proba(normalized_texts, license_types)
+
+
 def predict_evaluation(text, license_type):
     """
     Predice si un certificado será approved o rejected.
@@ -520,14 +648,15 @@ def predict_evaluation(text, license_type):
     """
     normalized_text = normalize_text(text)
     
-    approval_model, _ = get_approval_model()
-    approval_proba = approval_model.predict_proba([normalized_text], [license_type])[0]
+    _, approval_proba = infer('approval', [normalized_text], [license_type])
+    approval_proba = approval_proba[0]
     
     prob_approved = approval_proba[1]
     prob_rejected = approval_proba[0]
     
     result = {
         'approved': prob_approved > 0.5,
+        'approval_score': float(prob_approved),
         'probability_of_approval': f"{prob_approved * 100:.1f}%",
         'probability_of_rejection': f"{prob_rejected * 100:.1f}%",
         'license_type': license_type,
@@ -539,26 +668,24 @@ def predict_evaluation(text, license_type):
         result['has_code'] = has_code
     
     if not result['approved']:
-        rejection_model, _ = get_rejection_model()
-        if rejection_model is not None:
-            try:
-                motivo_pred = rejection_model.predict([normalized_text], [license_type])[0]
-                motivo_proba = rejection_model.predict_proba([normalized_text], [license_type])[0]
-                
+        try:
+            motivos, motivo_proba = infer('rejection', [normalized_text], [license_type])
+            if motivos is not None:
+                motivo_proba = motivo_proba[0]
                 motivos_with_proba = [
                     (motivo, prob) 
-                    for motivo, prob in zip(rejection_model.classifier.classes_, motivo_proba)
+                    for motivo, prob in zip(motivos, motivo_proba)
                 ]
                 motivos_sorted = sorted(motivos_with_proba, key=lambda x: x[1], reverse=True)
                 
-                result['reason_of_rejection'] = motivo_pred
+                result['reason_of_rejection'] = motivos[np.argmax(motivo_proba)]
                 result['top_reasons'] = [
                     f"{motivo}: {prob*100:.1f}%" 
                     for motivo, prob in motivos_sorted[:3]
                 ]
-            except Exception as e:
-                result['reason_of_rejection'] = "No se pudo determinar el motivo"
-                result['error'] = str(e)
+        except Exception as e:
+            result['reason_of_rejection'] = "No se pudo determinar el motivo"
+            result['error'] = str(e)
     
     return result
 
@@ -0,0 +1,248 @@
+import hashlib
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
+
+from ml_models.models import LicenseDatasetEntry, LicenseDatasetFeatures
+from .dataset_stream import iter_dataset_chunks
+from .model_loader import save_artifact
+from .spanish_stopwords import SPANISH_STOPWORDS
+
+# Paths
+CACHE_DIR = Path(__file__).resolve().parent / 'cache'
+FEATURES_PATH = CACHE_DIR / 'dataset_features.joblib'
+
+# Representación de texto por hashing: no tiene vocabulario, por lo que los textos
+# ya procesados no se vuelven a tokenizar cuando llegan registros nuevos.
+HASHING_PARAMS = {
+    'n_features': 2 ** 16,
+    'ngram_range': (1, 3),
+    'alternate_sign': False,
+    'norm': None,
+}
+
+
+# Formato binario de LicenseDatasetFeatures: 2^16 columnas entran en 16 bits
+INDEX_DTYPE = np.dtype('<u2') if HASHING_PARAMS['n_features'] <= 2 ** 16 else np.dtype('<u4')
+COUNT_DTYPE = np.dtype('<f4')
+
+
+def hashing_params_key(params=None):
+    """Identifica la configuración de hashing (incluidas las stop words) de las features guardadas."""
+    params = params or HASHING_PARAMS
+    description = repr((sorted(params.items()), sorted(SPANISH_STOPWORDS), INDEX_DTYPE.str, COUNT_DTYPE.str))
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def make_hashing_vectorizer():
+    return HashingVectorizer(stop_words=SPANISH_STOPWORDS, dtype=np.float32, **HASHING_PARAMS)
+
+
+class HashedFeatureSelector(BaseEstimator, TransformerMixin):
+    """
+    Equivalente a min_df/max_df/max_features de TfidfVectorizer, pero sobre columnas hasheadas.
+    Se ajusta con la matriz de conteos cacheada, sin volver a leer los textos.
+    """
+
+    def __init__(self, min_df=1, max_df=1.0, max_features=None):
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+
+    def fit(self, X, y=None):
+        n_docs = X.shape[0]
+        doc_freq = np.asarray((X > 0).sum(axis=0)).ravel()
+        max_doc_count = self.max_df if isinstance(self.max_df, int) else self.max_df * n_docs
+        candidates = np.flatnonzero((doc_freq >= self.min_df) & (doc_freq <= max_doc_count))
+
+        if self.max_features is not None and len(candidates) > self.max_features:
+            term_freq = np.asarray(X[:, candidates].sum(axis=0)).ravel()
+            top = np.argsort(-term_freq, kind='mergesort')[:self.max_features]
+            candidates = np.sort(candidates[top])
+
+        self.columns_ = candidates
+        return self
+
+    def transform(self, X):
+        return X[:, self.columns_]
+
+
+def make_hashed_text_pipeline(min_df=1, max_df=1.0, max_features=None, sublinear_tf=False):
+    """
+    Vectorizador para predicción: hashing -> selección de columnas -> TF-IDF.
+    Los dos últimos pasos se ajustan sobre los conteos cacheados.
+    """
+    return make_pipeline(
+        make_hashing_vectorizer(),
+        HashedFeatureSelector(min_df=min_df, max_df=max_df, max_features=max_features),
+        TfidfTransformer(sublinear_tf=sublinear_tf)
+    )
+
+
+def hash_texts(texts):
+    return make_hashing_vectorizer().transform(texts).astype(np.float32)
+
+
+def store_entry_features(entries):
+    """
+    Hashea los textos de (id, texto) y guarda sus conteos en LicenseDatasetFeatures, reemplazando
+    los que hubiera. Se llama al insertar registros. Devuelve la matriz de conteos.
+    """
+    if not entries:
+        return csr_matrix((0, HASHING_PARAMS['n_features']), dtype=np.float32)
+    ids, texts = zip(*entries)
+    counts = hash_texts(texts)
+    counts.sort_indices()
+    params_key = hashing_params_key()
+
+    rows = []
+    for i, entry_id in enumerate(ids):
+        start, end = counts.indptr[i], counts.indptr[i + 1]
+        rows.append(LicenseDatasetFeatures(
+            entry_id=entry_id,
+            params_key=params_key,
+            indices=counts.indices[start:end].astype(INDEX_DTYPE).tobytes(),
+            counts=counts.data[start:end].astype(COUNT_DTYPE).tobytes(),
+        ))
+    LicenseDatasetFeatures.objects.filter(entry_id__in=ids).delete()
+    LicenseDatasetFeatures.objects.bulk_create(rows)
+    return counts
+
+
+def backfill_entry_features():
+    """Calcula las features de los registros que no las tienen o las tienen con otra configuración."""
+    stale = LicenseDatasetEntry.objects.exclude(features__params_key=hashing_params_key())
+    stored = 0
+    for chunk in iter_dataset_chunks(stale, ('id', 'text')):
+        store_entry_features(chunk)
+        stored += len(chunk)
+    return stored
+
+
+def stored_counts(rows):
+    """
+    Arma la matriz de conteos de filas (id, params_key, indices, counts) leídas de LicenseDatasetFeatures.
+    Las que no tienen features guardadas (registros anteriores al feature store) o se calcularon con
+    otra configuración se hashean desde el texto y se guardan, así la próxima vez ya no se tokenizan.
+    """
+    params_key = hashing_params_key()
+    missing = [entry_id for entry_id, key, _, _ in rows if key != params_key]
+    if missing:
+        texts = dict(LicenseDatasetEntry.objects.filter(id__in=missing).values_list('id', 'text'))
+        recomputed = store_entry_features([(entry_id, texts[entry_id]) for entry_id in missing])
+        recomputed_rows = {entry_id: recomputed[i] for i, entry_id in enumerate(missing)}
+
+    indices, data, indptr = [], [], [0]
+    for entry_id, key, row_indices, row_counts in rows:
+        if key != params_key:
+            row = recomputed_rows[entry_id]
+            indices.append(row.indices.astype(np.int32))
+            data.append(row.data)
+        else:
+            indices.append(np.frombuffer(row_indices, dtype=INDEX_DTYPE).astype(np.int32))
+            data.append(np.frombuffer(row_counts, dtype=COUNT_DTYPE).astype(np.float32))
+        indptr.append(indptr[-1] + len(indices[-1]))
+
+    return csr_matrix(
+        (np.concatenate(data) if data else np.empty(0, dtype=np.float32),
+         np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+         np.asarray(indptr, dtype=np.int64)),
+        shape=(len(rows), HASHING_PARAMS['n_features'])
+    )
+
+
+class DatasetFeatures:
+    """Conteos hasheados por registro de LicenseDatasetEntry, con sus etiquetas."""
+
+    def __init__(self, params=None):
+        self.params = params or dict(HASHING_PARAMS)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.counts = csr_matrix((0, self.params['n_features']), dtype=np.float32)
+        self.types = np.empty(0, dtype=object)
+        self.statuses = np.empty(0, dtype=object)
+        self.reasons = np.empty(0, dtype=object)
+
+    @property
+    def last_id(self):
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    def append(self, chunks):
+        """
+        Agrega bloques de filas (id, type, status, reason, params_key, indices, counts) con las
+        features guardadas de cada registro (ver stored_counts): los textos no se vuelven a procesar.
+        """
+        ids, counts, types, statuses, reasons = [self.ids], [self.counts], [self.types], [self.statuses], [self.reasons]
+        new_rows = 0
+        for chunk in chunks:
+            chunk_ids, chunk_types, chunk_statuses, chunk_reasons, *_ = zip(*chunk)
+            ids.append(np.asarray(chunk_ids, dtype=np.int64))
+            counts.append(stored_counts([(row[0], *row[4:]) for row in chunk]))
+            types.append(np.asarray(chunk_types, dtype=object))
+            statuses.append(np.asarray(chunk_statuses, dtype=object))
+            reasons.append(np.asarray(chunk_reasons, dtype=object))
+            new_rows += len(chunk)
+
+        if new_rows:
+            self.ids = np.concatenate(ids)
+            self.counts = vstack(counts, format='csr')
+            self.types = np.concatenate(types)
+            self.statuses = np.concatenate(statuses)
+            self.reasons = np.concatenate(reasons)
+        return new_rows
+
+    def subset(self, mask, since_id=None):
+        """
+        Devuelve ids, conteos y etiquetas de las filas seleccionadas, y cuántas de ellas
+        son posteriores a since_id (el last_training_id del modelo activo).
+        """
+        ids = self.ids[mask]
+        return {
+            'new_samples': int((ids > since_id).sum()) if since_id else len(ids),
+            'ids': ids,
+            'counts': self.counts[np.flatnonzero(mask)],
+            'types': self.types[mask].tolist(),
+            'statuses': self.statuses[mask].tolist(),
+            'reasons': self.reasons[mask].tolist(),
+        }
+
+
+def _is_consistent(features):
+    """El caché es válido si usa los mismos parámetros y no se borraron registros ya procesados."""
+    if features.params != HASHING_PARAMS:
+        return False
+    if not len(features.ids):
+        return True
+    return LicenseDatasetEntry.objects.filter(id__lte=features.last_id).count() == len(features.ids)
+
+
+def load_dataset_features(rebuild=False):
+    """
+    Actualiza el caché de features agregando los registros posteriores al último id procesado, con
+    los conteos guardados en LicenseDatasetFeatures. Si el caché no existe, cambió la configuración
+    o se eliminaron registros, se reconstruye completo (también desde LicenseDatasetFeatures).
+    Devuelve (features, cantidad de registros nuevos).
+    """
+    features = None
+    if not rebuild and FEATURES_PATH.exists():
+        features = joblib.load(FEATURES_PATH)
+        if not _is_consistent(features):
+            features = None
+    if features is None:
+        features = DatasetFeatures()
+
+    new_rows = features.append(iter_dataset_chunks(
+        LicenseDatasetEntry.objects.filter(id__gt=features.last_id),
+        ('id', 'type', 'status', 'reason', 'features__params_key', 'features__indices', 'features__counts')
+    ))
+
+    if new_rows or not FEATURES_PATH.exists():
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Reemplazo atómico: varios entrenamientos pueden leer el caché en paralelo
+        save_artifact(features, FEATURES_PATH)
+
+    return features, new_rows
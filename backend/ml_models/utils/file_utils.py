@@ -1,26 +1,21 @@
 import base64
 import re
 import os
-import pytesseract
 import unicodedata
 import io
 
 #from PIL import Image #podria no necesitarse
-from pdfminer.high_level import extract_text
 from datetime import datetime #podria no necesitarse
 from io import BytesIO
-from PyPDF2 import PdfReader as PyPDF2_PdfReader
-from pdf2image import convert_from_path
-    
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import mm
-from pdfrw import PdfReader, PdfWriter, PageMerge
+
+# Las librerías de PDF y OCR (pdfminer, PyPDF2, pytesseract, reportlab, pdfrw) se importan
+# dentro de cada función: son pesadas y este módulo se importa al cargar las vistas.
 
 
 
 def is_pdf_image(base64_pdf):
    """ Determina si el PDF es una imagen"""
+   from pdfminer.high_level import extract_text
    pdf_bytes = base64.b64decode(base64_pdf)
    text = extract_text(BytesIO(pdf_bytes))
    return not bool(text.strip())  # True si NO hay texto
@@ -29,6 +24,10 @@ def is_pdf_image(base64_pdf):
 
 def base64_to_text(base64_pdf, is_image=False):
     """Decodifica un PDF en base64 y extrae texto. Usa OCR si is_image=True."""
+    from PyPDF2 import PdfReader as PyPDF2_PdfReader
+    from pdf2image import convert_from_path
+    import pytesseract
+
     try:
         pdf_bytes = base64.b64decode(base64_pdf)
         with open("temp.pdf", "wb") as temp_file:
@@ -108,6 +107,10 @@ def search_in_pdf_text(normalized_text, search_terms):
 
 
 def insert_code_to_pdf_return_bytes(template_path: str, code: str) -> bytes:
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import mm
+    from pdfrw import PdfReader, PdfWriter, PageMerge
+
     # Leer PDF original
     template_pdf = PdfReader(template_path)
     last_page = template_pdf.pages[-1]
@@ -141,6 +144,8 @@ def insert_code_to_pdf_return_bytes(template_path: str, code: str) -> bytes:
 
 # Imporante: es requisito que el codigo debe venir en BASE64
 def extract_certificate_id_from_pdf_base64(base64_pdf: str) -> str:
+    from pdfminer.high_level import extract_text
+
     try:
         # Decodificar base64 a bytes
         pdf_bytes = base64.b64decode(base64_pdf)
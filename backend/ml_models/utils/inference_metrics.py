@@ -0,0 +1,320 @@
+import atexit
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from ml_models.models import InferenceMetrics, MLModel
+
+logger = logging.getLogger('automatic_models_training')
+
+# Modelo de inferencia (ver INFERENCE_RUNNERS) -> MLModel.model_type de la versión activa
+RUNNER_MODEL_TYPES = {
+    'approval': 'LICENSE_APPROVAL',
+    'rejection': 'REJECTION_REASON',
+    'coherence': 'CLASSIFICATION',
+    'health_risk': 'HEALTH_RISK',
+    'supervisor_anomaly': 'SUPERVISOR_ANOMALY_DETECTION',
+    'employee_anomaly': 'EMPLOYEE_ANOMALY_DETECTION',
+}
+
+# Bordes fijos de los histogramas: así los de distintos procesos y momentos se suman bucket a bucket
+LATENCY_EDGES_MS = [round(0.1 * 2 ** k, 1) for k in range(18)]  # 0.1 ms .. 13 s
+BATCH_SIZE_EDGES = [2 ** k for k in range(13)]  # 1 .. 4096
+PROBABILITY_EDGES = [round(k / 20, 2) for k in range(21)]
+# decision_function del IsolationForest: negativo = anómalo
+ANOMALY_EDGES = [round(-0.5 + k / 20, 2) for k in range(21)]
+
+# Cada cuánto se buscan las versiones activas y se persisten los histogramas
+VERSION_TTL_SECONDS = 10
+DEFAULT_FLUSH_SECONDS = 60
+
+
+def metrics_enabled():
+    return getattr(settings, 'ML_METRICS_ENABLED', True)
+
+
+def flush_interval():
+    return getattr(settings, 'ML_METRICS_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+
+
+class StreamingHistogram:
+    """
+    Histograma con bordes fijos que se actualiza de a lotes, más cantidad, suma, mínimo y máximo.
+    Los cuantiles se estiman interpolando dentro del bucket. El bucket 0 son los valores menores
+    al primer borde y el último los mayores o iguales al último.
+    """
+
+    def __init__(self, edges):
+        self.edges = list(edges)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        buckets = np.searchsorted(self.edges, values, side='right')
+        self.counts += np.bincount(buckets, minlength=len(self.counts))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+
+    def merge(self, other):
+        if other.edges != self.edges:
+            # Cambiaron los bordes (nueva versión del código): se descarta lo anterior
+            return other
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        for attr, pick in (('min', min), ('max', max)):
+            values = [v for v in (getattr(self, attr), getattr(other, attr)) if v is not None]
+            setattr(self, attr, pick(values) if values else None)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = np.cumsum(self.counts)
+        bucket = int(np.searchsorted(cumulative, target, side='left'))
+        low = self.edges[bucket - 1] if bucket > 0 else self.min
+        high = self.edges[bucket] if bucket < len(self.edges) else self.max
+        before = cumulative[bucket - 1] if bucket > 0 else 0
+        fraction = (target - before) / self.counts[bucket] if self.counts[bucket] else 0
+        return round(float(min(max(low + (high - low) * fraction, self.min), self.max)), 4)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 4) if self.count else None,
+            'min': round(self.min, 4) if self.min is not None else None,
+            'max': round(self.max, 4) if self.max is not None else None,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+    def to_dict(self):
+        return {
+            'edges': self.edges, 'counts': self.counts.tolist(),
+            'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data, default_edges):
+        histogram = cls(data.get('edges') or default_edges)
+        if data:
+            histogram.counts = np.asarray(data['counts'], dtype=np.int64)
+            histogram.count = data['count']
+            histogram.sum = data['sum']
+            histogram.min = data['min']
+            histogram.max = data['max']
+        return histogram
+
+
+def population_stability_index(expected, actual, epsilon=1e-4):
+    """PSI entre dos histogramas con los mismos bordes (> 0.2 suele considerarse un cambio importante)."""
+    if expected.edges != actual.edges or not expected.count or not actual.count:
+        return None
+    p = np.maximum(expected.counts / expected.count, epsilon)
+    q = np.maximum(actual.counts / actual.count, epsilon)
+    return round(float(np.sum((q - p) * np.log(q / p))), 4)
+
+
+def _positive_class(meta, rows):
+    return np.asarray(rows)[:, list(meta).index(1)]
+
+
+def _max_probability(meta, rows):
+    if meta is None:
+        return np.empty(0)
+    return np.asarray(rows).max(axis=1)
+
+
+# Score que se sigue por modelo: probabilidad de aprobación, confianza de la clase elegida,
+# riesgo predicho (0/1) o score de anomalía
+SCORE_FUNCTIONS = {
+    'approval': (_positive_class, PROBABILITY_EDGES),
+    'rejection': (_max_probability, PROBABILITY_EDGES),
+    'coherence': (_max_probability, PROBABILITY_EDGES),
+    'health_risk': (lambda meta, rows: np.asarray(rows), PROBABILITY_EDGES),
+    'supervisor_anomaly': (lambda meta, rows: np.asarray(rows), ANOMALY_EDGES),
+    'employee_anomaly': (lambda meta, rows: np.asarray(rows), ANOMALY_EDGES),
+}
+
+
+class RunnerMetrics:
+    """Lo acumulado de un modelo (una versión) desde la última vez que se persistió."""
+
+    def __init__(self, runner):
+        self.batches = 0
+        self.latency_ms = StreamingHistogram(LATENCY_EDGES_MS)
+        self.batch_size = StreamingHistogram(BATCH_SIZE_EDGES)
+        self.scores = StreamingHistogram(SCORE_FUNCTIONS[runner][1])
+
+    def add_to(self, row):
+        """Suma estas métricas a una fila de InferenceMetrics."""
+        row.batches += self.batches
+        for field in ('latency_ms', 'batch_size', 'scores'):
+            stored = StreamingHistogram.from_dict(getattr(row, field), getattr(self, field).edges)
+            setattr(row, field, stored.merge(getattr(self, field)).to_dict())
+
+
+class MetricsRecorder:
+    """
+    Acumula en memoria las métricas de inferencia del proceso, por (versión activa, modelo), y las
+    suma a InferenceMetrics cada ML_METRICS_FLUSH_SECONDS desde un hilo aparte (y al terminar el
+    proceso). El hilo se crea con la primera predicción, después del fork de los workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._versions = {}
+        self._versions_at = 0.0
+        self._flusher = None
+
+    def _active_versions(self):
+        now = time.monotonic()
+        if now - self._versions_at > VERSION_TTL_SECONDS:
+            self._versions = dict(
+                MLModel.objects.filter(is_active=True, department__isnull=True, model_type__in=RUNNER_MODEL_TYPES.values())
+                .values_list('model_type', 'id')
+            )
+            self._versions_at = now
+        return self._versions
+
+    def record(self, runner, batch_size, latency_ms, meta, rows):
+        model_id = self._active_versions().get(RUNNER_MODEL_TYPES[runner])
+        if model_id is None:
+            # Artefacto sin versión en MLModel (ej. los modelos incluidos en el repo): no hay a qué
+            # asociarlas, y con ml_model NULL unique_together no evita filas duplicadas entre workers
+            return
+        score_function, _ = SCORE_FUNCTIONS[runner]
+        scores = score_function(meta, rows)
+
+        with self._lock:
+            metrics = self._pending.get((model_id, runner))
+            if metrics is None:
+                metrics = self._pending[(model_id, runner)] = RunnerMetrics(runner)
+            metrics.batches += 1
+            metrics.latency_ms.add([latency_ms])
+            metrics.batch_size.add([batch_size])
+            metrics.scores.add(scores)
+        self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(flush_interval())
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("No se pudieron guardar las métricas de inferencia")
+            finally:
+                # La conexión de este hilo no la cierra el ciclo de requests de Django
+                connection.close()
+
+    def flush(self):
+        """Suma lo acumulado a InferenceMetrics y vacía el acumulador del proceso."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for (model_id, runner), metrics in pending.items():
+            with transaction.atomic():
+                row, _ = InferenceMetrics.objects.select_for_update().get_or_create(ml_model_id=model_id, runner=runner)
+                metrics.add_to(row)
+                row.save()
+        return len(pending)
+
+
+_recorder = MetricsRecorder()
+
+
+def record_inference(runner, batch_size, latency_ms, meta, rows):
+    """Registra una ejecución de un modelo: latencia, tamaño del lote y scores."""
+    if not metrics_enabled():
+        return
+    try:
+        _recorder.record(runner, batch_size, latency_ms, meta, rows)
+    except Exception:
+        # La instrumentación nunca debe romper una predicción
+        logger.exception(f"No se pudieron registrar las métricas de inferencia ({runner})")
+
+
+def flush_metrics():
+    return _recorder.flush()
+
+
+def _flush_at_exit():
+    try:
+        _recorder.flush()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def _summary(row):
+    scores = StreamingHistogram.from_dict(row.scores, SCORE_FUNCTIONS[row.runner][1])
+    batch_size = StreamingHistogram.from_dict(row.batch_size, BATCH_SIZE_EDGES)
+    return {
+        'runner': row.runner,
+        'batches': row.batches,
+        'items': int(batch_size.sum),
+        'latency_ms': StreamingHistogram.from_dict(row.latency_ms, LATENCY_EDGES_MS).summary(),
+        'batch_size': batch_size.summary(),
+        'scores': {**scores.summary(), 'edges': scores.edges, 'histogram': scores.counts.tolist()},
+        'updated_at': row.updated_at,
+    }
+
+
+def model_metrics(models):
+    """
+    Métricas de inferencia de cada modelo ({id: [resumen por modelo de inferencia]}), con el PSI de
+    la distribución de scores contra la versión anterior del mismo tipo (drift después de reentrenar).
+    """
+    models = list(models)
+    rows = InferenceMetrics.objects.filter(ml_model__in=models).select_related('ml_model')
+
+    # Versión anterior con métricas de cada tipo de modelo activo
+    previous = {}
+    for model in models:
+        row = InferenceMetrics.objects.filter(
+            ml_model__model_type=model.model_type, ml_model_id__lt=model.id
+        ).order_by('-ml_model_id').first()
+        if row is not None:
+            previous[(model.id, row.runner)] = row
+
+    result = {model.id: [] for model in models}
+    for row in rows:
+        summary = _summary(row)
+        before = previous.get((row.ml_model_id, row.runner))
+        if before is not None:
+            summary['drift'] = {
+                'previous_model': before.ml_model_id,
+                'psi': population_stability_index(
+                    StreamingHistogram.from_dict(before.scores, SCORE_FUNCTIONS[row.runner][1]),
+                    StreamingHistogram.from_dict(row.scores, SCORE_FUNCTIONS[row.runner][1]),
+                ),
+            }
+        result[row.ml_model_id].append(summary)
+    return result
@@ -0,0 +1,235 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .inference_metrics import record_inference
+
+logger = logging.getLogger('automatic_models_training')
+
+# Modelo -> función que predice un lote: recibe columnas con una fila por ítem y
+# devuelve (meta, filas), donde meta es común a todo el lote (por ejemplo las clases).
+INFERENCE_RUNNERS = {
+    'approval': 'ml_models.utils.evaluation_model.approval_proba_batch',
+    'rejection': 'ml_models.utils.evaluation_model.rejection_proba_batch',
+    'coherence': 'ml_models.utils.coherence_model_ml.coherence_proba_batch',
+    'health_risk': 'ml_models.health_risk.risk_model.risk_predict_batch',
+    'supervisor_anomaly': 'ml_models.anomalies.isolation_forest.supervisor_anomaly_batch',
+    'employee_anomaly': 'ml_models.anomalies.isolation_forest.employee_anomaly_batch',
+}
+
+DEFAULT_BATCH_WAIT_MS = 2
+DEFAULT_MAX_BATCH = 256
+# Espera máxima de la respuesta del servidor antes de predecir en el proceso
+DEFAULT_TIMEOUT_SECONDS = 30
+
+
+class InferenceError(Exception):
+    """Error del modelo al predecir dentro del servidor de inferencia."""
+
+
+def inference_socket():
+    """Socket del servidor de inferencia; None significa predecir dentro del proceso."""
+    return os.environ.get('ML_INFERENCE_SOCKET') or getattr(settings, 'ML_INFERENCE_SOCKET', None)
+
+
+def _authkey():
+    return settings.SECRET_KEY.encode('utf-8')
+
+
+def run_batch(name, columns):
+    """Ejecuta el modelo sobre un lote en este proceso y registra su latencia y sus scores."""
+    start = time.perf_counter()
+    meta, rows = import_string(INFERENCE_RUNNERS[name])(*columns)
+    record_inference(name, _n_rows(columns), (time.perf_counter() - start) * 1000, meta, rows)
+    return meta, rows
+
+
+def _n_rows(columns):
+    return len(columns[0])
+
+
+def _concat(parts):
+    first = parts[0]
+    if isinstance(first, pd.DataFrame):
+        return pd.concat(parts, ignore_index=True)
+    if isinstance(first, np.ndarray):
+        return np.concatenate(parts)
+    return [row for part in parts for row in part]
+
+
+class _Pending:
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceServer:
+    """
+    Servidor local de inferencia: los workers de Django se conectan por un socket Unix y las
+    solicitudes que llegan juntas se agrupan por modelo en una sola llamada (micro-batching).
+    Los modelos se ejecutan solo en el hilo del batcher, así que no hay predicciones concurrentes.
+    """
+
+    def __init__(self, address, batch_wait_ms=DEFAULT_BATCH_WAIT_MS, max_batch=DEFAULT_MAX_BATCH):
+        self.address = address
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.listener = None
+        self.stats = defaultdict(lambda: {'batches': 0, 'items': 0})
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.listener = Listener(self.address, family='AF_UNIX', authkey=_authkey())
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        logger.info(f"Servidor de inferencia escuchando en {self.address}")
+
+        try:
+            while True:
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    # Listener cerrado (shutdown) o handshake fallido
+                    if self.listener is None:
+                        break
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+
+    def _handle_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, columns = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                pending = _Pending(name, columns)
+                self.requests.put(pending)
+                pending.done.wait()
+
+                if pending.error is not None:
+                    conn.send(('error', pending.error))
+                else:
+                    conn.send(('ok', pending.result))
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                by_model = defaultdict(list)
+                for pending in batch:
+                    by_model[pending.name].append(pending)
+
+                close_old_connections()
+                for name, items in by_model.items():
+                    self._run(name, items)
+            except Exception as e:
+                # Si el hilo muere, todos los clientes esperan para siempre: se responde error y se sigue
+                logger.exception("Error en el batcher del servidor de inferencia")
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.error = f"{type(e).__name__}: {e}"
+                        pending.done.set()
+
+    def _run(self, name, items):
+        try:
+            n_columns = len(items[0].columns)
+            columns = [_concat([item.columns[i] for item in items]) for i in range(n_columns)]
+            meta, rows = run_batch(name, columns)
+        except Exception as e:
+            logger.exception(f"Error en el servidor de inferencia ({name})")
+            for item in items:
+                item.error = f"{type(e).__name__}: {e}"
+                item.done.set()
+            return
+
+        self.stats[name]['batches'] += 1
+        self.stats[name]['items'] += len(items)
+
+        start = 0
+        for item in items:
+            end = start + _n_rows(item.columns)
+            item.result = (meta, rows[start:end])
+            start = end
+            item.done.set()
+
+
+_local = threading.local()
+
+
+def _connection(address):
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'address', None) != address:
+        conn = Client(address, family='AF_UNIX', authkey=_authkey())
+        _local.conn, _local.address = conn, address
+    return conn
+
+
+def _drop_connection():
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+def infer(name, *columns):
+    """
+    Predice con el modelo `name` (ver INFERENCE_RUNNERS). Cada columna tiene una fila por ítem.
+    Usa el servidor de inferencia si ML_INFERENCE_SOCKET está configurado; si no está configurado,
+    no está levantado o no responde en ML_INFERENCE_TIMEOUT segundos, predice dentro del proceso
+    (el comportamiento de siempre, y el de los tests). Devuelve (meta, filas).
+    """
+    address = inference_socket()
+    if address:
+        timeout = getattr(settings, 'ML_INFERENCE_TIMEOUT', DEFAULT_TIMEOUT_SECONDS)
+        try:
+            conn = _connection(address)
+            conn.send((name, columns))
+            if not conn.poll(timeout):
+                # La respuesta tardía desincronizaría la conexión: se descarta (ver _drop_connection)
+                raise TimeoutError(f"sin respuesta en {timeout} s")
+            status, payload = conn.recv()
+        except (OSError, EOFError) as e:
+            _drop_connection()
+            logger.warning(f"Servidor de inferencia no disponible ({e}), se predice en el proceso")
+        else:
+            if status == 'error':
+                raise InferenceError(payload)
+            return payload
+
+    return run_batch(name, columns)
@@ -1,6 +1,7 @@
 import csv
 from pathlib import Path
 from ml_models.models import LicenseDatasetEntry
+from ml_models.utils.near_duplicates import add_dataset_entry
 from django.core.exceptions import ValidationError
 from django.db import transaction
 
@@ -23,8 +24,9 @@ with open(csv_file_path, newline='', encoding='utf-8-sig') as csvfile:
             )
             try:
                 entry.full_clean()
-                entry.save()
-                print(f"✅ Fila {i} cargada: {entry}")
+                # Los casi duplicados de un registro ya cargado solo suman su peso
+                entry, created = add_dataset_entry(entry.text, entry.type, entry.status, entry.reason)
+                print(f"✅ Fila {i} cargada: {entry}" if created else f"↪️ Fila {i} casi duplicada de #{entry.pk}")
             except ValidationError as e:
                 print(f"❌ Error en fila {i}: {row}")
                 print(f"   ↳ {e}")
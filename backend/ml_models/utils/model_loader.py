@@ -0,0 +1,176 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import joblib
+
+logger = logging.getLogger('automatic_models_training')
+
+# Los arrays numpy de los artefactos se abren como mapas de memoria de solo lectura:
+# todos los workers comparten las mismas páginas del archivo en lugar de tener copias privadas.
+MMAP_MODE = 'r'
+
+# Cada cuánto se vuelve a consultar en MLModel el artefacto de la versión activa
+ACTIVE_ARTIFACT_TTL_SECONDS = 10
+
+_artifacts = {}
+_active_artifacts = {}
+_lock = threading.Lock()
+
+
+def save_artifact(obj, path):
+    """
+    Guarda un artefacto sin compresión (requisito para poder abrirlo con mmap_mode).
+    Se escribe en un archivo temporal y se reemplaza de forma atómica, para no modificar
+    las páginas que otros procesos todavía tienen mapeadas del archivo anterior.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp_path, compress=0)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with _lock:
+        _artifacts.pop(str(path), None)
+    return path
+
+
+def load_artifact(path, mmap_mode=MMAP_MODE):
+    """
+    Devuelve el artefacto cargado una sola vez por proceso.
+    Si el archivo cambió en disco (nuevo entrenamiento) se vuelve a cargar.
+    """
+    path = str(path)
+    mtime = os.path.getmtime(path)
+
+    with _lock:
+        cached = _artifacts.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    artifact = joblib.load(path, mmap_mode=mmap_mode)
+    with _lock:
+        _artifacts[path] = (mtime, artifact)
+    return artifact
+
+
+def clear_artifacts():
+    """Vacía la caché de artefactos del proceso actual."""
+    with _lock:
+        _artifacts.clear()
+
+
+def active_artifact_path(model_type):
+    """
+    Ruta del artefacto del modelo activo (global) de ese tipo según MLModel.artifact (None si no
+    hay uno entrenado o el archivo no existe). Se guarda en memoria ACTIVE_ARTIFACT_TTL_SECONDS: un
+    reentrenamiento hecho en otro proceso se ve a lo sumo ese tiempo después.
+    """
+    return _active_artifacts_for(model_type, departments=False).get(None)
+
+
+def department_artifact_paths(model_type):
+    """{department_id: ruta} de los modelos activos por departamento del tipo (mismo caché)."""
+    return _active_artifacts_for(model_type, departments=True)
+
+
+def _active_artifacts_for(model_type, departments):
+    now = time.monotonic()
+    key = (model_type, departments)
+    with _lock:
+        cached = _active_artifacts.get(key)
+    if cached is not None and now - cached[0] < ACTIVE_ARTIFACT_TTL_SECONDS:
+        return cached[1]
+
+    from django.conf import settings
+    from ml_models.models import MLModel
+
+    rows = MLModel.objects.filter(
+        model_type=model_type, department__isnull=not departments, is_active=True
+    ).exclude(artifact='').values_list('department_id', 'artifact')
+    paths = {}
+    for department_id, artifact in rows:
+        path = os.path.join(settings.BASE_DIR, artifact)
+        if os.path.exists(path):
+            paths[department_id] = path
+    with _lock:
+        _active_artifacts[key] = (now, paths)
+    return paths
+
+
+def forget_active_artifacts():
+    """Olvida las rutas de los modelos activos (después de entrenar en este mismo proceso)."""
+    with _lock:
+        _active_artifacts.clear()
+
+
+def default_artifact_paths(active_models=False):
+    """
+    Rutas de los artefactos que usan las vistas en producción. Los detectores de anomalías sirven
+    el artefacto de MLModel.artifact (globales y por departamento), que se lee de la base: solo se
+    incluyen con active_models=True (el master de gunicorn, el servidor de inferencia), no en
+    AppConfig.ready, donde no se debe consultar la base.
+    """
+    from ml_models.utils import evaluation_model, coherence_model_ml
+    from ml_models.health_risk import risk_model
+
+    paths = [
+        evaluation_model.APPROVAL_MODEL_PATH,
+        evaluation_model.REJECTION_MODEL_PATH,
+        coherence_model_ml.MODEL_PATH,
+        coherence_model_ml.FAST_MODEL_PATH,
+        risk_model.MODEL_PATH,
+        risk_model.SCALER_PATH,
+    ]
+    if active_models:
+        paths += active_anomaly_artifact_paths()
+    return [Path(p) for p in paths if p]
+
+
+def active_anomaly_artifact_paths():
+    """Artefactos activos de los detectores de anomalías según MLModel (vacío si no hay base)."""
+    from ml_models.anomalies.isolation_forest import ANOMALY_MODELS
+
+    paths = []
+    try:
+        for model_type in ANOMALY_MODELS:
+            paths.append(active_artifact_path(model_type))
+            paths += department_artifact_paths(model_type).values()
+    except Exception:
+        # Sin base al arrancar no se precargan: se cargan en la primera predicción
+        logger.exception("No se pudieron leer los modelos de anomalías activos para precargarlos")
+    return paths
+
+
+def preload_artifacts(paths=None, active_models=False):
+    """
+    Carga los artefactos existentes antes de que el servidor haga fork de los workers,
+    de modo que los objetos queden compartidos copy-on-write entre procesos.
+    No entrena modelos faltantes. Con active_models=True consulta MLModel para incluir los
+    detectores de anomalías activos (ver default_artifact_paths).
+    """
+    loaded = []
+    for path in paths if paths is not None else default_artifact_paths(active_models):
+        if Path(path).exists():
+            load_artifact(path)
+            loaded.append(Path(path))
+    return loaded
+
+
+def warmup_models():
+    """
+    Importa los módulos de predicción (sklearn, lightgbm, pandas) y precarga los artefactos
+    activos, para que la primera solicitud no pague ni los imports ni el joblib.load.
+    Corre en AppConfig.ready: los detectores de anomalías no se precargan (sus artefactos se leen de la base).
+    """
+    import ml_models.utils.prediction_store  # noqa: F401
+    import ml_models.health_risk.risk_model  # noqa: F401
+    import ml_models.anomalies.isolation_forest  # noqa: F401
+    return preload_artifacts()
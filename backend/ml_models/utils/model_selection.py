@@ -0,0 +1,165 @@
+import os
+import time
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+from django.conf import settings
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, balanced_accuracy_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+from .dataset_stream import take_rows
+from .feature_cache import CACHE_DIR
+from .model_loader import save_artifact
+
+# Matrices de cada fold ya featurizadas, direccionadas por contenido
+FOLDS_DIR = CACHE_DIR / 'folds'
+# Días sin usarse tras los cuales se borra un fold (ML_FOLD_CACHE_MAX_AGE_DAYS)
+DEFAULT_FOLD_MAX_AGE_DAYS = 7
+
+SCORERS = {
+    'accuracy': accuracy_score,
+    'balanced_accuracy': balanced_accuracy_score,
+}
+
+# Espacio de búsqueda por defecto para los clasificadores LightGBM
+LGBM_PARAM_GRID = {
+    'num_leaves': [15, 31, 63],
+    'max_depth': [4, 8, -1],
+    'learning_rate': [0.03, 0.05, 0.1],
+    'n_estimators': [200, 500],
+    'min_child_samples': [1, 5, 20],
+}
+
+
+def featurizer_params(model):
+    """Parámetros que determinan las features: si cambian, las matrices cacheadas no sirven."""
+    return {
+        'class': type(model).__name__,
+        'text_weight': model.text_weight,
+        'type_weight': model.type_weight,
+        'vectorizer': model.vectorizer.get_params(),
+    }
+
+
+def featurize_folds(make_model, texts, types, labels, splits, watermark, weights=None):
+    """
+    Featuriza cada fold (ajustando el vectorizador solo con su parte de entrenamiento) y lo guarda
+    en disco. La clave es un hash del watermark del dataset, los parámetros del featurizador,
+    los índices del fold y los pesos, así una búsqueda de hiperparámetros no vuelve a calcular el TF-IDF.
+    Con weights (registros que representan casi duplicados) el vectorizador se ajusta ponderado y los
+    pesos quedan en el fold, igual que en el entrenamiento del modelo final.
+    Devuelve la ruta del archivo de cada fold.
+    """
+    FOLDS_DIR.mkdir(parents=True, exist_ok=True)
+    labels = np.asarray(labels)
+    weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+    params = featurizer_params(make_model())
+    # Prefijo featurizador-versión del dataset: al cambiar el dataset se borran los de la versión anterior
+    scope, version = joblib.hash(params)[:12], joblib.hash(watermark)[:12]
+
+    paths = []
+    for train_idx, test_idx in splits:
+        key = joblib.hash({
+            'watermark': watermark,
+            'featurizer': params,
+            'train': np.asarray(train_idx),
+            'test': np.asarray(test_idx),
+            'weights': weights,
+        })
+        path = FOLDS_DIR / f'{scope}-{version}-{key}.joblib'
+        if path.exists():
+            # La antigüedad se cuenta desde el último uso
+            os.utime(path)
+        else:
+            model = make_model()
+            w_train = None if weights is None else weights[train_idx]
+            fold = {
+                'X_train': model._prepare_features(
+                    take_rows(texts, train_idx), take_rows(types, train_idx), fit_transform=True, sample_weight=w_train
+                ).tocsr(),
+                'y_train': labels[train_idx],
+                'w_train': w_train,
+                'X_test': model._prepare_features(take_rows(texts, test_idx), take_rows(types, test_idx)).tocsr(),
+                'y_test': labels[test_idx],
+                'w_test': None if weights is None else weights[test_idx],
+            }
+            save_artifact(fold, path)
+        paths.append(path)
+    evict_folds(scope, version, paths)
+    return paths
+
+
+def evict_folds(scope, version, keep=()):
+    """
+    Borra los folds cacheados que ya no sirven: los del featurizador `scope` de otra versión del
+    dataset (el watermark cambia con cada entrenamiento) y los de cualquier featurizador que no se
+    usan hace más de ML_FOLD_CACHE_MAX_AGE_DAYS días. Devuelve la cantidad borrada.
+    """
+    max_age = getattr(settings, 'ML_FOLD_CACHE_MAX_AGE_DAYS', DEFAULT_FOLD_MAX_AGE_DAYS) * 86400
+    keep = {path.name for path in keep}
+    now = time.time()
+    removed = 0
+    for path in FOLDS_DIR.glob('*.joblib'):
+        if path.name in keep:
+            continue
+        outdated = path.name.startswith(f'{scope}-') and not path.name.startswith(f'{scope}-{version}-')
+        try:
+            if outdated or now - path.stat().st_mtime > max_age:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            # Otro proceso ya lo borró
+            pass
+    return removed
+
+
+def fit_fold(path, classifier_params, scoring):
+    """Ajusta un LightGBM sobre un fold cacheado (abierto con mmap) y devuelve su score (ponderado si hay pesos)."""
+    fold = joblib.load(path, mmap_mode='r')
+    classifier = lgb.LGBMClassifier(**classifier_params)
+    classifier.fit(fold['X_train'], fold['y_train'], sample_weight=fold['w_train'])
+    return SCORERS[scoring](fold['y_test'], classifier.predict(fold['X_test']), sample_weight=fold['w_test'])
+
+
+def sample_param_sets(param_grid=None, n_iter=None, random_state=42):
+    """Grilla completa si n_iter es None; si no, n_iter combinaciones al azar."""
+    param_grid = param_grid or LGBM_PARAM_GRID
+    if n_iter is None:
+        return list(ParameterGrid(param_grid))
+    return list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+
+
+def cross_validate_cached(make_model, texts, types, labels, splits, watermark,
+                          param_sets=None, scoring='accuracy', n_jobs=None, weights=None):
+    """
+    Evalúa el clasificador de make_model con cada conjunto de parámetros de LightGBM sobre los folds
+    cacheados, con los mismos pesos por registro que el entrenamiento final (weights).
+    Los ajustes (folds x parámetros) corren en paralelo y cada uno usa un solo hilo.
+    Devuelve una lista ordenada de mejor a peor con params, scores, mean y std.
+    """
+    splits = list(splits)
+    paths = featurize_folds(make_model, texts, types, labels, splits, watermark, weights)
+
+    base_params = make_model().classifier.get_params()
+    # Sin conjunto de validación propio en cada fold: se entrena el número de árboles indicado
+    base_params.update(early_stopping_rounds=None, n_jobs=1)
+    param_sets = param_sets or [{}]
+
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(path, {**base_params, **params}, scoring)
+        for params in param_sets
+        for path in paths
+    )
+
+    results = []
+    for i, params in enumerate(param_sets):
+        fold_scores = np.asarray(scores[i * len(paths):(i + 1) * len(paths)])
+        results.append({
+            'params': params,
+            'scores': fold_scores,
+            'mean': round(float(fold_scores.mean()), 4),
+            'std': round(float(fold_scores.std()), 4),
+        })
+    return sorted(results, key=lambda result: result['mean'], reverse=True)
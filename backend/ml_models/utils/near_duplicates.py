@@ -0,0 +1,274 @@
+import hashlib
+from collections import defaultdict
+
+import numpy as np
+from numbers import Integral
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from ml_models.models import LicenseDatasetBand, LicenseDatasetEntry
+from .feature_cache import store_entry_features
+
+# 64 permutaciones en 16 bandas de 4 filas: dos textos con Jaccard 0.9 caen juntos en alguna
+# banda con probabilidad ~1, y con Jaccard 0.5 en ~0.65 (después se filtra por la firma completa)
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Jaccard estimado mínimo para considerar dos certificados como el mismo
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+# a < 2^31 y shingles de 32 bits: a * x + b entra en 64 bits sin desbordar
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+def shingles(text):
+    """Trigramas de palabras del texto normalizado (o el texto completo si es más corto)."""
+    words = text.split()
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """Firma MinHash (NUM_PERM valores de 32 bits) del texto normalizado."""
+    hashes = np.fromiter((_hash32(s) for s in shingles(text)), dtype=np.uint64)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def signature_from_bytes(value):
+    return np.frombuffer(bytes(value), dtype=np.uint32)
+
+
+def band_buckets(signature):
+    """Un bucket (entero de 64 bits con signo) por banda de la firma."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(signature[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND].tobytes(), digest_size=8).digest(),
+            'little', signed=True
+        )
+        for i in range(BANDS)
+    ]
+
+
+def estimated_jaccard(signature_a, signature_b):
+    return float(np.mean(signature_a == signature_b))
+
+
+def _labels_filter(prefix, license_type, status, reason):
+    return {f'{prefix}type': license_type, f'{prefix}status': status, f'{prefix}reason': reason}
+
+
+def find_near_duplicate(signature, license_type, status, reason, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Busca en el índice LSH un registro con las mismas etiquetas y Jaccard estimado >= threshold.
+    Solo los registros con las mismas etiquetas se pueden colapsar: si difieren, no son redundantes.
+    Devuelve el id del más parecido o None.
+    """
+    buckets = Q()
+    for band, bucket in enumerate(band_buckets(signature)):
+        buckets |= Q(band=band, bucket=bucket)
+
+    candidate_ids = LicenseDatasetBand.objects.filter(
+        buckets, **_labels_filter('entry__', license_type, status, reason)
+    ).values('entry_id')
+    candidates = LicenseDatasetEntry.objects.filter(id__in=candidate_ids).values_list('id', 'minhash')
+
+    best_id, best_score = None, threshold
+    for entry_id, minhash in candidates:
+        score = estimated_jaccard(signature, signature_from_bytes(minhash))
+        if score >= best_score:
+            best_id, best_score = entry_id, score
+    return best_id
+
+
+def _save_bands(entry_id, signature):
+    LicenseDatasetBand.objects.filter(entry_id=entry_id).delete()
+    LicenseDatasetBand.objects.bulk_create([
+        LicenseDatasetBand(entry_id=entry_id, band=band, bucket=bucket)
+        for band, bucket in enumerate(band_buckets(signature))
+    ])
+
+
+def index_entry(entry):
+    """Guarda la firma del registro y sus buckets en el índice LSH."""
+    signature = minhash_signature(entry.text)
+    LicenseDatasetEntry.objects.filter(pk=entry.pk).update(minhash=signature.tobytes())
+    _save_bands(entry.pk, signature)
+
+
+@transaction.atomic
+def add_dataset_entry(text, license_type, status, reason=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Agrega un certificado al dataset de entrenamiento. Si ya hay uno casi idéntico con las mismas
+    etiquetas, solo se incrementa su peso. Los registros nuevos se guardan con su firma MinHash y
+    sus conteos hasheados (LicenseDatasetFeatures). Devuelve (registro, creado).
+    """
+    signature = minhash_signature(text)
+    duplicate_id = find_near_duplicate(signature, license_type, status, reason, threshold)
+    if duplicate_id is not None:
+        LicenseDatasetEntry.objects.filter(pk=duplicate_id).update(weight=F('weight') + 1)
+        return LicenseDatasetEntry.objects.get(pk=duplicate_id), False
+
+    entry = LicenseDatasetEntry.objects.create(
+        text=text, type=license_type, status=status, reason=reason, minhash=signature.tobytes()
+    )
+    _save_bands(entry.pk, signature)
+    store_entry_features([(entry.pk, text)])
+    return entry, True
+
+
+def index_missing_entries():
+    """Calcula la firma y los buckets de los registros que todavía no están en el índice."""
+    indexed = 0
+    for entry in LicenseDatasetEntry.objects.filter(minhash__isnull=True).only('id', 'text').iterator():
+        index_entry(entry)
+        indexed += 1
+    return indexed
+
+
+def near_duplicate_clusters(threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Agrupa los registros casi idénticos (mismas etiquetas y Jaccard estimado >= threshold).
+    Se recorren por id y cada registro se compara solo con los representantes de sus buckets,
+    así el representante de cada grupo es el registro más antiguo, igual que al insertar.
+    Devuelve {id_representante: [ids colapsados]} solo para los grupos con duplicados.
+    """
+    buckets = defaultdict(list)
+    signatures = {}
+    clusters = defaultdict(list)
+
+    rows = LicenseDatasetEntry.objects.order_by('id').values_list('id', 'type', 'status', 'reason', 'minhash')
+    for entry_id, license_type, status, reason, minhash in rows.iterator():
+        signature = signature_from_bytes(minhash)
+        keys = [(license_type, status, reason, band, bucket) for band, bucket in enumerate(band_buckets(signature))]
+
+        candidates = {rep for key in keys for rep in buckets[key]}
+        best_id, best_score = None, threshold
+        for rep in candidates:
+            score = estimated_jaccard(signature, signatures[rep])
+            if score >= best_score:
+                best_id, best_score = rep, score
+
+        if best_id is not None:
+            clusters[best_id].append(entry_id)
+            continue
+
+        signatures[entry_id] = signature
+        for key in keys:
+            buckets[key].append(entry_id)
+    return dict(clusters)
+
+
+@transaction.atomic
+def compact_near_duplicates(threshold=NEAR_DUPLICATE_THRESHOLD, dry_run=False):
+    """
+    Colapsa cada grupo de casi duplicados en su registro más antiguo, que suma los pesos del grupo.
+    Devuelve un resumen con registros antes/después y el peso total (que no cambia).
+    """
+    index_missing_entries()
+    clusters = near_duplicate_clusters(threshold)
+    duplicate_ids = [entry_id for ids in clusters.values() for entry_id in ids]
+    weights = dict(LicenseDatasetEntry.objects.filter(id__in=duplicate_ids).values_list('id', 'weight'))
+
+    before = LicenseDatasetEntry.objects.count()
+    summary = {
+        'entries_before': before,
+        'entries_after': before - len(duplicate_ids),
+        'clusters': len(clusters),
+        'collapsed': len(duplicate_ids),
+        'total_weight': LicenseDatasetEntry.objects.aggregate(total=Sum('weight'))['total'] or 0,
+    }
+    if dry_run or not clusters:
+        return summary
+
+    for rep, ids in clusters.items():
+        LicenseDatasetEntry.objects.filter(pk=rep).update(weight=F('weight') + sum(weights[i] for i in ids))
+    LicenseDatasetEntry.objects.filter(id__in=duplicate_ids).delete()
+    return summary
+
+
+def entry_weights(ids):
+    """Peso de cada registro (alineado con ids). Solo se consultan los que tienen peso distinto de 1."""
+    ids = np.asarray(ids)
+    weights = np.ones(len(ids), dtype=np.float64)
+    if not len(ids):
+        return weights
+    heavy = LicenseDatasetEntry.objects.filter(
+        id__gte=int(ids.min()), id__lte=int(ids.max()), weight__gt=1
+    ).values_list('id', 'weight')
+    position = {entry_id: i for i, entry_id in enumerate(ids.tolist())}
+    for entry_id, weight in heavy:
+        i = position.get(entry_id)
+        if i is not None:
+            weights[i] = weight
+    return weights
+
+
+def _repeat_rows(weights):
+    return np.repeat(np.arange(len(weights)), np.asarray(weights, dtype=np.int64))
+
+
+def weighted_fit_transform(vectorizer, texts, weights):
+    """
+    fit_transform como si cada fila estuviera repetida weight veces (document frequency, min_df,
+    max_df, max_features e idf ponderados), pero devolviendo una fila por registro. Sin esto,
+    al colapsar casi duplicados min_df descartaría los términos propios de cada plantilla.
+    Acepta un TfidfVectorizer con textos, o los pasos posteriores al hashing con conteos.
+    """
+    if weights is None or np.all(np.asarray(weights) == 1):
+        return vectorizer.fit_transform(texts)
+
+    rows = _repeat_rows(weights)
+    if not hasattr(vectorizer, 'build_analyzer'):
+        # Conteos ya hasheados: repetir filas de la matriz dispersa es barato
+        return vectorizer.fit(texts[rows]).transform(texts)
+
+    # Se tokeniza una sola vez por registro, sin podar el vocabulario
+    count_params = CountVectorizer().get_params()
+    counter = CountVectorizer(**{
+        **{key: value for key, value in vectorizer.get_params().items() if key in count_params},
+        'min_df': 1, 'max_df': 1.0, 'max_features': None,
+    })
+    counts = counter.fit_transform(texts).tocsr()
+
+    # La misma poda que CountVectorizer._limit_features, con frecuencias ponderadas
+    weights = np.asarray(weights, dtype=np.float64)
+    n_docs = weights.sum()
+    present = counts.copy()
+    present.data[:] = 1
+    dfs = present.T @ weights
+    high = vectorizer.max_df if isinstance(vectorizer.max_df, Integral) else vectorizer.max_df * n_docs
+    low = vectorizer.min_df if isinstance(vectorizer.min_df, Integral) else vectorizer.min_df * n_docs
+    mask = (dfs <= high) & (dfs >= low)
+    if vectorizer.max_features is not None and mask.sum() > vectorizer.max_features:
+        tfs = counts.T @ weights
+        mask_inds = (-tfs[mask]).argsort()[:vectorizer.max_features]
+        new_mask = np.zeros(len(dfs), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+
+    kept = np.where(mask)[0]
+    terms = counter.get_feature_names_out()
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms[kept])}
+    vectorizer.stop_words_ = set(terms[~mask])
+    vectorizer.fixed_vocabulary_ = False
+    counts = counts[:, kept]
+
+    tfidf = TfidfTransformer(
+        norm=vectorizer.norm, use_idf=vectorizer.use_idf,
+        smooth_idf=vectorizer.smooth_idf, sublinear_tf=vectorizer.sublinear_tf
+    ).fit(counts[rows])
+    if vectorizer.use_idf:
+        vectorizer.idf_ = tfidf.idf_
+    return tfidf.transform(counts)
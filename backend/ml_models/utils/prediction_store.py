@@ -0,0 +1,62 @@
+import base64
+import hashlib
+
+from ml_models.models import CertificatePrediction, MLModel
+from ml_models.utils.file_utils import base64_to_text, is_pdf_image
+from ml_models.utils.coherence_model_ml import predict_license_types
+from ml_models.utils.evaluation_model import predict_evaluation
+
+
+def certificate_hash(base64_file):
+    """Hash SHA-256 del contenido binario del certificado."""
+    return hashlib.sha256(base64.b64decode(base64_file)).hexdigest()
+
+
+def active_models():
+    """Versiones activas de los modelos que intervienen en la predicción de certificados."""
+    models_by_type = {
+        model.model_type: model
+        for model in MLModel.objects.filter(
+            is_active=True,
+            model_type__in=CertificatePrediction.MODEL_FIELDS.keys()
+        )
+    }
+    return {
+        field: models_by_type.get(model_type)
+        for model_type, field in CertificatePrediction.MODEL_FIELDS.items()
+    }
+
+
+def get_certificate_prediction(base64_file, license_type):
+    """
+    Devuelve la predicción guardada para el certificado y las versiones activas de los modelos.
+    Solo si no existe se extrae el texto y se ejecutan los modelos, y el resultado se persiste.
+    """
+    lookup = {
+        'content_hash': certificate_hash(base64_file),
+        'license_type': license_type,
+        **active_models(),
+    }
+
+    prediction = CertificatePrediction.objects.filter(**lookup).first()
+    if prediction is not None:
+        return prediction
+
+    text = base64_to_text(base64_file, is_pdf_image(base64_file))
+    license_type_prediction = predict_license_types(text)
+    evaluation_prediction = predict_evaluation(text, license_type)
+
+    values = {
+        'probability_of_approval': evaluation_prediction['approval_score'],
+        'reason_of_rejection': evaluation_prediction['reason_of_rejection'],
+        'top_reasons': evaluation_prediction.get('top_reasons', []),
+        'license_types': [list(item) for item in license_type_prediction],
+        'has_code': evaluation_prediction.get('has_code'),
+    }
+
+    # Si el motivo de rechazo falló no se guarda, para reintentar en la próxima consulta
+    if 'error' in evaluation_prediction:
+        return CertificatePrediction(**lookup, **values)
+
+    prediction, _ = CertificatePrediction.objects.get_or_create(**lookup, defaults=values)
+    return prediction
@@ -0,0 +1,340 @@
+import base64
+import time
+from datetime import date
+
+import numpy as np
+from django.db import connection, transaction
+
+from licenses.models import Certificate, License, LicenseType, Status
+from licenses.usage import rebuild_license_usage
+from ml_models.models import LicenseDatasetEntry
+from users.models import Department, HealthFirstUser, Role
+
+# Población sintética a escala para benchmarks: los valores se sortean vectorizados con numpy a
+# partir de la semilla y se insertan con bulk_create por lotes (sin save() ni señales).
+
+BATCH_SIZE = 5000
+
+FIRST_NAMES = [
+    'Lucía', 'Martín', 'Sofía', 'Mateo', 'Valentina', 'Juan', 'Camila', 'Santiago', 'Julieta', 'Tomás',
+    'Agustina', 'Benjamín', 'Florencia', 'Joaquín', 'Micaela', 'Facundo', 'Carolina', 'Nicolás', 'Paula', 'Diego',
+    'Romina', 'Federico', 'Daniela', 'Gonzalo', 'Mariana', 'Lautaro', 'Victoria', 'Ignacio', 'Natalia', 'Pablo',
+]
+LAST_NAMES = [
+    'González', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez', 'García', 'Sánchez',
+    'Romero', 'Sosa', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores', 'Acosta', 'Benítez', 'Medina',
+    'Herrera', 'Suárez', 'Aguirre', 'Giménez', 'Gutiérrez', 'Pereyra', 'Rojas', 'Molina', 'Castro', 'Ortiz',
+]
+
+# Peso relativo de cada grupo de licencias (se reparte entre los tipos del grupo)
+GROUP_WEIGHTS = {
+    'enfermedad': 30, 'vacaciones': 20, 'estudios': 10, 'asistencia_familiares': 8, 'accidente_trabajo': 4,
+    'salud_materna': 3, 'gremial': 3, 'duelo': 3, 'mudanza': 2, 'matrimonial': 2, 'nacimiento': 2,
+    'donacion_sangre': 2, 'otro': 2,
+}
+
+# Textos de certificados del dataset por grupo; el resto usa DEFAULT_TEMPLATE
+DATASET_TEMPLATES = {
+    'enfermedad': 'CERTIFICADO MÉDICO {place} Certifico que {name} DNI {dni} presenta {detail} '
+                  'Se indica reposo por {days} días a partir del {date} Firma y sello Dr. {doctor} MP {mp}',
+    'accidente_trabajo': 'ART {place} Denuncia de accidente laboral Trabajador: {name} DNI {dni} Fecha del '
+                         'siniestro: {date} Diagnóstico: {detail} Días de baja: {days} Médico: Dr. {doctor}',
+    'estudios': 'Universidad {place} CERTIFICADO DE EXAMEN Alumno: {name} DNI {dni} Materia: {detail} '
+                'Fecha de examen: {date} Acta N° {mp} Secretaría Académica',
+    'donacion_sangre': 'Banco de Sangre {place} Se certifica que {name} DNI {dni} realizó una donación de '
+                       'sangre el día {date} Servicio de Hemoterapia Dr. {doctor} MP {mp}',
+    'vacaciones': 'Solicitud de vacaciones {name} DNI {dni} desde el {date} por {days} días {detail}',
+}
+DEFAULT_TEMPLATE = ('Constancia {place} Se deja constancia de que {name} DNI {dni} {detail} con fecha {date} '
+                    'por {days} días Firma {doctor}')
+PLACES = ['Hospital Italiano', 'Clínica del Sol', 'Sanatorio Güemes', 'de Buenos Aires', 'Nacional de La Plata',
+          'Hospital Fernández', 'Centro Médico Norte', 'Registro Civil Sede 4']
+DETAILS = {
+    'enfermedad': ['cuadro gripal con fiebre', 'gastroenteritis aguda', 'lumbalgia', 'faringitis', 'migraña'],
+    'accidente_trabajo': ['esguince de tobillo', 'corte en mano derecha', 'contusión lumbar', 'fractura de muñeca'],
+    'vacaciones': ['período anual', 'saldo del año anterior', 'receso invernal'],
+    'estudios': ['Derecho Laboral', 'Análisis Matemático I', 'Contabilidad II', 'Anatomía', 'Programación'],
+}
+GENERIC_DETAILS = ['asistió al trámite', 'concurrió a la citación', 'acompañó a un familiar', 'realizó la gestión']
+
+# Estados de licencias ya evaluables (solicitadas hace más de RECENT_DAYS días) y sus probabilidades
+RECENT_DAYS = 10
+CLOSED_STATUSES = ['approved', 'rejected', 'expired']
+CLOSED_PROBABILITIES = [0.78, 0.15, 0.07]
+
+
+def _dates(days):
+    """Arreglo de días desde epoch -> lista de date (vectorizado en numpy)."""
+    return np.asarray(days, dtype='datetime64[D]').astype(object).tolist()
+
+
+def _day_number(day):
+    return int(np.datetime64(day, 'D').astype(np.int64))
+
+
+def _pdf_text(value):
+    return value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+# Objetos fijos del PDF (catálogo, página, fuente): solo cambia el contenido, que va al final
+_PDF_HEADER = (
+    b'%PDF-1.4\n'
+    b'1 0 obj <</Type/Catalog/Pages 2 0 R>> endobj\n'
+    b'2 0 obj <</Type/Pages/Kids[3 0 R]/Count 1>> endobj\n'
+    b'3 0 obj <</Type/Page/Parent 2 0 R/MediaBox[0 0 420 200]/Resources<</Font<</F1 4 0 R>>>>/Contents 5 0 R>> endobj\n'
+    b'4 0 obj <</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>> endobj\n'
+)
+_PDF_OFFSETS = [_PDF_HEADER.index(f'{i} 0 obj'.encode()) for i in range(1, 5)] + [len(_PDF_HEADER)]
+_PDF_XREF = b'xref\n0 6\n0000000000 65535 f \n' + b''.join(b'%010d 00000 n \n' % offset for offset in _PDF_OFFSETS)
+
+
+def certificate_pdf(lines):
+    """PDF de una página con una línea de texto por elemento (~700 bytes, se lee con PyPDF2/pdfminer)."""
+    content = ('BT /F1 10 Tf 20 170 Td 14 TL ' + ' '.join(f'({_pdf_text(line)}) Tj T*' for line in lines) + ' ET')
+    content = content.encode('cp1252', errors='replace')
+    body = b'5 0 obj <</Length %d>> stream\n%s\nendstream endobj\n' % (len(content), content)
+    startxref = len(_PDF_HEADER) + len(body)
+    return (_PDF_HEADER + body + _PDF_XREF
+            + b'trailer <</Size 6/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n' % startxref)
+
+
+def synthetic_users(n_employees, n_supervisors, n_departments, rng, today):
+    """
+    Datos de empleados y supervisores. Los departamentos tienen tamaños distintos (Dirichlet) y
+    cada uno tiene al menos un supervisor. Devuelve un dict de arreglos (empleados primero).
+    """
+    sizes = rng.dirichlet(np.full(n_departments, 2.0))
+    employee_department = rng.choice(n_departments, size=n_employees, p=sizes)
+    supervisor_department = np.concatenate([
+        np.arange(min(n_departments, n_supervisors)),
+        rng.choice(n_departments, size=max(n_supervisors - n_departments, 0), p=sizes),
+    ])
+
+    n = n_employees + n_supervisors
+    today_day = _day_number(today)
+    birth = today_day - rng.randint(22 * 365, 65 * 365, size=n)
+    # Ingreso entre los 18 años (y un día bisiesto de margen por año) y hace 30 días
+    earliest = birth + 18 * 366
+    employment = earliest + (rng.random_sample(n) * (today_day - 30 - earliest)).astype(np.int64)
+    return {
+        'role': np.array(['employee'] * n_employees + ['supervisor'] * n_supervisors),
+        'department': np.concatenate([employee_department, supervisor_department]),
+        'first_name': rng.randint(0, len(FIRST_NAMES), size=n),
+        'last_name': rng.randint(0, len(LAST_NAMES), size=n),
+        'dni': rng.randint(20_000_000, 46_000_000, size=n),
+        'phone': rng.randint(1_100_000_000, 1_199_999_999, size=n),
+        'date_of_birth': birth,
+        'employment_start_date': employment,
+        # Algunos empleados piden muchas más licencias que otros
+        'propensity': rng.gamma(2.0, size=n) * (np.arange(n) < n_employees),
+    }
+
+
+def synthetic_licenses(n, users, types, rng, today, years=3):
+    """
+    Licencias de los empleados en los últimos `years` años (nunca antes de su ingreso), con tipo,
+    días pedidos, anticipación, estado, evaluador (un supervisor de su departamento) y si tienen certificado.
+    `types` es la lista de LicenseType a sortear. Devuelve un dict de arreglos.
+    """
+    today_day = _day_number(today)
+    groups = [license_type.group for license_type in types]
+    weights = np.array([GROUP_WEIGHTS.get(group, 1) / groups.count(group) for group in groups], dtype=np.float64)
+    type_idx = rng.choice(len(types), size=n, p=weights / weights.sum())
+    cap = np.array([min(t.max_consecutive_days or t.total_days_granted or 10, 30) for t in types])
+    notice = np.array([t.min_advance_notice_days for t in types])
+    needs_certificate = np.array([t.certificate_require for t in types])
+
+    propensity = users['propensity']
+    user_idx = rng.choice(len(propensity), size=n, p=propensity / propensity.sum())
+    history = np.minimum(years * 365, today_day - users['employment_start_date'][user_idx])
+    request = today_day - (rng.random_sample(n) * history).astype(np.int64)
+    start = request + notice[type_idx] + rng.randint(0, 10, size=n)
+    required = 1 + (rng.random_sample(n) * cap[type_idx]).astype(np.int64)
+
+    recent = request > today_day - RECENT_DAYS
+    status = rng.choice(CLOSED_STATUSES, size=n, p=CLOSED_PROBABILITIES).astype(object)
+    status[recent] = np.where(
+        needs_certificate[type_idx[recent]] & (rng.random_sample(recent.sum()) < 0.4), 'missing_doc', 'pending'
+    )
+    evaluated = (status == 'approved') | (status == 'rejected')
+    has_certificate = needs_certificate[type_idx] & (status != 'missing_doc') & (status != 'expired')
+
+    # Supervisores ordenados por departamento: se elige uno al azar entre los del departamento del empleado
+    supervisors = np.flatnonzero(users['role'] == 'supervisor')
+    supervisors = supervisors[np.argsort(users['department'][supervisors], kind='stable')]
+    departments = users['department'][user_idx]
+    first = np.searchsorted(users['department'][supervisors], departments)
+    count = np.searchsorted(users['department'][supervisors], departments, side='right') - first
+    evaluator = supervisors[first + (rng.random_sample(n) * count).astype(np.int64)]
+
+    evaluation = np.minimum(request + rng.randint(0, 6, size=n), today_day)
+    return {
+        'user': user_idx,
+        'type': type_idx,
+        'request_date': request,
+        'start_date': start,
+        'end_date': start + required - 1,
+        'required_days': required,
+        'status': status,
+        'evaluator': np.where(evaluated, evaluator, -1),
+        'evaluation_date': np.where(evaluated, evaluation, -1),
+        'has_certificate': has_certificate,
+    }
+
+
+def synthetic_dataset_entries(n, rng, today):
+    """(texto, grupo, estado, motivo) de n certificados etiquetados para LicenseDatasetEntry."""
+    groups = np.array(list(GROUP_WEIGHTS))
+    weights = np.array(list(GROUP_WEIGHTS.values()), dtype=np.float64)
+    group = groups[rng.choice(len(groups), size=n, p=weights / weights.sum())]
+    rejected = rng.random_sample(n) < 0.25
+    reasons = np.array([
+        'certificado sin datos/vacío/ilegible', 'certificado sin fechas', 'certificado no acorde a la licencia solicitada',
+        'certificado sin datos del profesional', 'certificado de enfermedad sin días de reposo',
+    ])
+    reason = reasons[rng.randint(0, len(reasons), size=n)]
+    first, last, doctor = (rng.randint(0, len(LAST_NAMES), size=n) for _ in range(3))
+    dni = rng.randint(20_000_000, 46_000_000, size=n)
+    place = rng.randint(0, len(PLACES), size=n)
+    detail = rng.randint(0, 5, size=n)
+    days = rng.randint(1, 15, size=n)
+    mp = rng.randint(10_000, 99_999, size=n)
+    dates = _dates(_day_number(today) - rng.randint(0, 3 * 365, size=n))
+
+    entries = []
+    for i in range(n):
+        details = DETAILS.get(group[i], GENERIC_DETAILS)
+        text = DATASET_TEMPLATES.get(group[i], DEFAULT_TEMPLATE).format(
+            place=PLACES[place[i]], name=f'{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}', dni=f'{dni[i]:,}'.replace(',', '.'),
+            detail=details[detail[i] % len(details)], days=days[i], date=f'{dates[i]:%d/%m/%Y}',
+            doctor=LAST_NAMES[doctor[i]], mp=mp[i],
+        )
+        entries.append((text, group[i], 'rejected' if rejected[i] else 'approved', reason[i] if rejected[i] else None))
+    return entries
+
+
+def _batches(n, batch_size):
+    for start in range(0, n, batch_size):
+        yield range(start, min(start + batch_size, n))
+
+
+@transaction.atomic
+def seed_database(n_departments, n_users, n_licenses, n_dataset_entries=0, n_supervisors=None, n_license_types=0,
+                  years=3, seed=0, batch_size=BATCH_SIZE, today=None, log=None):
+    """
+    Siembra departamentos, empleados, supervisores, licencias con estado y certificado (PDF sintético)
+    y registros del dataset. Los mismos parámetros y semilla generan siempre los mismos datos.
+    Como las señales no corren, al final se reconstruye LicenseUsage. Devuelve cantidades y tiempos por etapa.
+    Lanza ValueError, antes de escribir nada, si la semilla ya se usó (los emails se repetirían) o si
+    no queda ningún tipo de licencia para sortear.
+    """
+    if HealthFirstUser.objects.filter(email__startswith=f'seed{seed}-').exists():
+        raise ValueError(f'La base ya tiene datos sembrados con la semilla {seed} (usá otra)')
+    if not n_license_types and not LicenseType.objects.filter(is_deleted=False).exists():
+        raise ValueError('No hay tipos de licencia activos: cargá el catálogo o pedí tipos sintéticos (n_license_types)')
+    rng = np.random.RandomState(seed)
+    today = today or date.today()
+    log = log or (lambda message: None)
+    # Cada departamento necesita al menos un supervisor que evalúe sus licencias
+    n_supervisors = max(n_departments, n_supervisors if n_supervisors is not None else n_users // 25)
+    summary = {'seed': seed, 'seconds': {}}
+
+    def stage(name, start):
+        summary['seconds'][name] = round(time.perf_counter() - start, 1)
+        log(f"{name}: {summary[name]} ({summary['seconds'][name]} s)")
+
+    start = time.perf_counter()
+    departments = [Department.objects.get_or_create(name=f'Sintético {i}')[0] for i in range(n_departments)]
+    roles = {name: Role.get_or_create(name) for name in ('employee', 'supervisor')}
+    for i in range(n_license_types):
+        LicenseType.objects.get_or_create(name=f'Sintética {i}', defaults={
+            'description': 'Tipo de licencia sintético', 'min_advance_notice_days': int(rng.randint(0, 8)),
+            'certificate_require': bool(rng.random_sample() < 0.6), 'max_consecutive_days': int(rng.randint(1, 15)),
+        })
+    types = list(LicenseType.objects.filter(is_deleted=False).order_by('id'))
+    summary['departments'], summary['license_types'] = len(departments), len(types)
+    stage('departments', start)
+
+    start = time.perf_counter()
+    users = synthetic_users(n_users, n_supervisors, n_departments, rng, today)
+    births, employments = _dates(users['date_of_birth']), _dates(users['employment_start_date'])
+    user_ids = []
+    for rows in _batches(len(births), batch_size):
+        user_ids += [user.pk for user in HealthFirstUser.objects.bulk_create([
+            HealthFirstUser(
+                username=f'seed{seed}-{i}@example.com', email=f'seed{seed}-{i}@example.com', password='!',
+                first_name=FIRST_NAMES[users['first_name'][i]], last_name=LAST_NAMES[users['last_name'][i]],
+                dni=int(users['dni'][i]), phone=str(users['phone'][i]), role=roles[users['role'][i]],
+                department=departments[users['department'][i]],
+                date_of_birth=births[i], employment_start_date=employments[i],
+            )
+            for i in rows
+        ])]
+    user_ids = np.array(user_ids)
+    summary['users'] = len(user_ids)
+    stage('users', start)
+
+    start = time.perf_counter()
+    licenses = synthetic_licenses(n_licenses, users, types, rng, today, years)
+    columns = {field: _dates(licenses[field]) for field in ('request_date', 'start_date', 'end_date')}
+    evaluations = _dates(np.where(licenses['evaluation_date'] < 0, 0, licenses['evaluation_date']))
+    summary['certificates'] = 0
+    for rows in _batches(n_licenses, batch_size):
+        created = License.objects.bulk_create([
+            License(
+                user_id=int(user_ids[licenses['user'][i]]), type=types[licenses['type'][i]],
+                request_date=columns['request_date'][i], start_date=columns['start_date'][i],
+                end_date=columns['end_date'][i], required_days=int(licenses['required_days'][i]),
+                evaluator_id=int(user_ids[licenses['evaluator'][i]]) if licenses['evaluator'][i] >= 0 else None,
+                closing_date=evaluations[i] if licenses['evaluation_date'][i] >= 0 else None,
+            )
+            for i in rows
+        ])
+        Status.objects.bulk_create([
+            Status(
+                license_id=license.pk, name=licenses['status'][i], evaluation_comment='Nueva solicitud.',
+                evaluation_date=evaluations[i] if licenses['evaluation_date'][i] >= 0 else None,
+            )
+            for license, i in zip(created, rows)
+        ])
+        certificates = []
+        for license, i in zip(created, rows):
+            if not licenses['has_certificate'][i]:
+                continue
+            u = licenses['user'][i]
+            pdf = certificate_pdf([
+                f'CERTIFICADO - {license.type.name}',
+                f"Paciente: {FIRST_NAMES[users['first_name'][u]]} {LAST_NAMES[users['last_name'][u]]}",
+                f"DNI: {users['dni'][u]}",
+                f'Fecha: {license.start_date:%d/%m/%Y}',
+                f'Días indicados: {license.required_days}',
+            ])
+            certificates.append(Certificate(
+                license_id=license.pk, file=base64.b64encode(pdf).decode('ascii'),
+                validation=licenses['status'][i] == 'approved',
+            ))
+        Certificate.objects.bulk_create(certificates)
+        summary['certificates'] += len(certificates)
+    summary['licenses'] = n_licenses
+    stage('licenses', start)
+
+    start = time.perf_counter()
+    entries = synthetic_dataset_entries(n_dataset_entries, rng, today)
+    for rows in _batches(len(entries), batch_size):
+        LicenseDatasetEntry.objects.bulk_create([
+            LicenseDatasetEntry(text=text, type=group, status=status, reason=reason)
+            for text, group, status, reason in (entries[i] for i in rows)
+        ])
+    summary['dataset_entries'] = len(entries)
+    stage('dataset_entries', start)
+
+    start = time.perf_counter()
+    # Sin estadísticas de las filas recién insertadas el planner elige un plan muy lento para el agregado
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'ANALYZE {License._meta.db_table}, {Status._meta.db_table}, {Certificate._meta.db_table}, '
+            f'{HealthFirstUser._meta.db_table}, {LicenseDatasetEntry._meta.db_table}'
+        )
+    summary['license_usage'] = rebuild_license_usage()
+    stage('license_usage', start)
+    return summary
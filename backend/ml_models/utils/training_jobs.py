@@ -0,0 +1,134 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ml_models.models import MLModel, TrainingJob
+from .training_orchestrator import training_function
+
+logger = logging.getLogger('automatic_models_training')
+
+# Segundos entre latidos de un job en ejecución (ver fail_stale_jobs)
+HEARTBEAT_INTERVAL = 60
+
+
+def submit_training_job(model_type, user=None):
+    """
+    Encola un entrenamiento para el tipo de modelo. Si ya hay uno pendiente o en ejecución
+    se devuelve ese mismo (la restricción unique_active_training_job actúa como lock).
+    Devuelve (job, creado).
+    """
+    try:
+        # Savepoint propio: la vista corre dentro de ATOMIC_REQUESTS
+        with transaction.atomic():
+            return TrainingJob.objects.create(model_type=model_type, requested_by=user), True
+    except IntegrityError:
+        job = TrainingJob.objects.filter(
+            model_type=model_type,
+            status__in=TrainingJob.ACTIVE_STATUSES
+        ).first()
+        if job is None:
+            # El job activo terminó entre el INSERT y la consulta: se vuelve a intentar
+            return submit_training_job(model_type, user)
+        return job, False
+
+
+def claim_next_job():
+    """Toma el job pendiente más antiguo y lo marca en ejecución. Varios workers no toman el mismo."""
+    with transaction.atomic():
+        job = (
+            TrainingJob.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'RUNNING'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.message = 'Iniciando'
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'message'])
+    return job
+
+
+def update_progress(job, progress, message=''):
+    TrainingJob.objects.filter(pk=job.pk, status='RUNNING').update(
+        progress=progress, message=message[:255], heartbeat_at=timezone.now()
+    )
+
+
+def _heartbeat(job, stop, interval):
+    """Actualiza heartbeat_at cada `interval` segundos hasta que termina el entrenamiento."""
+    try:
+        while not stop.wait(interval):
+            TrainingJob.objects.filter(pk=job.pk, status='RUNNING').update(heartbeat_at=timezone.now())
+    except Exception:
+        logger.exception(f"No se pudo registrar el latido del entrenamiento #{job.pk}")
+    finally:
+        connection.close()
+
+
+def run_job(job, incremental=False, n_jobs=None):
+    """
+    Ejecuta el entrenamiento del job fuera de cualquier transacción y registra el resultado.
+    Mientras entrena, un hilo actualiza el latido del job. El resultado solo se guarda si el job
+    sigue en ejecución: si otro worker ya lo dio por abandonado, no se pisa su estado.
+    """
+    train_function = training_function(job.model_type)
+    logger.info(f"Entrenamiento en segundo plano #{job.pk} ({job.model_type}) iniciado")
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job, stop, HEARTBEAT_INTERVAL), daemon=True)
+    heartbeat.start()
+    try:
+        train_function(
+            incremental=incremental,
+            n_jobs=n_jobs,
+            progress=lambda progress, message: update_progress(job, progress, message)
+        )
+    except Exception as e:
+        TrainingJob.objects.filter(pk=job.pk, status='RUNNING').update(
+            status='FAILED',
+            error=str(e),
+            message='Error',
+            finished_at=timezone.now()
+        )
+        logger.error(f"Entrenamiento en segundo plano #{job.pk} ({job.model_type}) falló: {e}\n{traceback.format_exc()}")
+        return False
+    finally:
+        stop.set()
+        heartbeat.join()
+
+    ml_model = MLModel.objects.filter(model_type=job.model_type, department__isnull=True, is_active=True).first()
+    updated = TrainingJob.objects.filter(pk=job.pk, status='RUNNING').update(
+        status='SUCCESS',
+        progress=100,
+        message='Finalizado',
+        ml_model=ml_model,
+        finished_at=timezone.now()
+    )
+    if not updated:
+        logger.warning(f"Entrenamiento en segundo plano #{job.pk} ({job.model_type}) terminó, pero ya no estaba en ejecución")
+        return False
+    logger.info(f"Entrenamiento en segundo plano #{job.pk} ({job.model_type}) finalizado: {ml_model}")
+    return True
+
+
+def fail_stale_jobs(max_age=timedelta(minutes=10)):
+    """
+    Marca como fallidos los jobs en ejecución sin latidos desde hace más de max_age (el worker
+    se cayó a mitad del entrenamiento), para liberar el lock de su tipo de modelo. Un
+    entrenamiento largo pero vivo sigue latiendo y no se toca.
+    """
+    cutoff = timezone.now() - max_age
+    return TrainingJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='RUNNING',
+    ).update(
+        status='FAILED',
+        error='El entrenamiento no finalizó (worker interrumpido)',
+        finished_at=timezone.now()
+    )
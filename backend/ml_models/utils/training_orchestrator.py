@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+from django.utils.module_loading import import_string
+
+# Modelos independientes entre sí (cada uno escribe su propio artefacto y su fila de MLModel).
+# El peso reparte el presupuesto de CPU: el RandomForest de 500 árboles es el más costoso.
+# Las funciones van como ruta para no importar sklearn/lightgbm al cargar las vistas.
+TRAINING_TASKS = {
+    'CLASSIFICATION': ('ml_models.utils.coherence_model_ml.train_and_save_coherence_model', 2),
+    'LICENSE_APPROVAL': ('ml_models.utils.evaluation_model.train_and_save_approval_model', 1),
+    'REJECTION_REASON': ('ml_models.utils.evaluation_model.train_and_save_rejection_reason_model', 1),
+    'SUPERVISOR_ANOMALY_DETECTION': ('ml_models.anomalies.isolation_forest.train_and_save_supervisor_anomaly_model', 1),
+    'EMPLOYEE_ANOMALY_DETECTION': ('ml_models.anomalies.isolation_forest.train_and_save_employee_anomaly_model', 1),
+}
+# Se entrenan solo si se piden (--models, API o porque falta el modelo): el CSV de entrenamiento
+# no cambia, así que reentrenarlos en cada corrida solo crearía versiones nuevas iguales
+ON_DEMAND_TASKS = {'SUPERVISOR_ANOMALY_DETECTION', 'EMPLOYEE_ANOMALY_DETECTION'}
+
+
+def training_function(model_type):
+    return import_string(TRAINING_TASKS[model_type][0])
+
+
+def default_cpu_budget():
+    """Núcleos disponibles para este proceso (respeta taskset/cgroups en Linux)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def split_cpu_budget(model_types, cpu_budget):
+    """
+    Reparte los núcleos entre los modelos según su peso, con al menos uno por modelo.
+    Devuelve {model_type: n_jobs} (hilos de LightGBM o n_jobs del RandomForest).
+    """
+    weights = {model_type: TRAINING_TASKS[model_type][1] for model_type in model_types}
+    total_weight = sum(weights.values())
+    shares = {
+        model_type: max(1, int(cpu_budget * weight / total_weight))
+        for model_type, weight in weights.items()
+    }
+
+    # Los núcleos que sobran por el redondeo van a los modelos más pesados
+    spare = cpu_budget - sum(shares.values())
+    for model_type in sorted(weights, key=weights.get, reverse=True):
+        if spare <= 0:
+            break
+        shares[model_type] += 1
+        spare -= 1
+    return shares
+
+
+def run_training_task(model_type, incremental=True, n_jobs=None):
+    """
+    Entrena un modelo y devuelve su resultado sin propagar excepciones,
+    para que la falla de un modelo no corte el entrenamiento de los demás.
+    """
+    train_function = training_function(model_type)
+    start = time.perf_counter()
+    try:
+        result = train_function(incremental=incremental, n_jobs=n_jobs)
+        info = result[1] if isinstance(result, tuple) else None
+        return {
+            'model_type': model_type,
+            'success': True,
+            'seconds': round(time.perf_counter() - start, 2),
+            'n_jobs': n_jobs,
+            'info': info,
+        }
+    except Exception as e:
+        return {
+            'model_type': model_type,
+            'success': False,
+            'seconds': round(time.perf_counter() - start, 2),
+            'n_jobs': n_jobs,
+            'error': str(e),
+            'traceback': traceback.format_exc(),
+        }
+    finally:
+        # En los procesos del pool la conexión no se reutiliza
+        connections.close_all()
+
+
+def train_models(model_types=None, incremental=True, cpu_budget=None, parallel=True):
+    """
+    Entrena los modelos indicados (por defecto, todos salvo ON_DEMAND_TASKS). En modo paralelo
+    cada modelo corre en su propio proceso y el presupuesto de CPU se reparte entre ellos, para no
+    sobresuscribir la máquina con hilos de LightGBM y del RandomForest a la vez.
+    Devuelve una lista con el resultado y el tiempo de cada modelo, en el orden pedido.
+    """
+    model_types = list(model_types or [m for m in TRAINING_TASKS if m not in ON_DEMAND_TASKS])
+    cpu_budget = max(1, cpu_budget or default_cpu_budget())
+
+    if incremental and set(model_types) - ON_DEMAND_TASKS:
+        # El caché de features se actualiza una sola vez antes de repartir el trabajo
+        from .feature_cache import load_dataset_features
+        load_dataset_features()
+
+    if not parallel or len(model_types) == 1:
+        return [run_training_task(m, incremental, cpu_budget) for m in model_types]
+
+    n_jobs = split_cpu_budget(model_types, cpu_budget)
+
+    # Los procesos hijos no deben heredar las conexiones abiertas del padre
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    # Nunca más procesos que núcleos: si el presupuesto es menor, los modelos esperan turno
+    with ProcessPoolExecutor(max_workers=min(len(model_types), cpu_budget), mp_context=context) as executor:
+        futures = {
+            m: executor.submit(run_training_task, m, incremental, n_jobs[m])
+            for m in model_types
+        }
+        results = []
+        for model_type, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # El proceso murió (por ejemplo, por falta de memoria) antes de devolver resultado
+                results.append({
+                    'model_type': model_type,
+                    'success': False,
+                    'seconds': None,
+                    'n_jobs': n_jobs[model_type],
+                    'error': str(e),
+                })
+    return results
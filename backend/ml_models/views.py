@@ -4,11 +4,11 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.http import JsonResponse
-from ml_models.serializers import MLModelSerializer
+from ml_models.serializers import MLModelSerializer, TrainingJobSerializer
 import json
 from django.core.paginator import Paginator
-from .utils.coherence_model_ml import train_and_save_coherence_model
-from .utils.evaluation_model import train_and_save_approval_model, train_and_save_rejection_reason_model
+from .utils.training_jobs import submit_training_job
+from .utils.training_orchestrator import TRAINING_TASKS
 
 
 @api_view(['GET'])
@@ -19,6 +19,23 @@ def active_models(request):
     serializer = MLModelSerializer(models, many=True)
     return JsonResponse({"models": serializer.data}, status=200)
 
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def active_models_metrics(request):
+    """Modelos activos con sus latencias, tamaños de lote y distribución de scores en producción."""
+    from .utils.inference_metrics import flush_metrics, model_metrics
+
+    # Lo acumulado por este worker todavía no persistido
+    flush_metrics()
+    models = MLModel.objects.filter(is_active=True)
+    metrics = model_metrics(models)
+    data = MLModelSerializer(models, many=True).data
+    for model in data:
+        model['inference_metrics'] = metrics.get(model['id'], [])
+    return JsonResponse({"models": data}, status=200)
+
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
@@ -52,20 +69,34 @@ def train_models(request):
     data = json.loads(request.body)
     model = data.get('model', None)  # Esperamos una lista de modelos
 
-    valid_models = {'CLASSIFICATION', 'LICENSE_APPROVAL', 'REJECTION_REASON'}
+    valid_models = set(TRAINING_TASKS)
 
     if model not in valid_models:
         return JsonResponse({"error": f"Modelo inválido: {model}"}, status=400)
 
-    try:
-        if model =='CLASSIFICATION':
-            train_and_save_coherence_model()
-        if model=='LICENSE_APPROVAL':
-            train_and_save_approval_model()
-        if model=='REJECTION_REASON':
-            train_and_save_rejection_reason_model()
+    # El entrenamiento lo ejecuta el worker (manage.py run_training_jobs), no la petición HTTP
+    job, created = submit_training_job(model, user=request.user)
+    message = "Entrenamiento encolado" if created else "Ya hay un entrenamiento en curso para este modelo"
+
+    return JsonResponse({
+        "message": f"{message}: {model}",
+        "job": TrainingJobSerializer(job).data
+    }, status=202)
+
 
-    except Exception as e:
-        return JsonResponse({"error": f"Error al entrenar el modelo: {str(e)}"}, status=500)
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def training_job_status(request, job_id):
+    job = TrainingJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({"error": "Entrenamiento no encontrado"}, status=404)
+    return JsonResponse({"job": TrainingJobSerializer(job).data}, status=200)
 
-    return JsonResponse({"message": f"Modelo entrenado correctamente: {model}"}, status=200)
+
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def training_jobs(request):
+    jobs = TrainingJob.objects.select_related('ml_model').order_by('-created_at')[:20]
+    return JsonResponse({"jobs": TrainingJobSerializer(jobs, many=True).data}, status=200)
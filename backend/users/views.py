@@ -16,7 +16,6 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from ml_models.utils.file_utils import *
 from messaging.services.brevo_email import *
-from ml_models.health_risk.risk_model import predict_employ_risk, predict_risk
 from django.views.decorators.csrf import csrf_exempt
 from django.core.cache import cache
 from rest_framework.pagination import LimitOffsetPagination
@@ -380,6 +379,7 @@ def predict_health_risk(request):
         risk_list = cache.get("cached_risk_list")
 
         if not risk_list:
+            from ml_models.health_risk.risk_model import predict_risk  # import diferido (pandas, sklearn)
             risk_list = json.loads(predict_risk())
             cache.set("cached_risk_list", risk_list, timeout=300)
 
@@ -402,6 +402,7 @@ def predict_health_risk(request):
 @permission_classes([IsAuthenticated])
 def predict_health_risk_by_id(request,id):
     try:
+        from ml_models.health_risk.risk_model import predict_employ_risk  # import diferido (pandas, sklearn)
         risk = json.loads(predict_employ_risk(id))
     except Exception as e:
         return JsonResponse({"Error inesperado al predecir riesgo": str(e)}, status=500)